@@ -0,0 +1,308 @@
+import asyncio
+import json
+import os
+import struct
+import time
+import uuid
+from typing import Any, Awaitable, Callable
+
+from ..settings import logger
+
+
+# Обработчик события рассылки: заголовок (chat_id, exclude, ...) и уже закодированный JSON для клиентов
+Handler = Callable[[dict[str, Any], str], Awaitable[None]]
+
+
+def encode_event(header: dict[str, Any], payload: str) -> str:
+    """
+    Упаковывает событие в одну строку: JSON заголовка, перевод строки, payload.
+
+    json.dumps не выдаёт сырых переводов строки, поэтому разделитель однозначен,
+    а payload передаётся как есть и не перекодируется на каждом воркере.
+    """
+    return json.dumps(header, ensure_ascii=False) + "\n" + payload
+
+
+def decode_event(frame: str) -> tuple[dict[str, Any], str]:
+    header, _, payload = frame.partition("\n")
+    return json.loads(header), payload
+
+
+class Broadcast:
+    """
+    Базовый класс шины рассылки между воркерами.
+
+    send_message публикует событие один раз, а каждый воркер получает его через
+    handler и доставляет в свои WebSocket соединения.
+    """
+
+    def __init__(self, handler: Handler | None = None):
+        self.handler = handler
+        self.tasks: set[asyncio.Task] = set()  # Фоновые задачи: event loop хранит на них только слабые ссылки
+
+    async def connect(self) -> None:
+        pass
+
+    async def disconnect(self) -> None:
+        pass
+
+    async def publish(self, header: dict[str, Any], payload: str) -> None:
+        await self.publish_frame(encode_event(header, payload))
+
+    async def publish_frame(self, frame: str) -> None:
+        raise NotImplementedError
+
+    async def dispatch(self, frame: str) -> None:
+        """Передаёт полученное событие обработчику, не давая ошибке остановить приём."""
+        if self.handler is None:
+            return
+        try:
+            header, payload = decode_event(frame)
+            await self.handler(header, payload)
+        except Exception as ex:
+            logger.error(f"Broadcast handler error: {ex!r}")
+
+    def spawn(self, coro: Awaitable[None]) -> asyncio.Task:
+        """Запускает задачу из синхронного callback и держит ссылку на неё до завершения."""
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+
+class MemoryBroadcast(Broadcast):
+    """Рассылка внутри одного процесса. Подходит, пока запущен один воркер."""
+
+    async def publish_frame(self, frame: str) -> None:
+        await self.dispatch(frame)
+
+
+class PostgresBroadcast(Broadcast):
+    """
+    Рассылка через PostgreSQL LISTEN/NOTIFY.
+
+    Использует отдельное соединение asyncpg вне пула SQLAlchemy. NOTIFY
+    ограничивает payload 8000 байтами, поэтому длинные события режутся на
+    части и собираются обратно на принимающей стороне.
+    """
+
+    CHUNK_CHARS = 1900  # 1900 символов UTF-8 гарантированно меньше 8000 байт
+    CHUNK_TTL = 30  # Секунд на сборку события; дольше - значит, часть потеряна
+    RECONNECT_DELAY = 1
+
+    def __init__(self, dsn: str, channel: str = "mirror_broadcast", handler: Handler | None = None):
+        super().__init__(handler)
+        self.dsn = dsn
+        self.channel = channel
+        self.conn = None
+        self.lock = asyncio.Lock()
+        self.chunks: dict[str, tuple[float, list[str]]] = {}  # ключ события -> (начало сборки, части)
+        self.closing = False
+
+    async def connect(self) -> None:
+        import asyncpg
+
+        self.closing = False
+        self.conn = await asyncpg.connect(self.dsn)
+        await self.conn.add_listener(self.channel, self._on_notify)
+        self.conn.add_termination_listener(self._on_terminate)
+
+    async def disconnect(self) -> None:
+        self.closing = True
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+    async def publish_frame(self, frame: str) -> None:
+        if len(frame) <= self.CHUNK_CHARS:
+            parts = ["=" + frame]
+        else:
+            key = uuid.uuid4().hex
+            pieces = [frame[i:i + self.CHUNK_CHARS] for i in range(0, len(frame), self.CHUNK_CHARS)]
+            parts = [f"~{key}:{i}:{len(pieces)}:{piece}" for i, piece in enumerate(pieces)]
+        async with self.lock:
+            if self.conn is None:
+                # До connect или во время переподключения: событие не должно молча потеряться
+                raise ConnectionError("Broadcast is not connected")
+            # Все части уходят одной транзакцией, поэтому приходят подряд и целиком
+            async with self.conn.transaction():
+                for part in parts:
+                    await self.conn.execute("SELECT pg_notify($1, $2)", self.channel, part)
+
+    def _on_notify(self, conn, pid, channel, payload: str) -> None:
+        if payload.startswith("="):
+            self.spawn(self.dispatch(payload[1:]))
+            return
+        key, index, total, piece = payload[1:].split(":", 3)
+        now = time.monotonic()
+        self._expire_chunks(now)
+        _, pieces = self.chunks.setdefault(key, (now, []))
+        if int(index) != len(pieces):
+            # Пропущена часть: событие уже не собрать
+            del self.chunks[key]
+            logger.error(f"Broadcast event {key} lost part {len(pieces)}")
+            return
+        pieces.append(piece)
+        if int(index) + 1 == int(total):
+            del self.chunks[key]
+            self.spawn(self.dispatch("".join(pieces)))
+
+    def _expire_chunks(self, now: float) -> None:
+        """Убирает события, которые собираются дольше CHUNK_TTL."""
+        stale = [key for key, (started, _) in self.chunks.items() if now - started > self.CHUNK_TTL]
+        for key in stale:
+            del self.chunks[key]
+        if stale:
+            logger.warning(f"Dropped {len(stale)} incomplete broadcast events")
+
+    def _on_terminate(self, conn) -> None:
+        self.conn = None
+        if not self.closing:
+            logger.error("Broadcast LISTEN connection lost, reconnecting")
+            self.spawn(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        self.chunks.clear()
+        while not self.closing:
+            try:
+                await self.connect()
+                return
+            except Exception as ex:
+                logger.error(f"Broadcast reconnect failed: {ex!r}")
+                await asyncio.sleep(self.RECONNECT_DELAY)
+
+
+HEADER = struct.Struct("!I")  # Длина кадра в протоколе локального брокера
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    (size,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return await reader.readexactly(size)
+
+
+class LocalBroker:
+    """
+    Минимальный брокер на Unix сокете: пересылает каждый кадр всем клиентам.
+
+    Заменяет внешний брокер в тестах и при локальном запуске нескольких воркеров
+    на одной машине.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.server: asyncio.AbstractServer | None = None
+        self.clients: set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._serve, path=self.path)
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self.clients):
+                writer.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.clients.add(writer)
+        try:
+            while True:
+                data = await _read_frame(reader)
+                frame = HEADER.pack(len(data)) + data
+                for client in list(self.clients):
+                    client.write(frame)
+                await asyncio.gather(*(client.drain() for client in list(self.clients)), return_exceptions=True)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+
+class UnixSocketBroadcast(Broadcast):
+    """
+    Клиент LocalBroker: публикует кадры в брокер и получает кадры всех воркеров.
+
+    При обрыве соединения (перезапуск брокера) переподключается каждые
+    RECONNECT_DELAY секунд, как PostgresBroadcast.
+    """
+
+    RECONNECT_DELAY = 1
+
+    def __init__(self, path: str, handler: Handler | None = None):
+        super().__init__(handler)
+        self.path = path
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self.listener: asyncio.Task | None = None
+        self.closing = False
+
+    async def connect(self) -> None:
+        self.closing = False
+        self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+        self.listener = asyncio.create_task(self._listen())
+
+    async def disconnect(self) -> None:
+        self.closing = True
+        if self.listener is not None:
+            self.listener.cancel()
+            self.listener = None
+        self._close_writer()
+
+    def _close_writer(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    async def publish_frame(self, frame: str) -> None:
+        if self.writer is None:
+            # До connect или во время переподключения: событие не должно молча потеряться
+            raise ConnectionError("Broadcast is not connected")
+        data = frame.encode("utf-8")
+        self.writer.write(HEADER.pack(len(data)) + data)
+        await self.writer.drain()
+
+    async def _listen(self) -> None:
+        while not self.closing:
+            try:
+                while True:
+                    data = await _read_frame(self.reader)
+                    await self.dispatch(data.decode("utf-8"))
+            except (asyncio.IncompleteReadError, ConnectionError):
+                logger.error("Broadcast broker connection lost, reconnecting")
+            self._close_writer()
+            await self._reconnect()
+
+    async def _reconnect(self) -> None:
+        while not self.closing:
+            try:
+                self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+                return
+            except OSError as ex:
+                logger.error(f"Broadcast reconnect failed: {ex!r}")
+                await asyncio.sleep(self.RECONNECT_DELAY)
+
+
+def create_broadcast(url: str | None = None, handler: Handler | None = None) -> Broadcast:
+    """
+    Создаёт шину рассылки по BROADCAST_URL.
+
+    memory:// (по умолчанию) - внутри процесса;
+    postgres или postgresql://... - LISTEN/NOTIFY (postgres берёт DATABASE_URL);
+    unix:///path/to/broker.sock - локальный брокер.
+    """
+    url = url or os.getenv("BROADCAST_URL", "memory://")
+    if url.startswith("memory://"):
+        return MemoryBroadcast(handler=handler)
+    if url.startswith("unix://"):
+        return UnixSocketBroadcast(url[len("unix://"):], handler=handler)
+    if url == "postgres":
+        url = os.getenv("DATABASE_URL")
+    if url.startswith(("postgres://", "postgresql")):
+        # asyncpg принимает только DSN без указания драйвера SQLAlchemy
+        scheme, _, rest = url.partition("://")
+        return PostgresBroadcast("postgresql://" + rest, handler=handler)
+    raise ValueError(f"Unsupported BROADCAST_URL: {url}")
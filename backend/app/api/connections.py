@@ -0,0 +1,156 @@
+import asyncio
+import json
+import time
+from typing import Any, Iterable
+
+from fastapi import WebSocket
+
+from ..settings import logger
+from ..metrics import Counter, Gauge, Histogram
+from .broadcast import create_broadcast
+
+
+SEND_TIMEOUT = 5  # Секунд на отправку одному получателю, чтобы медленный клиент не держал рассылку
+
+FANOUT_SECONDS = Histogram("websocket_fanout_duration_seconds", "Time to deliver one event to local chat members.")
+FANOUT_SENDS = Counter("websocket_fanout_sends_total", "Messages sent to WebSocket connections.")
+FANOUT_FAILED_SENDS = Counter("websocket_fanout_failed_sends_total", "Sends that failed or timed out.")
+
+
+class ConnectionManager:
+    """
+    Реестр WebSocket соединений с индексом chat_id -> подключённые участники.
+
+    Рассылка идёт только по участникам чата, которые сейчас онлайн, поэтому её
+    стоимость зависит от размера чата, а не от числа подключённых пользователей.
+    """
+
+    def __init__(self):
+        self.active_connections: dict[str, WebSocket] = {}  # username -> соединение
+        self.chat_members: dict[int, set[str]] = {}  # chat_id -> подключённые участники
+        self.user_chats: dict[str, set[int]] = {}  # username -> чаты подключённого пользователя
+
+    def connect(self, username: str, websocket: WebSocket, chat_ids: Iterable[int]) -> None:
+        """Регистрирует соединение и индексирует чаты пользователя."""
+        self.active_connections[username] = websocket
+        self.user_chats[username] = set()
+        for chat_id in chat_ids:
+            self.join(chat_id, username)
+
+    def disconnect(self, username: str, websocket: WebSocket | None = None) -> None:
+        """
+        Убирает соединение из реестра.
+
+        Если передан websocket, соединение удаляется только если оно всё ещё
+        текущее: новая вкладка пользователя могла заменить старую.
+        """
+        if websocket is not None and self.active_connections.get(username) is not websocket:
+            return
+        self.active_connections.pop(username, None)
+        for chat_id in self.user_chats.pop(username, set()):
+            members = self.chat_members.get(chat_id)
+            if members is None:
+                continue
+            members.discard(username)
+            if not members:
+                del self.chat_members[chat_id]
+
+    def join(self, chat_id: int, username: str) -> None:
+        """Добавляет участника в индекс чата, если он сейчас подключён."""
+        if username not in self.active_connections:
+            return
+        self.chat_members.setdefault(chat_id, set()).add(username)
+        self.user_chats[username].add(chat_id)
+
+    def leave(self, chat_id: int, username: str) -> None:
+        """Убирает участника из индекса чата."""
+        members = self.chat_members.get(chat_id)
+        if members is not None:
+            members.discard(username)
+            if not members:
+                del self.chat_members[chat_id]
+        if username in self.user_chats:
+            self.user_chats[username].discard(chat_id)
+
+    def is_connected(self, username: str) -> bool:
+        return username in self.active_connections
+
+    async def send_to_chat(self, chat_id: int, message: dict[str, Any], exclude: str | None = None) -> list[str]:
+        """Рассылает сообщение подключённым к этому воркеру участникам чата."""
+        return await self.deliver(chat_id, encode_message(message), exclude=exclude)
+
+    async def deliver(self, chat_id: int, payload: str, exclude: str | None = None) -> list[str]:
+        """
+        Отправляет уже закодированный JSON подключённым участникам чата.
+
+        Отправка всем получателям идёт параллельно. Соединения, на которые
+        отправить не удалось, удаляются из реестра.
+
+        :return: Список получателей, которым отправить не удалось
+        """
+        recipients = [
+            (username, self.active_connections[username])
+            for username in self.chat_members.get(chat_id, ())
+            if username != exclude and username in self.active_connections
+        ]
+        if not recipients:
+            return []
+
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(asyncio.wait_for(websocket.send_text(payload), SEND_TIMEOUT) for _, websocket in recipients),
+            return_exceptions=True
+        )
+        FANOUT_SECONDS.observe(time.perf_counter() - started)
+
+        failed = []
+        for (username, websocket), result in zip(recipients, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Failed to send to {username}: {result!r}")
+                failed.append(username)
+                self.disconnect(username, websocket)
+        FANOUT_SENDS.inc(amount=len(recipients))
+        if failed:
+            FANOUT_FAILED_SENDS.inc(amount=len(failed))
+        return failed
+
+    async def on_broadcast(self, header: dict[str, Any], payload: str) -> None:
+        """Обработчик шины: доставляет событие, опубликованное любым воркером, в свои соединения."""
+        chat_id = header["chat_id"]
+        if header.get("type") == "membership":
+            # Индекс чата обновляется на каждом воркере: добавленные сразу получают
+            # событие и новые сообщения, удалённые получают событие последним
+            for username in header.get("added", ()):
+                self.join(chat_id, username)
+            await self.deliver(chat_id, payload)
+            for username in header.get("removed", ()):
+                self.leave(chat_id, username)
+            return
+        await self.deliver(chat_id, payload, exclude=header.get("exclude"))
+
+
+def encode_message(message: dict[str, Any]) -> str:
+    return json.dumps(message, ensure_ascii=False, default=str)
+
+
+async def publish(chat_id: int, message: dict[str, Any], exclude: str | None = None) -> None:
+    """
+    Публикует сообщение для всех воркеров.
+
+    JSON кодируется один раз здесь; каждый воркер, включая текущий, получает
+    его через шину и рассылает своим подключённым участникам чата.
+    """
+    await broadcast.publish({"chat_id": chat_id, "exclude": exclude}, encode_message(message))
+
+
+async def publish_membership(chat_id: int, added: list[str], removed: list[str]) -> None:
+    """Публикует одно событие об изменении состава чата на весь список пользователей."""
+    message = {"type": "membership", "chat_id": chat_id, "added": added, "removed": removed}
+    header = {"chat_id": chat_id, "type": "membership", "added": added, "removed": removed}
+    await broadcast.publish(header, encode_message(message))
+
+
+manager = ConnectionManager()
+Gauge("websocket_active_connections", "Open WebSocket connections on this worker.",
+      collect=lambda: [((), len(manager.active_connections))])
+broadcast = create_broadcast(handler=manager.on_broadcast)
@@ -1,21 +1,29 @@
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi import APIRouter, HTTPException, Depends, Request, WebSocket, WebSocketException
+from starlette.status import WS_1008_POLICY_VIOLATION
 from fastapi.responses import RedirectResponse
-from jose import JWTError
 
 from sqlalchemy.orm import Session
-from ..db.init_postgre import SessionLocal
-from typing import Generator
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db.init_postgre import SessionLocal, session_router
+from typing import Generator, AsyncGenerator
 
 from fastapi import Depends, HTTPException, Request
-from jose import jwt  # Если вы используете JWT токены
-from ..settings import SECRET_KEY, ALGORITHM
+from starlette.requests import HTTPConnection
+from ..models import PublicUserData
+from ..errors import Overloaded
+from ..service import users_async as service_users
 
 
 def unauthed():
     raise HTTPException(status_code=302, detail="Redirecting to registration", headers={"Location": "/registration"})
 
 
+def overloaded(ex: Overloaded):
+    """Пул паролей переполнен: быстрый отказ вместо ожидания в очереди"""
+    raise HTTPException(status_code=503, detail=ex.msg, headers={"Retry-After": "1"})
+
+
 # Зависимость для получения токена из cookies
 def get_token_from_cookies(request: Request) -> str:
     token = request.cookies.get("access_token")  # Извлекаем токен из cookies
@@ -25,15 +33,68 @@ def get_token_from_cookies(request: Request) -> str:
 
 # Зависимость для проверки токена
 def oauth2_dep(token: str = Depends(get_token_from_cookies)):
-    try:
-        # Здесь ваша логика проверки токена, например, декодирование JWT
-        payload = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHM)
-        username = payload.get("sub")  # Обычно в JWT токене хранится имя пользователя в поле "sub"
-        if not username:
-            unauthed()
-        return token
-    except JWTError:
+    # Декодирование JWT: имя пользователя хранится в поле "sub"
+    if not service_users.get_jwt_username(token):
+        unauthed()
+    return token
+
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def token_username(connection: HTTPConnection) -> str | None:
+    """Имя пользователя из cookie access_token без обращения к базе."""
+    token = connection.cookies.get("access_token")
+    return service_users.get_jwt_username(token) if token else None
+
+
+async def get_async_db(connection: HTTPConnection) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Асинхронная версия get_db: сессия основной базы, не блокирует event loop.
+
+    После небезопасного запроса (POST, DELETE...) пользователь ещё
+    READ_YOUR_WRITES_SECONDS читает из основной базы, а не из реплики.
+    """
+    async with session_router.for_write()() as db:
+        yield db
+    if connection.scope.get("method") not in SAFE_METHODS:
+        # Без get_principal (например, маршруты на oauth2_dep) имя берётся из токена
+        principal = getattr(connection.state, "principal", None)
+        session_router.mark_write(principal.username if principal else token_username(connection))
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Сессия только для чтения: реплика, если пользователь недавно ничего не записывал."""
+    async with session_router.for_read(token_username(request))() as db:
+        yield db
+
+
+async def get_principal(request: Request,
+                        token: str = Depends(get_token_from_cookies)) -> PublicUserData:
+    """
+    Текущий пользователь запроса.
+
+    Токен декодируется один раз, публичные данные берутся из кеша user_cache
+    (при промахе - одним запросом без хеша пароля). FastAPI кеширует результат
+    зависимости в пределах запроса, поэтому повторные Depends не стоят ничего.
+
+    Промах кеша читается по тем же правилам, что и get_read_db: из реплики,
+    если пользователь недавно ничего не записывал. Сессия не открывает
+    соединение, пока нет запроса, так что попадание в кеш базу не трогает.
+    """
+    if not (username := service_users.get_jwt_username(token)):
         unauthed()
+    reader = session_router.for_read(username)
+    async with reader() as db:
+        principal = await service_users.get_public(db, username)
+    if principal is None and reader is not session_router.primary:
+        # Только что зарегистрированный пользователь мог ещё не дойти до реплики
+        async with session_router.for_write()() as db:
+            principal = await service_users.get_public(db, username)
+    if principal is None:
+        unauthed()
+    request.state.principal = principal
+    return principal
 
 
 async def websocket_token(websocket: WebSocket):
@@ -61,4 +122,5 @@ def get_db() -> Generator[Session, None, None]:
     try:
         yield db  # Выдаем сессию в функцию, которая вызывает зависимость
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
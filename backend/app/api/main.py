@@ -1,13 +1,56 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
-import uvicorn
 
 from ..service import users as service
 from ..models import User
 from ..errors import Duplicate, Missing
-from .routes import users, login, chats
+from .routes import users, login, chats, health, metrics
+from .middleware import MetricsMiddleware, SQLProfilerMiddleware
+from .connections import broadcast
+from ..service.ingest import ingestor
+from ..service.passwords import password_pool
+from ..db import init_postgre
+from ..db.migrate import run_migrations
+from ..settings import (MIGRATE_ON_STARTUP, DB_WARM_CONNECTIONS, DB_STARTUP_TIMEOUT, METRICS_ENABLED, SQL_PROFILER,
+                        configure_logging)
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Импорт приложения не трогает базу: движки, пулы и миграции - только здесь
+    configure_logging()
+    app.state.ready = False
+    init_postgre.init_engines()
+    # Ждёт базу до DB_STARTUP_TIMEOUT и заранее открывает соединения в пулах
+    await init_postgre.warm_up(DB_WARM_CONNECTIONS, DB_STARTUP_TIMEOUT)
+    # Миграции схемы вместо create_all при импорте; при нескольких воркерах их сериализует advisory lock
+    if MIGRATE_ON_STARTUP:
+        await asyncio.to_thread(run_migrations, init_postgre.engine)
+    # Шина рассылки между воркерами (memory://, postgres, unix://) из BROADCAST_URL
+    await broadcast.connect()
+    # Пакетная запись сообщений, если включена через INGEST_ENABLED
+    if ingestor is not None:
+        await ingestor.start()
+    app.state.ready = True
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        if ingestor is not None:
+            await ingestor.stop()
+        await broadcast.disconnect()
+        password_pool.shutdown()
+        await init_postgre.dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics.router)
+if SQL_PROFILER:
+    app.add_middleware(SQLProfilerMiddleware)
+app.include_router(health.router)
 app.include_router(users.router)
 app.include_router(login.router)
 app.include_router(chats.router)
@@ -15,4 +58,6 @@ app.include_router(chats.router)
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, reload=True)
\ No newline at end of file
@@ -0,0 +1,84 @@
+import time
+
+from ..metrics import Histogram, COUNT_BUCKETS, request_db_stats
+from ..profiler import profile, report
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route", "status"))
+REQUEST_DB_QUERIES = Histogram("http_request_db_queries", "SQL statements per HTTP request.", ("route",),
+                               buckets=COUNT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Total SQL time per HTTP request.", ("route",))
+
+
+class MetricsMiddleware:
+    """
+    Латентность HTTP запросов по шаблону маршрута и их нагрузка на базу.
+
+    Чистый ASGI, без BaseHTTPMiddleware: тело ответа не буферизуется, потоковые
+    выгрузки идут как есть. Метка route - шаблон пути (/chats/{chat_id}), а не
+    сам путь, чтобы число рядов не росло с числом чатов; запросы мимо маршрутов
+    попадают в route="unmatched". Время считается до конца отправки тела.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stats = [0, 0.0]
+        token = request_db_stats.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_db_stats.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            REQUEST_SECONDS.observe(elapsed, scope["method"], path, str(status))
+            REQUEST_DB_QUERIES.observe(stats[0], path)
+            REQUEST_DB_SECONDS.observe(stats[1], path)
+
+
+class SQLProfilerMiddleware:
+    """
+    Профиль SQL каждого HTTP запроса (SQL_PROFILER=1).
+
+    Сводка уходит в заголовок ответа X-SQL-Profile: число запросов, их суммарное
+    время, число подозрений на N+1 и медленных запросов. Подробности - в логе.
+    Запросы потоковых ответов после отправки заголовков в сводку не попадают.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with profile(f"{scope['method']} {scope['path']}") as current:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    header = (b"x-sql-profile", current.summary().encode())
+                    message = {**message, "headers": [*message.get("headers", []), header]}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    current.label = f"{scope['method']} {route.path}"
+                report(current)
@@ -0,0 +1,60 @@
+from typing import Any, Iterable, Sequence
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него тот же формат даёт стандартный json
+    orjson = None
+    import json
+
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=lambda value: value.isoformat())
+
+
+# Быстрый путь чтения: запросы по колонкам отдают кортежи, которые сразу кодируются
+# в JSON без промежуточных Pydantic объектов и без повторной сериализации FastAPI.
+# Pydantic остаётся на входе (валидация запросов) и в response_model для документации.
+
+MESSAGE_FIELDS = ("id", "content", "timestamp", "username", "chat_id")
+CHAT_SUMMARY_FIELDS = (
+    "id", "title", "member_count", "unread_count", "message_count",
+    "last_message_id", "last_message_preview", "last_message_username", "last_message_at",
+)
+
+
+def dumps(content: Any) -> bytes:
+    """JSON в байтах; datetime кодируется в ISO 8601, как это делает Pydantic."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return _encoder.encode(content).encode("utf-8")
+
+
+def rows_to_dicts(rows: Iterable[Sequence], fields: Sequence[str]) -> list[dict[str, Any]]:
+    """Строки запроса по колонкам в словари; порядок колонок в запросе должен совпадать с fields."""
+    return [dict(zip(fields, row)) for row in rows]
+
+
+class RawJSONResponse(Response):
+    """
+    Ответ с уже закодированным JSON.
+
+    bytes отдаются как есть, остальное кодируется через dumps. Если обработчик
+    возвращает Response, FastAPI не валидирует и не сериализует его повторно.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def encode_message_page(rows: Iterable[Sequence], has_more: bool) -> bytes:
+    """Страница истории в формате MessagePage."""
+    return dumps({"messages": rows_to_dicts(rows, MESSAGE_FIELDS), "has_more": has_more})
+
+
+def encode_chat_summary_page(rows: Iterable[Sequence], next_cursor: str | None) -> bytes:
+    """Страница списка чатов в формате ChatSummaryPage."""
+    return dumps({"chats": rows_to_dicts(rows, CHAT_SUMMARY_FIELDS), "next_cursor": next_cursor})
@@ -1,52 +1,147 @@
-from fastapi import APIRouter, HTTPException, Depends, Request, Form, WebSocket, WebSocketDisconnect, WebSocketException
+from fastapi import APIRouter, HTTPException, Depends, Request, Form, Query, WebSocket, WebSocketDisconnect, WebSocketException
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import StreamingResponse
 import os
 from datetime import timedelta, datetime
-
-from ...models import Message, Chat, ChatCreateRequest
-from ...errors import Duplicate, Missing
-from ..deps import unauthed, oauth2_dep, get_db, websocket_token
+from typing import Literal
+
+from ...models import Message, MessagePage, MessageSearchPage, ChatSummaryPage, Chat, PublicUserData, ChatCreateRequest, MembersRequest, MembersResult, SendMessageRequest, WsInboundFrame, WsSendFrame, WsAckFrame, WsPingFrame
+from ...errors import Duplicate, Missing, Overloaded
+from ..deps import unauthed, oauth2_dep, get_async_db, get_read_db, get_principal, websocket_token
+from ...db.init_postgre import AsyncSessionLocal, session_router
+from ..connections import manager, publish, publish_membership
+from ..responses import RawJSONResponse, encode_message_page, encode_chat_summary_page
 from ...settings import TEMPLATES as templates
 from ...settings import logger
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
+from pydantic import ValidationError
+from starlette.status import WS_1008_POLICY_VIOLATION, WS_1011_INTERNAL_ERROR
 
-from backend.app.service import message as service_messages
-from backend.app.service import chats as service_chats
-from backend.app.service import users as service_users
+from backend.app.service import message_async as service_messages
+from backend.app.service import chats_async as service_chats
+from backend.app.service import users_async as service_users
+from backend.app.service import export as service_export
 
 
 router = APIRouter(prefix = "/chats")
 
-active_connections = {}
+MESSAGES_PAGE_MAX = 200  # Максимальный размер страницы истории
+CHATS_PAGE_SIZE = 50  # Чатов на странице боковой панели
+CHATS_PAGE_MAX = 200
+SEARCH_PAGE_SIZE = 20  # Результатов поиска на странице
+SEARCH_PAGE_MAX = 100
+
+
+async def post_message(db: AsyncSession, username: str, chat_id: int, content: str) -> dict | None:
+    """
+    Сохраняет сообщение и публикует его участникам чата.
+
+    Общий путь для POST /chats/send и кадров send по WebSocket: проверка
+    участия и вставка выполняются одним запросом.
+
+    :return: Данные сообщения или None, если пользователь не участник чата
+    """
+    message = await service_chats.post_message(db, chat_id, username, content)
+    if message is None:
+        return None
+
+    message_data = {
+        "type": "new_message",
+        "chat_id": message.chat_id,
+        "message": {
+            "id": message.id,
+            "content": message.content,
+            "username": message.username,
+            "timestamp": message.timestamp.isoformat(),
+            "chat_id": message.chat_id
+        }
+    }
+
+    # Публикуем сообщение в шину: каждый воркер разошлёт его своим участникам чата, кроме отправителя
+    await publish(message.chat_id, message_data, exclude=username)
+    return message_data["message"]
+
+
+async def handle_frame(websocket: WebSocket, username: str, text: str) -> None:
+    """Обрабатывает один кадр клиента. Пользователь уже аутентифицирован при подключении."""
+    try:
+        frame = WsInboundFrame.validate_json(text)
+    except ValidationError as ex:
+        await websocket.send_json({"type": "error", "detail": ex.errors(include_url=False, include_context=False)})
+        return
+
+    if isinstance(frame, WsPingFrame):
+        await websocket.send_json({"type": "pong"})
+
+    elif isinstance(frame, WsAckFrame):
+        # Ack сдвигает отметку прочтения, по ней считаются непрочитанные в списке чатов
+        async with AsyncSessionLocal() as db:
+            try:
+                await service_chats.mark_read(db, frame.chat_id, username, frame.message_id)
+                # Окно read-your-writes - только если запись действительно прошла
+                session_router.mark_write(username)
+            except SQLAlchemyError as e:
+                logger.error(f"Database error: {e}")
+
+    elif isinstance(frame, WsSendFrame):
+        if not frame.content.strip():
+            await websocket.send_json({"type": "error", "client_id": frame.client_id, "detail": "Пустое сообщение"})
+            return
+        # Сессия берётся только на время записи, а не на всё время жизни соединения
+        async with AsyncSessionLocal() as db:
+            try:
+                message = await post_message(db, username, frame.chat_id, frame.content)
+            except SQLAlchemyError as e:
+                await db.rollback()
+                logger.error(f"Database error: {e}")
+                await websocket.send_json({"type": "error", "client_id": frame.client_id, "detail": "Ошибка базы данных"})
+                return
+            except (RuntimeError, Overloaded) as e:
+                # Пакетная запись останавливается или перегружена: клиент может повторить отправку
+                logger.error(f"Message not accepted: {e!r}")
+                await websocket.send_json({"type": "error", "client_id": frame.client_id, "detail": "Сервер занят, повторите отправку"})
+                return
+        if message is None:
+            await websocket.send_json({"type": "error", "client_id": frame.client_id, "detail": "Вы не участник этого чата"})
+            return
+        # Запись по WebSocket не проходит через get_async_db: окно read-your-writes открывается здесь
+        session_router.mark_write(username)
+        await websocket.send_json({
+            "type": "ack",
+            "client_id": frame.client_id,
+            "message_id": message["id"],
+            "message": message
+        })
 
 
 @router.websocket("/ws/{username}")
 async def websocket_endpoint(
         username: str,
         websocket: WebSocket,
-        db: Session = Depends(get_db),
         token: str = Depends(websocket_token)
 ):
     await websocket.accept()
 
+    user = None
     try:
-        user = service_users.get_current_user(db, token).username
-
-        if user != username:
-            raise WebSocketException(
-                code=WS_1008_POLICY_VIOLATION,
-                reason="Username mismatch"
-            )
-
-        active_connections[user] = websocket
+        # Пользователь определяется один раз на соединение и переиспользуется для всех кадров
+        async with AsyncSessionLocal() as db:
+            current_user = await service_users.resolve_principal(db, token)
+            if not current_user or current_user.username != username:
+                raise WebSocketException(
+                    code=WS_1008_POLICY_VIOLATION,
+                    reason="Username mismatch"
+                )
+            user = current_user.username
+            chat_ids = await service_chats.chat_ids_by_user(db, user)
+
+        manager.connect(user, websocket, chat_ids)
         logger.info(f"WebSocket connected for user: {user}")
 
         try:
             while True:
-                data = await websocket.receive_text()
-                logger.debug(f"Heartbeat from {user}: {data}")
+                await handle_frame(websocket, user, await websocket.receive_text())
 
         except WebSocketDisconnect:
             logger.info(f"WebSocket disconnected for user: {user}")
@@ -63,19 +158,20 @@ async def websocket_endpoint(
         )
 
     finally:
-        if user in active_connections:
-            del active_connections[user]
+        if user:
+            manager.disconnect(user, websocket)
 
 
 @router.get("/")
-async def chat_page(request: Request, token = Depends(oauth2_dep), db: Session = Depends(get_db)):
+async def chat_page(request: Request, user: PublicUserData = Depends(get_principal), db: AsyncSession = Depends(get_read_db)):
     try:
-        user = service_users.get_current_user(db=db, token=token)
         username = user.username
-        chats = service_chats.all_chats_by_user(db=db, username=username)
+        # Только первая страница сводки: без участников и истории сообщений
+        page = await service_chats.summaries(db=db, username=username, limit=CHATS_PAGE_SIZE)
         result =  {
             "user":username,
-            "chats":chats
+            "chats":page.chats,
+            "next_cursor":page.next_cursor
         }
         response = templates.TemplateResponse("chat_page.html", {"request": request, "response":result})
         return response
@@ -84,19 +180,91 @@ async def chat_page(request: Request, token = Depends(oauth2_dep), db: Session =
 
 
 @router.get("/all")
-async def get_all_chats(request: Request, token = Depends(oauth2_dep), db: Session = Depends(get_db)):
+async def get_all_chats(request: Request,
+                        profile: Literal["summary", "members", "full"] = "full",
+                        history: int | None = Query(None, ge=1, le=MESSAGES_PAGE_MAX),
+                        user: PublicUserData = Depends(get_principal),
+                        db: AsyncSession = Depends(get_read_db)):
     try:
-        return service_chats.get_all(db)
+        # profile - профиль загрузки (data.chats_postgre.LOAD_PROFILES), history - последние сообщения каждого чата
+        return await service_chats.get_all(db, profile=profile, history=history)
     except Exception as ex:
         raise HTTPException(status_code = 500, detail = f'Ops... {ex.msg}')
 
 
-@router.get("/{chat_id}")
-async def get_chat(chat_id: int, db: Session = Depends(get_db), token: str = Depends(oauth2_dep)):
+@router.get("/summary", response_model=ChatSummaryPage, response_class=RawJSONResponse)
+async def get_chat_summaries(cursor: str | None = None,
+                             limit: int = Query(CHATS_PAGE_SIZE, ge=1, le=CHATS_PAGE_MAX),
+                             user: PublicUserData = Depends(get_principal),
+                             db: AsyncSession = Depends(get_read_db)):
+    try:
+        rows, next_cursor = await service_chats.summary_rows(db, user.username, cursor=cursor, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    return RawJSONResponse(encode_chat_summary_page(rows, next_cursor))
+
+
+# Объявлен до /{chat_id}, иначе "create" разбирается как chat_id
+@router.get("/create")
+async def get_frontend(request: Request):
+    return templates.TemplateResponse("create_chat.html", {"request": request})
+
+
+@router.get("/export")
+async def export_messages(chat_id: int | None = None,
+                          since: datetime | None = None,
+                          until: datetime | None = None,
+                          after_id: int | None = None,
+                          format: Literal["ndjson", "csv"] = "ndjson",
+                          gzip: bool = False,
+                          user: PublicUserData = Depends(get_principal),
+                          db: AsyncSession = Depends(get_read_db)):
+    """
+    Потоковая выгрузка истории чата или всех чатов пользователя за период.
+
+    after_id - id последнего уже выгруженного сообщения, чтобы продолжить
+    прерванную выгрузку. Строки идут по возрастанию id.
+    """
+    if chat_id is not None and not await service_chats.check_user_in_chat(db=db, chat_id=chat_id, username=user.username):
+        raise HTTPException(status_code=403, detail="Вы не участник этого чата")
+
+    async def body():
+        # Своя сессия: сессия зависимости закрывается до того, как начнётся отправка тела ответа
+        async with session_router.for_read(user.username)() as export_db:
+            async for chunk in service_export.export_stream(
+                export_db, format, gzip,
+                chat_id=chat_id, username=user.username, since=since, until=until, after_id=after_id,
+            ):
+                yield chunk
+
+    filename = f"chat-{chat_id}" if chat_id is not None else "messages"
+    filename += f".{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        body(),
+        media_type="application/gzip" if gzip else service_export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/search", response_model=MessageSearchPage)
+async def search_messages(q: str = Query(..., min_length=1, max_length=200),
+                          chat_id: int | None = None,
+                          cursor: str | None = None,
+                          limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_PAGE_MAX),
+                          user: PublicUserData = Depends(get_principal),
+                          db: AsyncSession = Depends(get_read_db)):
+    # Ищет только в чатах, где состоит пользователь; chat_id сужает поиск до одного чата
     try:
-        user = service_users.get_current_user(db=db, token=token)
-        if service_chats.check_user_in_chat(db=db, chat_id=chat_id, username=user.username):
-            chat = service_chats.get_one(db, chat_id)
+        return await service_messages.search(db, user.username, q, chat_id=chat_id, cursor=cursor, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+@router.get("/{chat_id}", response_model=Chat, response_model_exclude={"messages"})
+async def get_chat(chat_id: int, db: AsyncSession = Depends(get_read_db), user: PublicUserData = Depends(get_principal)):
+    try:
+        if await service_chats.check_user_in_chat(db=db, chat_id=chat_id, username=user.username):
+            chat = await service_chats.get_one(db, chat_id)
             if not chat:
                 raise HTTPException(status_code=404, detail="Chat not found")
             return chat
@@ -104,23 +272,85 @@ async def get_chat(chat_id: int, db: Session = Depends(get_db), token: str = Dep
         raise HTTPException(status_code=500, detail=str(ex))
 
 
-@router.get("/create")
-async def get_frontend(request: Request):
-    return templates.TemplateResponse("create_chat.html", {"request": request})
+@router.post("/{chat_id}/members", response_model=MembersResult)
+async def add_chat_members(chat_id: int, request: MembersRequest,
+                           user: PublicUserData = Depends(get_principal),
+                           db: AsyncSession = Depends(get_async_db)):
+    # Добавлять может любой участник чата; весь список - одним запросом и одним событием
+    if not await service_chats.check_user_in_chat(db=db, chat_id=chat_id, username=user.username):
+        raise HTTPException(status_code=403, detail="Вы не участник этого чата")
+    try:
+        results = await service_chats.add_members(db, chat_id, request.usernames)
+    except Missing as ex:
+        raise HTTPException(status_code=404, detail=ex.msg)
+    added = [name for name, outcome in results.items() if outcome == service_chats.MEMBER_ADDED]
+    if added:
+        await publish_membership(chat_id, added=added, removed=[])
+    return MembersResult(chat_id=chat_id, results=results)
+
+
+@router.post("/{chat_id}/members/remove", response_model=MembersResult)
+async def remove_chat_members(chat_id: int, request: MembersRequest,
+                              user: PublicUserData = Depends(get_principal),
+                              db: AsyncSession = Depends(get_async_db)):
+    # Удалять других может только владелец чата, остальные - только себя
+    try:
+        owner = await service_chats.get_owner(db, chat_id)
+    except Missing as ex:
+        raise HTTPException(status_code=404, detail=ex.msg)
+    if user.username != owner and set(request.usernames) != {user.username}:
+        raise HTTPException(status_code=403, detail="Удалять участников может только владелец чата")
+    results = await service_chats.remove_members(db, chat_id, request.usernames)
+    removed = [name for name, outcome in results.items() if outcome == service_chats.MEMBER_REMOVED]
+    if removed:
+        await publish_membership(chat_id, added=[], removed=removed)
+    return MembersResult(chat_id=chat_id, results=results)
+
+
+@router.get("/{chat_id}/messages", response_model=MessagePage, response_class=RawJSONResponse)
+async def get_chat_messages(chat_id: int,
+                            before_id: int | None = None,
+                            after_id: int | None = None,
+                            limit: int = Query(50, ge=1, le=MESSAGES_PAGE_MAX),
+                            db: AsyncSession = Depends(get_read_db),
+                            user: PublicUserData = Depends(get_principal)):
+    if not await service_chats.check_user_in_chat(db=db, chat_id=chat_id, username=user.username):
+        raise HTTPException(status_code=403, detail="Вы не участник этого чата")
+    # Быстрый путь: кортежи колонок сразу в JSON, без Pydantic на каждое сообщение
+    rows, has_more = await service_messages.get_page_rows(db, chat_id, before_id=before_id, after_id=after_id, limit=limit)
+    return RawJSONResponse(encode_message_page(rows, has_more))
+
+
+@router.get("/{chat_id}/messages/at", response_model=MessagePage, response_class=RawJSONResponse)
+async def get_chat_messages_at(chat_id: int,
+                               timestamp: datetime,
+                               limit: int = Query(50, ge=1, le=MESSAGES_PAGE_MAX),
+                               db: AsyncSession = Depends(get_read_db),
+                               user: PublicUserData = Depends(get_principal)):
+    if not await service_chats.check_user_in_chat(db=db, chat_id=chat_id, username=user.username):
+        raise HTTPException(status_code=403, detail="Вы не участник этого чата")
+    rows, has_more = await service_messages.get_page_at_rows(db, chat_id, timestamp=timestamp, limit=limit)
+    return RawJSONResponse(encode_message_page(rows, has_more))
 
 
 @router.post("/create")
 async def create_chat(request: Request,
                       chat: ChatCreateRequest,  # Получаем данные из тела запроса
-                      db: Session = Depends(get_db),
+                      db: AsyncSession = Depends(get_async_db),
                       token = Depends(oauth2_dep)):
     try:
-        chat_obj = service_chats.create(db=db, chat = chat, token=token)
+        chat_obj = await service_chats.create(db=db, chat = chat, token=token)
+
+        # Подключённые участники на любом воркере начинают получать сообщения нового чата сразу
+        await publish_membership(chat_obj.id, added=[member.username for member in chat_obj.users], removed=[])
         return {
             "message": "Чат успешно создан",
             "chat_title": chat.chat_title,
             "users": chat.users
         }
+    except Missing as ex:
+        # Все ненайденные имена одним сообщением
+        raise HTTPException(status_code=422, detail=ex.msg)
     except Exception as ex:
         logger.error(f"Получены данные для создания чата: Title = {chat.chat_title}, Users = {chat.users}")
         logger.error(f"Ошибка при создании чата: {str(ex)}")
@@ -129,75 +359,28 @@ async def create_chat(request: Request,
 
 @router.post("/send")
 async def send_message(
-        request: Request,
-        db: Session = Depends(get_db),
-        token: str = Depends(oauth2_dep)
+        body: SendMessageRequest,
+        db: AsyncSession = Depends(get_async_db),
+        user: PublicUserData = Depends(get_principal)
 ):
     try:
-        data = await request.json()
-        chat_id = data.get('chat_id')
-        content = data.get('content')
-
-        if not chat_id or not content:
+        if not body.content:
             raise HTTPException(status_code=400, detail="Не указан ID чата или содержание сообщения")
 
-        user = service_users.get_current_user(db, token)
-        username = user.username
-
-        if not service_chats.check_user_in_chat(db, chat_id, username):
+        # Участие в чате проверяется в том же запросе, что и вставка
+        message = await post_message(db, user.username, body.chat_id, body.content)
+        if message is None:
             raise HTTPException(status_code=403, detail="Вы не участник этого чата")
 
-        # Создаем и сохраняем сообщение
-        message = Message(
-            content=content,
-            username=username,
-            chat_id=chat_id
-        )
-
-        db_message = service_chats.add_message_to_chat(db=db, message_pydantic=message)
-
-        db.add(db_message)
-        db.commit()
-        db.refresh(db_message)
-
-        # Формируем данные для рассылки
-        message_data = {
-            "type": "new_message",
-            "chat_id": chat_id,
-            "message": {
-                "content": db_message.content,
-                "username": db_message.username,
-                "timestamp": db_message.timestamp.isoformat(),
-                "chat_id": db_message.chat_id
-            }
-        }
-
-        # Рассылаем сообщения
-        send_errors = []
-        for recipient, ws in list(active_connections.items()):
-            try:
-                if recipient != username:
-                    await ws.send_json(message_data)
-            except Exception as e:
-                logger.error(f"Failed to send to {recipient}: {e}")
-                send_errors.append(recipient)
-
-        # Удаляем неактивные соединения
-        for recipient in send_errors:
-            try:
-                del active_connections[recipient]
-            except KeyError:
-                pass
-
         return {
             "status": "message_sent",
-            "message": message_data["message"]
+            "message": message
         }
 
     except HTTPException:
         raise
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error: {e}")
         raise HTTPException(status_code=500, detail="Ошибка базы данных")
     except Exception as ex:
@@ -206,5 +389,5 @@ async def send_message(
 
 
 @router.delete("/delete")
-async def delete_chat(request: Request, chat_id: int, token: str = Depends(oauth2_dep), db: Session = Depends(get_db)):
+async def delete_chat(request: Request, chat_id: int, user: PublicUserData = Depends(get_principal), db: AsyncSession = Depends(get_async_db)):
     pass
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+from ...db import init_postgre
+
+
+router = APIRouter()
+
+
+@router.get("/healthz")
+async def healthz():
+    # Живость: процесс отвечает. База не проверяется, иначе её сбой перезапускал бы все воркеры
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz(request: Request):
+    # Готовность: старт завершён и база отвечает; иначе балансировщик не шлёт сюда запросы
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse({"status": "starting"}, status_code=503)
+    if not await init_postgre.ping():
+        return JSONResponse({"status": "database unavailable"}, status_code=503)
+    return {"status": "ready"}
@@ -2,24 +2,26 @@ import os
 import sys
 from fastapi import APIRouter, HTTPException, Request, Form, Depends
 from fastapi.responses import RedirectResponse
-from ...errors import Duplicate, Missing, MailDuplicate
-from ...models import User
+from ...errors import Duplicate, Missing, MailDuplicate, Overloaded
+from ...models import User, PublicUserData
 if os.getenv("MIRROR_TESTS"):
     from ...tests.fake.service import users as service
+    from ...tests.fake.service import users_async as service_users
 else:
     from ...service import users as service
+    from ...service import users_async as service_users
 from ...settings import TEMPLATES as templates
-from ..deps import oauth2_dep, unauthed, get_db
+from ..deps import oauth2_dep, unauthed, overloaded, get_db, get_async_db, get_principal
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
 router = APIRouter(tags=["login","registration"])
 
 
 @router.get("/")
-async def main_link(request : Request, token:str = Depends(oauth2_dep), db: Session = Depends(get_db)):
+async def main_link(request : Request, user: PublicUserData = Depends(get_principal)):
     try:
-        user = service.get_curret_user(db=db, token = token)
         response = RedirectResponse(url = f"/users/{user.username}")
         response.status_code = 302
         print(f"Redirecting to /users/{user.username}") 
@@ -29,9 +31,9 @@ async def main_link(request : Request, token:str = Depends(oauth2_dep), db: Sess
 
 
 @router.get("/registration")
-async def registration_page(request : Request, db: Session = Depends(get_db)):
+async def registration_page(request : Request, db: AsyncSession = Depends(get_async_db)):
     try:
-        if ((token := request.cookies.get("access_token")) and (user := service.get_curret_user(db=db, token=token))):
+        if ((token := request.cookies.get("access_token")) and (user := await service_users.resolve_principal(db, token))):
             response = RedirectResponse(url = f"/users/{user.username}")
             response.status_code = 302
         else:
@@ -43,16 +45,18 @@ async def registration_page(request : Request, db: Session = Depends(get_db)):
 
 
 @router.post("/registration")
-async def registration_user(request : Request, db: Session = Depends(get_db),
+async def registration_user(request : Request, db: AsyncSession = Depends(get_async_db),
                       username: str = Form(...),
                       email:str = Form(...),
                       password:str = Form(...)):
     try:
-        user = User(username=username, email=email, password=service.get_hash(password))
-        service.create(db=db, user=user)
+        user = User(username=username, email=email, password=await service_users.get_hash(password))
+        await service_users.create(db=db, user=user)
         response = RedirectResponse(url="/login")
         response.status_code = 302
         return response
+    except Overloaded as ex:
+        overloaded(ex)
     except Duplicate as ex:
         raise HTTPException(status_code=409, detail=ex.msg)
     except MailDuplicate as ex:
@@ -70,13 +74,15 @@ async def login_page(requets: Request, db: Session = Depends(get_db)):
     
 
 @router.post("/login")
-async def login_user(request : Request, db: Session = Depends(get_db),
+async def login_user(request : Request, db: AsyncSession = Depends(get_async_db),
                username : str = Form(...),
                password : str = Form(...)):
     try:
-        db_user = service.auth_user(db=db, username = username, plain=password)
+        db_user = await service_users.auth_user(db=db, username = username, plain=password)
     except Missing:
         raise HTTPException(status_code=401, detail="Invalid username or password")
+    except Overloaded as ex:
+        overloaded(ex)
 
     if not db_user:
         raise HTTPException(status_code=401, detail="Invalid username or password")
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from ...metrics import REGISTRY
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Формат text/plain 0.0.4 - его читает Prometheus без дополнительных библиотек
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
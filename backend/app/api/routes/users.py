@@ -1,14 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, Request, Form
+from fastapi import APIRouter, HTTPException, Depends, Request, Form, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.templating import Jinja2Templates
 import os
 from datetime import timedelta, datetime
 
-from ...models import User
+from ...models import User, PublicUserData, UserDirectoryPage
 from ...errors import Duplicate, Missing
-from ..deps import unauthed, oauth2_dep, get_db
+from ..deps import unauthed, oauth2_dep, get_db, get_async_db, get_read_db, get_principal
 from ...settings import TEMPLATES as templates
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from ...service import users_async as service_users
 
 if os.getenv("MIRROR_TESTS"):
     from ...tests.fake.service import users as service
@@ -17,6 +18,8 @@ else:
 
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+DIRECTORY_PAGE_SIZE = 50  # Пользователей на странице справочника
+DIRECTORY_PAGE_MAX = 200
 
 
 router = APIRouter(prefix="/users")
@@ -37,16 +40,25 @@ async def get_access_token(token : str = Depends(oauth2_dep)) -> dict:
     return {"token" : token}
 
 
-@router.get("/")
-async def get_all(db: Session = Depends(get_db)):
-    return service.get_all(db=db)
+@router.get("/", response_model=UserDirectoryPage)
+async def get_directory(q: str | None = Query(None, max_length=100),
+                        cursor: str | None = None,
+                        limit: int = Query(DIRECTORY_PAGE_SIZE, ge=1, le=DIRECTORY_PAGE_MAX),
+                        principal: PublicUserData = Depends(get_principal),
+                        db: AsyncSession = Depends(get_read_db)):
+    # Справочник вместо выгрузки всей таблицы: публичные данные, поиск по началу логина или почты
+    return await service_users.get_directory(db, query=q, cursor=cursor, limit=limit)
 
 
 @router.get("/{username}")
-async def user_page(request: Request, username:str, token:str = Depends(oauth2_dep), db: Session = Depends(get_db)):
+async def user_page(request: Request, username:str,
+                    principal: PublicUserData = Depends(get_principal),
+                    db: AsyncSession = Depends(get_async_db)):
     try:
-        user = service.get_one(db, username)
-        can_edit = service.get_current_user(db, token) == user
+        # Публичные данные страницы и текущего пользователя берутся из кеша
+        if not (user := await service_users.get_public(db, username)):
+            raise Missing(msg=f"User {username} not found")
+        can_edit = principal.username == user.username
 
         return templates.TemplateResponse("user_page.html", {
             "request": request,  # Это нужно для работы Jinja2
@@ -0,0 +1,59 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable
+
+from .settings import USER_CACHE_SIZE, USER_CACHE_TTL
+
+
+class TTLCache:
+    """
+    LRU кеш с ограничением времени жизни записей.
+
+    Потокобезопасен: синхронные обработчики FastAPI выполняются в пуле потоков
+    и тоже инвалидируют записи.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+# Публичные данные пользователей (PublicUserData) по username, без хеша пароля.
+# Инвалидируется в data.users_postgre(_async).modify/delete; в других воркерах
+# устаревшая запись живёт не дольше USER_CACHE_TTL.
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
@@ -1,76 +1,389 @@
 from http.client import HTTPException
 
-from sqlalchemy.orm import Session
-from ..models import ChatBase, Chat, pydantic_to_sqlalchemy, sqlalchemy_to_pydantic, User, UserBase, Message, MessageBase, ChatCreated
+from sqlalchemy import update, select, delete as sql_delete, insert as sql_insert, bindparam, case, or_, func, literal, Integer, DateTime
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, joinedload, selectinload, raiseload
+from sqlalchemy.orm.attributes import set_committed_value
+from ..models import ChatBase, ChatUser, Chat, pydantic_to_sqlalchemy, sqlalchemy_to_pydantic, User, UserBase, Message, MessageBase, ChatCreated, PublicUserData
 from ..errors import Duplicate, Missing
+from .users_postgre import user_query
 from backend.app.settings import logger
 
 from sqlalchemy.exc import IntegrityError
 from typing import List, Dict, Any
-from sqlalchemy.orm.query import Query
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm.exc import NoResultFound
 from datetime import datetime
 
 
-def check_user_in_chat(db: Session, chat_id: int, username: str) -> bool:
-    try:
-        # Ищем чат по chat_id
-        chat = db.query(ChatBase).filter(ChatBase.id == chat_id).first()
-        # Ищем пользователя по username
-        user = db.query(UserBase).filter(UserBase.username == username).first()
+# Счётчики активности чата (ChatBase.last_message_id, last_message_at, message_count).
+# Выражения общие для синхронного и асинхронного слоя данных и выполняются в той же
+# транзакции, что и запись сообщений. Работают на уровне таблицы, поэтому одно и то же
+# выражение подходит и для одного чата, и для executemany по нескольким чатам.
+chats_table = ChatBase.__table__
+
+_newer = or_(chats_table.c.last_message_id.is_(None),
+             chats_table.c.last_message_id < bindparam("b_last_id", type_=Integer))
+
+COUNTERS_AFTER_INSERT = (
+    update(chats_table)
+    .where(chats_table.c.id == bindparam("b_chat_id", type_=Integer))
+    .values(
+        message_count=chats_table.c.message_count + bindparam("b_count", type_=Integer),
+        # Пакеты разных транзакций могут закоммититься не по порядку id
+        last_message_id=case((_newer, bindparam("b_last_id", type_=Integer)), else_=chats_table.c.last_message_id),
+        last_message_at=case((_newer, bindparam("b_last_at", type_=DateTime)), else_=chats_table.c.last_message_at),
+    )
+)
+
+
+def counters_params(chat_id: int, last_id: int, last_at: datetime, count: int = 1) -> dict:
+    """Параметры COUNTERS_AFTER_INSERT: в чат chat_id добавлено count сообщений, последнее - last_id."""
+    return {"b_chat_id": chat_id, "b_count": count, "b_last_id": last_id, "b_last_at": last_at}
+
+
+# Удалено одно сообщение (строка уже удалена в этой транзакции): счётчик уменьшается на 1,
+# а последнее сообщение ищется по индексу (chat_id, id), только если удалено именно оно
+_deleted_last = chats_table.c.last_message_id == bindparam("b_deleted_id", type_=Integer)
+_remaining_last = (
+    select(MessageBase.id)
+    .where(MessageBase.chat_id == chats_table.c.id)
+    .order_by(MessageBase.id.desc())
+    .limit(1)
+)
+
+COUNTERS_AFTER_DELETE = (
+    update(chats_table)
+    .where(chats_table.c.id == bindparam("b_chat_id", type_=Integer))
+    .values(
+        message_count=chats_table.c.message_count - 1,
+        last_message_id=case((_deleted_last, _remaining_last.scalar_subquery()),
+                             else_=chats_table.c.last_message_id),
+        last_message_at=case((_deleted_last, _remaining_last.with_only_columns(MessageBase.timestamp).scalar_subquery()),
+                             else_=chats_table.c.last_message_at),
+    )
+)
+
+
+def counters_delete_params(chat_id: int, message_id: int) -> dict:
+    """Параметры COUNTERS_AFTER_DELETE: из чата chat_id удалено сообщение message_id."""
+    return {"b_chat_id": chat_id, "b_deleted_id": message_id}
+
+
+def counters_recompute(chat_ids: List[int]):
+    """Полный пересчёт счётчиков чатов по таблице messages: для починки (recompute_counters)."""
+    # Последнее сообщение чата по индексу (chat_id, id)
+    last = (
+        select(MessageBase.id)
+        .where(MessageBase.chat_id == chats_table.c.id)
+        .order_by(MessageBase.id.desc())
+        .limit(1)
+    )
+    return (
+        update(chats_table)
+        .where(chats_table.c.id.in_(chat_ids))
+        .values(
+            message_count=select(func.count(MessageBase.id)).where(MessageBase.chat_id == chats_table.c.id).scalar_subquery(),
+            last_message_id=last.with_only_columns(MessageBase.id).scalar_subquery(),
+            last_message_at=last.with_only_columns(MessageBase.timestamp).scalar_subquery(),
+        )
+    )
+
+
+def recompute_counters(db: Session, batch_size: int = 500) -> int:
+    """
+    Пересчитывает счётчики всех чатов пакетами по batch_size, каждый пакет - своя транзакция.
+
+    :return: Число обработанных чатов
+    """
+    done = 0
+    last_chat_id = 0
+    while True:
+        chat_ids = list(db.execute(
+            select(chats_table.c.id).where(chats_table.c.id > last_chat_id).order_by(chats_table.c.id).limit(batch_size)
+        ).scalars().all())
+        if not chat_ids:
+            return done
+        db.execute(counters_recompute(chat_ids))
+        db.commit()
+        done += len(chat_ids)
+        last_chat_id = chat_ids[-1]
+        logger.info(f"Recomputed counters for {done} chats")
 
-        # Если чат или пользователь не найдены, возвращаем False
-        if not chat or not user:
-            return False
 
-        # Проверяем, есть ли пользователь в списке пользователей чата
-        if user in chat.users:
-            return True
+# Массовое изменение состава чата: один INSERT или DELETE на весь список пользователей
+# вместо загрузки chat.users и коммита на каждого. Выражения общие для синхронного и
+# асинхронного слоя данных. Итог по каждому пользователю - одна из строк ниже.
+MEMBER_ADDED = "added"
+MEMBER_EXISTS = "already_member"
+MEMBER_REMOVED = "removed"
+MEMBER_MISSING = "not_member"
+MEMBER_OWNER = "owner"  # Владельца из чата не удалить
+USER_MISSING = "unknown_user"
 
-        return False
+
+def unique_usernames(usernames: List[str]) -> List[str]:
+    return list(dict.fromkeys(name.strip() for name in usernames if name.strip()))
+
+
+def chat_owner_query(chat_id: int):
+    return select(ChatBase.owner_username).filter(ChatBase.id == chat_id)
+
+
+def chat_query(chat_id: int):
+    return select(ChatBase).filter(ChatBase.id == chat_id)
+
+
+def message_query(message_id: int):
+    return select(MessageBase).filter(MessageBase.id == message_id)
+
+
+def chats_filter_query(filters: List[Dict[str, Any]]):
+    """Запрос чатов по равенству колонок: [{"owner_username": "alice"}]."""
+    query = select(ChatBase)
+    for filter_item in filters:
+        column = list(filter_item.keys())[0]
+        query = query.filter(getattr(ChatBase, column) == filter_item[column])
+    return query
+
+
+def user_chats_query(user: UserBase):
+    return select(ChatBase).filter(ChatBase.users.contains(user))
+
+
+def insert_members(dialect: str, chat_id: int, usernames: List[str]):
+    """
+    INSERT ... SELECT FROM users ON CONFLICT DO NOTHING RETURNING username.
+
+    Вставляются только существующие пользователи, которых ещё нет в чате.
+    Новые участники начинают с прочитанной историей: отметка прочтения - последнее
+    сообщение чата на момент добавления.
+    """
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    last_message_id = select(ChatBase.last_message_id).filter(ChatBase.id == chat_id).scalar_subquery()
+    source = (
+        select(literal(chat_id, Integer), UserBase.username, last_message_id)
+        .filter(UserBase.username.in_(usernames))
+    )
+    return (
+        insert(ChatUser)
+        .from_select(["chat_id", "username", "last_read_message_id"], source)
+        .on_conflict_do_nothing()
+        .returning(ChatUser.username)
+    )
+
+
+def existing_users_query(usernames: List[str]):
+    return select(UserBase.username).filter(UserBase.username.in_(usernames))
+
+
+def delete_members(chat_id: int, usernames: List[str], owner: str):
+    return (
+        sql_delete(ChatUser)
+        .where(ChatUser.chat_id == chat_id, ChatUser.username.in_(usernames), ChatUser.username != owner)
+        .returning(ChatUser.username)
+    )
+
+
+def added_outcomes(usernames: List[str], added: set, existing: set) -> Dict[str, str]:
+    return {
+        name: MEMBER_ADDED if name in added else MEMBER_EXISTS if name in existing else USER_MISSING
+        for name in usernames
+    }
+
+
+def removed_outcomes(usernames: List[str], removed: set, owner: str) -> Dict[str, str]:
+    return {
+        name: MEMBER_REMOVED if name in removed else MEMBER_OWNER if name == owner else MEMBER_MISSING
+        for name in usernames
+    }
+
+
+# Создание чата: владелец и все участники разрешаются одним запросом IN,
+# строки chat_users вставляются одним executemany
+def public_users_query(usernames: List[str]):
+    return select(UserBase.username, UserBase.email, UserBase.about).filter(UserBase.username.in_(usernames))
+
+
+def resolve_members(rows, owner: str, usernames: List[str]) -> tuple[PublicUserData, List[PublicUserData]]:
+    """
+    Владелец и участники нового чата из строк public_users_query.
+
+    :return: Владелец и участники по порядку запроса, владелец всегда среди участников
+    :raises Missing: Со списком всех ненайденных имён сразу
+    """
+    found = {row.username: PublicUserData(username=row.username, email=row.email, about=row.about or "")
+             for row in rows}
+    missing = [name for name in [owner] + usernames if name not in found]
+    if missing:
+        raise Missing(msg=f"Users not found: {', '.join(dict.fromkeys(missing))}")
+    return found[owner], [found[name] for name in unique_usernames([owner] + usernames)]
+
+
+def insert_chat_query(title: str, owner: str):
+    return sql_insert(chats_table).values(title=title, owner_username=owner).returning(chats_table.c.id)
+
+
+def chat_users_rows(chat_id: int, members: List[PublicUserData]) -> List[Dict[str, Any]]:
+    # Истории ещё нет: отметка прочтения пустая
+    return [{"chat_id": chat_id, "username": member.username, "last_read_message_id": None} for member in members]
+
+
+def created_chat(chat_id: int, title: str, owner: PublicUserData, members: List[PublicUserData]) -> Chat:
+    return Chat(id=chat_id, title=title, chat_owner=owner.username, owner=owner, users=members, messages=[])
+
+
+# Профили загрузки ChatBase для ChatBase.to_pydantic(). Каждый профиль заранее
+# подгружает нужные связи, а ненужные закрывает raiseload: случайное обращение к
+# ним упадёт сразу, а не превратится в ленивый запрос на каждый чат (N+1).
+class LoadProfile:
+    def __init__(self, options: tuple, with_users: bool, with_messages: bool):
+        self.options = options
+        self.with_users = with_users
+        self.with_messages = with_messages
+
+
+LOAD_PROFILES = {
+    # Только метаданные и владелец: 1 запрос
+    "summary": LoadProfile(
+        (joinedload(ChatBase.owner), raiseload(ChatBase.users), raiseload(ChatBase.messages)),
+        with_users=False, with_messages=False,
+    ),
+    # Метаданные и участники: 2 запроса
+    "members": LoadProfile(
+        (joinedload(ChatBase.owner), selectinload(ChatBase.users), raiseload(ChatBase.messages)),
+        with_users=True, with_messages=False,
+    ),
+    # С историей сообщений: 3 запроса. При заданном окне history сообщения
+    # грузятся отдельным запросом load_history, а не selectinload
+    "full": LoadProfile(
+        (joinedload(ChatBase.owner), selectinload(ChatBase.users), selectinload(ChatBase.messages)),
+        with_users=True, with_messages=True,
+    ),
+}
+
+
+def load_options(profile: str, history: int | None = None) -> tuple:
+    """Опции запроса ChatBase для профиля; history - окно последних сообщений каждого чата."""
+    options = LOAD_PROFILES[profile].options
+    if profile == "full" and history is not None:
+        options = options[:-1] + (raiseload(ChatBase.messages),)
+    return options
+
+
+def history_query(chat_ids: List[int], history: int):
+    """Последние history сообщений каждого из чатов одним запросом (row_number по чату)."""
+    position = func.row_number().over(partition_by=MessageBase.chat_id, order_by=MessageBase.id.desc()).label("position")
+    window = select(MessageBase.id, position).where(MessageBase.chat_id.in_(chat_ids)).subquery()
+    return (
+        select(MessageBase)
+        .join(window, window.c.id == MessageBase.id)
+        .where(window.c.position <= history)
+        .order_by(MessageBase.chat_id, MessageBase.id)
+    )
+
+
+def attach_history(chats: List[ChatBase], messages: List[MessageBase]) -> None:
+    """Кладёт загруженное окно в ChatBase.messages как уже загруженную связь."""
+    by_chat: dict[int, list[MessageBase]] = {chat.id: [] for chat in chats}
+    for message in messages:
+        by_chat[message.chat_id].append(message)
+    for chat in chats:
+        set_committed_value(chat, "messages", by_chat[chat.id])
+
+
+def to_pydantic_list(chats: List[ChatBase], profile: str) -> List[Chat]:
+    loading = LOAD_PROFILES[profile]
+    return [chat.to_pydantic(with_messages=loading.with_messages, with_users=loading.with_users) for chat in chats]
+
+
+def load_chats(db: Session, query, profile: str = "full", history: int | None = None) -> List[Chat]:
+    """Выполняет запрос ChatBase с профилем загрузки: число запросов не зависит от числа чатов."""
+    chats = list(db.execute(query.options(*load_options(profile, history))).unique().scalars().all())
+    if profile == "full" and history is not None and chats:
+        attach_history(chats, db.execute(history_query([chat.id for chat in chats], history)).scalars().all())
+    return to_pydantic_list(chats, profile)
+
+
+def membership_query(chat_id: int, username: str):
+    """Участие по первичному ключу chat_users, без загрузки всего состава чата."""
+    return select(ChatUser.chat_id).filter(ChatUser.chat_id == chat_id, ChatUser.username == username).limit(1)
+
+
+def check_user_in_chat(db: Session, chat_id: int, username: str) -> bool:
+    try:
+        return db.execute(membership_query(chat_id, username)).first() is not None
     except SQLAlchemyError:
         db.rollback()
         return False
 
 
+def get_owner(db: Session, chat_id: int) -> str:
+    """:raises Missing: Если чата нет"""
+    owner = db.execute(chat_owner_query(chat_id)).scalar()
+    if owner is None:
+        raise Missing(msg=f"Chat id={chat_id} not found")
+    return owner
+
+
+
+def add_members(db: Session, chat_id: int, usernames: List[str]) -> Dict[str, str]:
+    """
+    Добавляет пользователей в чат одним запросом.
+
+    :return: Итог по каждому имени: MEMBER_ADDED, MEMBER_EXISTS или USER_MISSING
+    :raises Missing: Если чата нет
+    """
+    usernames = unique_usernames(usernames)
+    if db.execute(chat_owner_query(chat_id)).scalar() is None:
+        raise Missing(msg=f"Chat id={chat_id} not found")
+    if not usernames:
+        return {}
+    added = set(db.execute(insert_members(db.get_bind().dialect.name, chat_id, usernames)).scalars().all())
+    rest = [name for name in usernames if name not in added]
+    existing = set(db.execute(existing_users_query(rest)).scalars().all()) if rest else set()
+    db.commit()
+    return added_outcomes(usernames, added, existing)
+
+
+def remove_members(db: Session, chat_id: int, usernames: List[str]) -> Dict[str, str]:
+    """
+    Удаляет пользователей из чата одним запросом. Владелец чата не удаляется.
+
+    :return: Итог по каждому имени: MEMBER_REMOVED, MEMBER_MISSING или MEMBER_OWNER
+    :raises Missing: Если чата нет
+    """
+    usernames = unique_usernames(usernames)
+    owner = db.execute(chat_owner_query(chat_id)).scalar()
+    if owner is None:
+        raise Missing(msg=f"Chat id={chat_id} not found")
+    if not usernames:
+        return {}
+    removed = set(db.execute(delete_members(chat_id, usernames, owner)).scalars().all())
+    db.commit()
+    return removed_outcomes(usernames, removed, owner)
+
 
 def add_user_to_chat(db: Session, chat_id: int, username: str) -> bool:
     try:
-        chat = db.query(ChatBase).filter(ChatBase.id == chat_id).first()
-        user = db.query(UserBase).filter(UserBase.username == username).first()
-        if not chat or not user:
-            return False
-        if user not in chat.users:
-            chat.users.append(user)
-            db.commit()
-            return True
-        return False
-    except SQLAlchemyError:
+        return add_members(db, chat_id, [username]).get(username) == MEMBER_ADDED
+    except (Missing, SQLAlchemyError):
         db.rollback()
         return False
 
 
 def remove_user_from_chat(db: Session, chat_id: int, username: str) -> bool:
     try:
-        chat = db.query(ChatBase).filter(ChatBase.id == chat_id).first()
-        user = db.query(UserBase).filter(UserBase.username == username).first()
-        if not chat or not user:
-            return False
-        if user in chat.users:
-            chat.users.remove(user)
-            db.commit()
-            return True
-        return False
-    except SQLAlchemyError:
+        return remove_members(db, chat_id, [username]).get(username) == MEMBER_REMOVED
+    except (Missing, SQLAlchemyError):
         db.rollback()
         return False
 
 
 def add_message_to_chat(db: Session, message_pydantic: Message) -> MessageBase:
     try:
-        chat_exists = db.query(ChatBase).filter(ChatBase.id == message_pydantic.chat_id).first()
-        user_exists = db.query(UserBase).filter(UserBase.username == message_pydantic.username).first()
+        chat_exists = db.execute(chat_query(message_pydantic.chat_id)).scalars().first()
+        user_exists = db.execute(user_query(message_pydantic.username)).scalars().first()
 
         if not chat_exists or not user_exists:
             return False
@@ -78,6 +391,8 @@ def add_message_to_chat(db: Session, message_pydantic: Message) -> MessageBase:
         message = MessageBase.from_pydantic(message_pydantic, db)
 
         db.add(message)
+        db.flush()
+        db.execute(COUNTERS_AFTER_INSERT, counters_params(message.chat_id, message.id, message.timestamp))
         db.commit()
         return message
     except SQLAlchemyError as e:
@@ -92,9 +407,11 @@ def add_message_to_chat(db: Session, message_pydantic: Message) -> MessageBase:
 
 def delete_message_from_chat(db: Session, message_id: int) -> bool:
     try:
-        message = db.query(MessageBase).filter(MessageBase.id == message_id).first()
+        message = db.execute(message_query(message_id)).scalars().first()
         if message:
             db.delete(message)
+            db.flush()
+            db.execute(COUNTERS_AFTER_DELETE, counters_delete_params(message.chat_id, message.id))
             db.commit()
             return True
         return False
@@ -103,18 +420,17 @@ def delete_message_from_chat(db: Session, message_id: int) -> bool:
         return False
 
 
-def get_one(db : Session, chat_id : int) -> Chat:
-    chat = db.query(ChatBase).filter(ChatBase.id == chat_id).first()
-    if chat:
-        return chat.to_pydantic()
+def get_one(db : Session, chat_id : int, profile: str = "full", history: int | None = None) -> Chat:
+    chats = load_chats(db, chat_query(chat_id), profile, history)
+    if chats:
+        return chats[0]
     else:
         raise Missing(msg=f"Message id={chat_id} not found")
 
 
-def get_all(db: Session) -> list[Chat]:
+def get_all(db: Session, profile: str = "full", history: int | None = None) -> list[Chat]:
     try:
-        chatbase_list = db.query(ChatBase).all()
-        return [chatbase.to_pydantic() for chatbase in chatbase_list]
+        return load_chats(db, select(ChatBase), profile, history)
     except SQLAlchemyError as e:
         raise Missing(msg=f"Database error occurred: {str(e)}")
     except NoResultFound:
@@ -123,53 +439,59 @@ def get_all(db: Session) -> list[Chat]:
         raise Missing(msg=f"An unexpected error occurred: {str(e)}")
 
 
-def create(db: Session, chat: ChatCreated) -> Chat:
+def create_with_members(db: Session, title: str, owner: str, usernames: List[str]) -> Chat:
+    """
+    Создаёт чат тремя запросами при любом числе участников: разрешение всех имён
+    одним IN, вставка чата и пакетная вставка строк chat_users.
+
+    :raises Missing: Если владелец или кто-то из участников не найден - со всеми такими именами
+    """
+    usernames = unique_usernames(usernames)
     try:
-        chatbase = ChatBase.from_pydantic(chat_created = chat, db = db)
-        db.add(chatbase)
+        owner_data, members = resolve_members(
+            db.execute(public_users_query(unique_usernames([owner] + usernames))).all(), owner, usernames
+        )
+        chat_id = db.execute(insert_chat_query(title, owner)).scalar_one()
+        db.execute(sql_insert(ChatUser), chat_users_rows(chat_id, members))
         db.commit()
-        db.refresh(chatbase)
-        return chatbase.to_pydantic()
+        return created_chat(chat_id, title, owner_data, members)
     except IntegrityError:
         db.rollback()
-        raise Duplicate(msg=f"Chat with id={chat.id} already exists")
+        raise Duplicate(msg=f"Chat {title} already exists")
     except SQLAlchemyError as e:
+        db.rollback()
         raise Missing(msg=f"Database error occurred: {str(e)}")
+
+
+def create(db: Session, chat: ChatCreated) -> Chat:
+    try:
+        return create_with_members(db, chat.title, chat.chat_owner.username, [user.username for user in chat.users])
     except Exception as ex:
         logger.info(f"Data cant create chat: {ex}")
         raise ex
 
 
 def get_chats_by_filter(db: Session, filters: List[Dict[str, Any]]) -> List[Chat]:
-    query: Query = db.query(ChatBase)
     try:
-        for filter_item in filters:
-            column = list(filter_item.keys())[0]
-            value = filter_item[column]
-            query = query.filter(getattr(ChatBase, column) == value)
-
-        chatbase_list = query.all()
+        chats = load_chats(db, chats_filter_query(filters), "members")
     except SQLAlchemyError as e:
         raise Missing(msg=f"Database error occurred: {str(e)}")
     except NoResultFound:
         raise Missing(msg="No messages found")
     except Exception as e:
         raise Missing(msg=f"An unexpected error occurred: {str(e)}")
-    return [sqlalchemy_to_pydantic(chatbase, Chat) for chatbase in chatbase_list]
+    return chats
 
 
-def get_all_chats_by_user(db: Session, username: str) -> List[Chat]:
+def get_all_chats_by_user(db: Session, username: str, profile: str = "full", history: int | None = None) -> List[Chat]:
     try:
         # Находим пользователя по username
-        user = db.query(UserBase).filter(UserBase.username == username).first()
+        user = db.execute(user_query(username)).scalars().first()
         if not user:
             raise Missing(msg=f"User with username={username} not found")
 
-        # Ищем все чаты, где пользователь является участником
-        chats = db.query(ChatBase).filter(ChatBase.users.contains(user)).all()
-
-        # Преобразуем SQLAlchemy объекты в Pydantic модели
-        return [chat.to_pydantic() for chat in chats]
+        # Ищем все чаты, где пользователь является участником, и преобразуем в Pydantic модели
+        return load_chats(db, user_chats_query(user), profile, history)
     except SQLAlchemyError as e:
         # Обработка ошибок базы данных
         db.rollback()
@@ -182,7 +504,7 @@ def get_all_chats_by_user(db: Session, username: str) -> List[Chat]:
 
 def delete(db: Session, chat_id: int) -> None:
     try:
-        existing_chatbase = db.query(ChatBase).filter(ChatBase.id == chat_id).first()
+        existing_chatbase = db.execute(chat_query(chat_id)).scalars().first()
         if not existing_chatbase:
             raise Missing(msg=f"Chat id={chat_id} not found")
         db.delete(existing_chatbase)
@@ -0,0 +1,446 @@
+from sqlalchemy import select, insert, update, exists, literal, tuple_, func, or_, Text, String, Integer, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, aliased
+from ..models import ChatBase, Chat, ChatUser, sqlalchemy_to_pydantic, UserBase, Message, MessageBase, ChatCreated, ChatSummary, ChatSummaryPage
+from ..errors import Duplicate, Missing
+from backend.app.settings import logger
+from .chats_postgre import COUNTERS_AFTER_INSERT, COUNTERS_AFTER_DELETE, counters_params, counters_delete_params
+from .chats_postgre import load_options, history_query, attach_history, to_pydantic_list
+from .chats_postgre import (MEMBER_ADDED, MEMBER_REMOVED, unique_usernames, chat_owner_query, membership_query, insert_members,
+                            existing_users_query, delete_members, added_outcomes, removed_outcomes)
+from .chats_postgre import public_users_query, resolve_members, insert_chat_query, chat_users_rows, created_chat
+from .chats_postgre import chat_query, message_query, chats_filter_query, user_chats_query
+from .users_postgre import user_query
+
+from sqlalchemy.exc import IntegrityError
+from typing import List, Dict, Any
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm.exc import NoResultFound
+from datetime import datetime
+
+
+# Асинхронная версия data.chats_postgre: те же функции и сигнатуры, но с AsyncSession.
+# Ленивые загрузки в AsyncSession недоступны, поэтому связи, которые читает
+# ChatBase.to_pydantic(), подгружаются заранее по профилям загрузки chats_postgre.LOAD_PROFILES.
+
+
+async def load_chats(db: AsyncSession, query, profile: str = "full", history: int | None = None) -> List[Chat]:
+    """Выполняет запрос ChatBase с профилем загрузки: число запросов не зависит от числа чатов."""
+    chats = list((await db.execute(query.options(*load_options(profile, history)))).unique().scalars().all())
+    if profile == "full" and history is not None and chats:
+        attach_history(chats, (await db.execute(history_query([chat.id for chat in chats], history))).scalars().all())
+    return to_pydantic_list(chats, profile)
+
+PREVIEW_CHARS = 100  # Сколько символов последнего сообщения отдавать в списке чатов
+
+
+async def check_user_in_chat(db: AsyncSession, chat_id: int, username: str) -> bool:
+    try:
+        return (await db.execute(membership_query(chat_id, username))).first() is not None
+    except SQLAlchemyError:
+        await db.rollback()
+        return False
+
+
+async def get_owner(db: AsyncSession, chat_id: int) -> str:
+    """:raises Missing: Если чата нет"""
+    owner = (await db.execute(chat_owner_query(chat_id))).scalar()
+    if owner is None:
+        raise Missing(msg=f"Chat id={chat_id} not found")
+    return owner
+
+
+async def add_members(db: AsyncSession, chat_id: int, usernames: List[str]) -> Dict[str, str]:
+    """
+    Добавляет пользователей в чат одним запросом (chats_postgre.insert_members).
+
+    :return: Итог по каждому имени: MEMBER_ADDED, MEMBER_EXISTS или USER_MISSING
+    :raises Missing: Если чата нет
+    """
+    usernames = unique_usernames(usernames)
+    if (await db.execute(chat_owner_query(chat_id))).scalar() is None:
+        raise Missing(msg=f"Chat id={chat_id} not found")
+    if not usernames:
+        return {}
+    added = set((await db.execute(insert_members(db.bind.dialect.name, chat_id, usernames))).scalars().all())
+    rest = [name for name in usernames if name not in added]
+    existing = set((await db.execute(existing_users_query(rest))).scalars().all()) if rest else set()
+    await db.commit()
+    return added_outcomes(usernames, added, existing)
+
+
+async def remove_members(db: AsyncSession, chat_id: int, usernames: List[str]) -> Dict[str, str]:
+    """
+    Удаляет пользователей из чата одним запросом. Владелец чата не удаляется.
+
+    :return: Итог по каждому имени: MEMBER_REMOVED, MEMBER_MISSING или MEMBER_OWNER
+    :raises Missing: Если чата нет
+    """
+    usernames = unique_usernames(usernames)
+    owner = (await db.execute(chat_owner_query(chat_id))).scalar()
+    if owner is None:
+        raise Missing(msg=f"Chat id={chat_id} not found")
+    if not usernames:
+        return {}
+    removed = set((await db.execute(delete_members(chat_id, usernames, owner))).scalars().all())
+    await db.commit()
+    return removed_outcomes(usernames, removed, owner)
+
+
+async def add_user_to_chat(db: AsyncSession, chat_id: int, username: str) -> bool:
+    try:
+        return (await add_members(db, chat_id, [username])).get(username) == MEMBER_ADDED
+    except (Missing, SQLAlchemyError):
+        await db.rollback()
+        return False
+
+
+async def remove_user_from_chat(db: AsyncSession, chat_id: int, username: str) -> bool:
+    try:
+        return (await remove_members(db, chat_id, [username])).get(username) == MEMBER_REMOVED
+    except (Missing, SQLAlchemyError):
+        await db.rollback()
+        return False
+
+
+async def add_message_to_chat(db: AsyncSession, message_pydantic: Message) -> MessageBase:
+    try:
+        chat_exists = (await db.execute(chat_query(message_pydantic.chat_id))).scalars().first()
+        user_exists = (await db.execute(user_query(message_pydantic.username))).scalars().first()
+
+        if not chat_exists or not user_exists:
+            return False
+
+        message = await db.run_sync(lambda session: MessageBase.from_pydantic(message_pydantic, session))
+
+        db.add(message)
+        await db.flush()
+        await db.execute(COUNTERS_AFTER_INSERT, counters_params(message.chat_id, message.id, message.timestamp))
+        await db.commit()
+        return message
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Database error adding message: {e}")
+        raise e
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Unexpected error: {e}")
+        raise e
+
+
+async def insert_message_if_member(db: AsyncSession, chat_id: int, username: str, content: str) -> tuple[int, datetime] | None:
+    """
+    Быстрый путь отправки: проверка участия и вставка одним запросом.
+
+    INSERT ... SELECT ... WHERE EXISTS (chat_users) RETURNING id, timestamp.
+    Существование чата и пользователя гарантируют внешние ключи chat_users,
+    поэтому отдельные SELECT не нужны. Вторым запросом в той же транзакции
+    обновляются счётчики чата.
+
+    :return: (id, timestamp) сохранённого сообщения или None, если пользователь не участник чата
+    """
+    timestamp = datetime.utcnow()
+    membership = exists().where(ChatUser.chat_id == chat_id, ChatUser.username == username)
+    values = select(
+        literal(content, Text),
+        literal(timestamp, DateTime),
+        literal(username, String),
+        literal(chat_id, Integer),
+    ).where(membership)
+    stmt = (
+        insert(MessageBase)
+        .from_select(["content", "timestamp", "username", "chat_id"], values)
+        .returning(MessageBase.id, MessageBase.timestamp)
+    )
+    try:
+        row = (await db.execute(stmt)).first()
+        if row is not None:
+            await db.execute(COUNTERS_AFTER_INSERT, counters_params(chat_id, row.id, row.timestamp))
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Database error adding message: {e}")
+        raise e
+    if row is None:
+        return None
+    return row.id, row.timestamp
+
+
+async def insert_messages_batch(db: AsyncSession, items: List[tuple[int, str, str]]) -> List[tuple[int, datetime] | None]:
+    """
+    Пакетная вставка сообщений одной транзакцией.
+
+    Участие всех отправителей проверяется одним SELECT по chat_users, затем
+    допустимые сообщения вставляются одним многострочным INSERT ... RETURNING,
+    а счётчики затронутых чатов обновляются одним executemany UPDATE.
+
+    :param items: Список (chat_id, username, content)
+    :return: Для каждого элемента (id, timestamp) или None, если отправитель не участник чата
+    """
+    pairs = {(chat_id, username) for chat_id, username, _ in items}
+    try:
+        members = set((await db.execute(
+            select(ChatUser.chat_id, ChatUser.username).where(tuple_(ChatUser.chat_id, ChatUser.username).in_(pairs))
+        )).tuples().all())
+
+        timestamp = datetime.utcnow()
+        accepted = [i for i, (chat_id, username, _) in enumerate(items) if (chat_id, username) in members]
+        results: List[tuple[int, datetime] | None] = [None] * len(items)
+        if accepted:
+            rows = (await db.execute(
+                insert(MessageBase).returning(MessageBase.id, MessageBase.timestamp, sort_by_parameter_order=True),
+                [
+                    {"chat_id": items[i][0], "username": items[i][1], "content": items[i][2], "timestamp": timestamp}
+                    for i in accepted
+                ]
+            )).all()
+            counters: dict[int, dict] = {}
+            for i, row in zip(accepted, rows):
+                results[i] = (row.id, row.timestamp)
+                chat_id = items[i][0]
+                count = counters[chat_id]["b_count"] + 1 if chat_id in counters else 1
+                # Строки RETURNING идут в порядке параметров, id в пакете растут
+                counters[chat_id] = counters_params(chat_id, row.id, row.timestamp, count)
+            await db.execute(COUNTERS_AFTER_INSERT, list(counters.values()))
+        await db.commit()
+        return results
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Database error adding message batch: {e}")
+        raise e
+
+
+async def delete_message_from_chat(db: AsyncSession, message_id: int) -> bool:
+    try:
+        message = (await db.execute(message_query(message_id))).scalars().first()
+        if message:
+            await db.delete(message)
+            await db.flush()
+            await db.execute(COUNTERS_AFTER_DELETE, counters_delete_params(message.chat_id, message.id))
+            await db.commit()
+            return True
+        return False
+    except SQLAlchemyError:
+        await db.rollback()
+        return False
+
+
+async def get_one(db: AsyncSession, chat_id: int, profile: str = "members", history: int | None = None) -> Chat:
+    """
+    Чат по id. По умолчанию метаданные и участники без истории: сообщения
+    отдаются постранично через messages_postgre_async.get_page.
+    """
+    chats = await load_chats(db, chat_query(chat_id), profile, history)
+    if chats:
+        return chats[0]
+    else:
+        raise Missing(msg=f"Chat id={chat_id} not found")
+
+
+async def get_all(db: AsyncSession, profile: str = "full", history: int | None = None) -> list[Chat]:
+    try:
+        return await load_chats(db, select(ChatBase), profile, history)
+    except SQLAlchemyError as e:
+        raise Missing(msg=f"Database error occurred: {str(e)}")
+    except NoResultFound:
+        raise Missing(msg="No chat found")
+    except Exception as e:
+        raise Missing(msg=f"An unexpected error occurred: {str(e)}")
+
+
+async def create_with_members(db: AsyncSession, title: str, owner: str, usernames: List[str]) -> Chat:
+    """
+    Создаёт чат тремя запросами при любом числе участников (chats_postgre.create_with_members).
+
+    :raises Missing: Если владелец или кто-то из участников не найден - со всеми такими именами
+    """
+    usernames = unique_usernames(usernames)
+    try:
+        owner_data, members = resolve_members(
+            (await db.execute(public_users_query(unique_usernames([owner] + usernames)))).all(), owner, usernames
+        )
+        chat_id = (await db.execute(insert_chat_query(title, owner))).scalar_one()
+        await db.execute(insert(ChatUser), chat_users_rows(chat_id, members))
+        await db.commit()
+        return created_chat(chat_id, title, owner_data, members)
+    except IntegrityError:
+        await db.rollback()
+        raise Duplicate(msg=f"Chat {title} already exists")
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise Missing(msg=f"Database error occurred: {str(e)}")
+
+
+async def create(db: AsyncSession, chat: ChatCreated) -> Chat:
+    try:
+        return await create_with_members(db, chat.title, chat.chat_owner.username, [user.username for user in chat.users])
+    except Exception as ex:
+        logger.info(f"Data cant create chat: {ex}")
+        raise ex
+
+
+async def get_chats_by_filter(db: AsyncSession, filters: List[Dict[str, Any]]) -> List[Chat]:
+    try:
+        chats = await load_chats(db, chats_filter_query(filters), "members")
+    except SQLAlchemyError as e:
+        raise Missing(msg=f"Database error occurred: {str(e)}")
+    except NoResultFound:
+        raise Missing(msg="No messages found")
+    except Exception as e:
+        raise Missing(msg=f"An unexpected error occurred: {str(e)}")
+    return chats
+
+
+async def get_all_chats_by_user(db: AsyncSession, username: str, profile: str = "full", history: int | None = None) -> List[Chat]:
+    try:
+        user = (await db.execute(user_query(username))).scalars().first()
+        if not user:
+            raise Missing(msg=f"User with username={username} not found")
+
+        return await load_chats(db, user_chats_query(user), profile, history)
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise Missing(msg=f"Database error occurred: {str(e)}")
+    except Exception as e:
+        raise Missing(msg=f"An unexpected error occurred: {str(e)}")
+
+
+async def get_chat_ids_by_user(db: AsyncSession, username: str) -> List[int]:
+    """Идентификаторы чатов пользователя одним запросом к chat_users, без загрузки самих чатов."""
+    result = await db.execute(select(ChatUser.chat_id).filter(ChatUser.username == username))
+    return list(result.scalars().all())
+
+
+async def get_summary_rows(db: AsyncSession, username: str, before: tuple[int, int] | None = None, limit: int = 50) -> tuple[list, str | None]:
+    """
+    Список чатов пользователя для боковой панели одним запросом.
+
+    Для каждого чата: число участников, начало последнего сообщения и число
+    непрочитанных чужих сообщений после chat_users.last_read_message_id.
+    Порядок - по последней активности (ChatBase.last_message_id, id монотонны),
+    пагинация по ключу (активность, chat_id), а не по OFFSET. Последнее
+    сообщение берётся из денормализованных счётчиков чата без агрегатов по messages.
+
+    Строки - кортежи колонок в порядке api.responses.CHAT_SUMMARY_FIELDS
+    (последняя колонка activity - служебная, для курсора).
+
+    :param before: Ключ последнего чата предыдущей страницы
+    :return: Строки страницы и курсор следующей страницы
+    """
+    members = aliased(ChatUser)
+    last = aliased(MessageBase)
+
+    member_count = (
+        select(func.count())
+        .select_from(members)
+        .where(members.chat_id == ChatBase.id)
+        .correlate(ChatBase)
+        .scalar_subquery()
+    )
+    unread_count = (
+        select(func.count())
+        .select_from(MessageBase)
+        .where(
+            MessageBase.chat_id == ChatBase.id,
+            MessageBase.id > func.coalesce(ChatUser.last_read_message_id, 0),
+            MessageBase.username != ChatUser.username,
+        )
+        .correlate(ChatBase, ChatUser)
+        .scalar_subquery()
+    )
+    activity = func.coalesce(ChatBase.last_message_id, 0)
+
+    query = (
+        select(
+            ChatBase.id,
+            ChatBase.title,
+            member_count.label("member_count"),
+            unread_count.label("unread_count"),
+            ChatBase.message_count,
+            last.id.label("last_message_id"),
+            func.substr(last.content, 1, PREVIEW_CHARS).label("last_message_preview"),
+            last.username.label("last_message_username"),
+            last.timestamp.label("last_message_at"),
+            activity.label("activity"),
+        )
+        .select_from(ChatUser)
+        .join(ChatBase, ChatBase.id == ChatUser.chat_id)
+        .outerjoin(last, last.id == ChatBase.last_message_id)
+        .where(ChatUser.username == username)
+        .order_by(activity.desc(), ChatBase.id.desc())
+        .limit(limit + 1)
+    )
+    if before is not None:
+        query = query.where(tuple_(activity, ChatBase.id) < tuple_(*before))
+
+    rows = (await db.execute(query)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = f"{rows[-1].activity}:{rows[-1].id}" if has_more else None
+    return rows, next_cursor
+
+
+async def get_summaries(db: AsyncSession, username: str, before: tuple[int, int] | None = None, limit: int = 50) -> ChatSummaryPage:
+    """Страница списка чатов пользователя (get_summary_rows) в виде Pydantic моделей."""
+    rows, next_cursor = await get_summary_rows(db, username, before=before, limit=limit)
+    chats = [
+        ChatSummary(
+            id=row.id,
+            title=row.title,
+            member_count=row.member_count,
+            unread_count=row.unread_count,
+            message_count=row.message_count,
+            last_message_id=row.last_message_id,
+            last_message_preview=row.last_message_preview,
+            last_message_username=row.last_message_username,
+            last_message_at=row.last_message_at,
+        )
+        for row in rows
+    ]
+    return ChatSummaryPage(chats=chats, next_cursor=next_cursor)
+
+
+async def mark_read(db: AsyncSession, chat_id: int, username: str, message_id: int) -> bool:
+    """
+    Сдвигает отметку прочтения участника вперёд до message_id.
+
+    Отметка только растёт: запоздавший ack на старое сообщение её не откатит.
+    Сообщение должно принадлежать этому чату, иначе выдуманный или чужой
+    message_id обнулил бы счётчик непрочитанных.
+
+    :return: True, если отметка изменилась
+    """
+    stmt = (
+        update(ChatUser)
+        .where(
+            ChatUser.chat_id == chat_id,
+            ChatUser.username == username,
+            or_(ChatUser.last_read_message_id.is_(None), ChatUser.last_read_message_id < message_id),
+            exists().where(MessageBase.id == message_id, MessageBase.chat_id == chat_id),
+        )
+        .values(last_read_message_id=message_id)
+    )
+    try:
+        result = await db.execute(stmt)
+        await db.commit()
+        return result.rowcount > 0
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Database error marking chat read: {e}")
+        raise e
+
+
+async def delete(db: AsyncSession, chat_id: int) -> None:
+    try:
+        existing_chatbase = (await db.execute(chat_query(chat_id))).scalars().first()
+        if not existing_chatbase:
+            raise Missing(msg=f"Chat id={chat_id} not found")
+        await db.delete(existing_chatbase)
+        await db.commit()
+        return None
+    except SQLAlchemyError as e:
+        raise Missing(msg=f"Database error occurred: {str(e)}")
+    except NoResultFound:
+        raise Missing(msg="No chat found")
+    except Exception as e:
+        raise Missing(msg=f"An unexpected error occurred: {str(e)}")
@@ -1,15 +1,32 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from ..models import Message, MessageBase, pydantic_to_sqlalchemy, sqlalchemy_to_pydantic
 from ..errors import Duplicate, Missing
 from sqlalchemy.exc import IntegrityError
 from typing import List, Dict, Any
-from sqlalchemy.orm.query import Query
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm.exc import NoResultFound
+from .chats_postgre import COUNTERS_AFTER_INSERT, COUNTERS_AFTER_DELETE, counters_params, counters_delete_params, message_query
+
+
+# Построители запросов общие для синхронной и асинхронной (messages_postgre_async) версий
+
+
+def all_messages_query():
+    return select(MessageBase)
+
+
+def messages_filter_query(filters: List[Dict[str, Any]]):
+    """Запрос сообщений по равенству колонок: [{"chat_id": 1}, {"username": "alice"}]."""
+    query = select(MessageBase)
+    for filter_item in filters:
+        column = list(filter_item.keys())[0]
+        query = query.filter(getattr(MessageBase, column) == filter_item[column])
+    return query
 
 
 def get_one(db: Session, message_id: int) -> Message:
-    message = db.query(MessageBase).filter(MessageBase.id == message_id).first()
+    message = db.execute(message_query(message_id)).scalars().first()
     if message:
         return sqlalchemy_to_pydantic(message, Message)
     else:
@@ -17,7 +34,7 @@ def get_one(db: Session, message_id: int) -> Message:
 
 
 def get_all(db: Session) -> list[Message]:
-    messagebase_list = db.query(MessageBase).all()
+    messagebase_list = db.execute(all_messages_query()).scalars().all()
     return [sqlalchemy_to_pydantic(messagebase, Message) for messagebase in messagebase_list]
 
 
@@ -25,6 +42,8 @@ def create(db: Session, message: Message) -> Message:
     messagebase = pydantic_to_sqlalchemy(message, MessageBase)
     try:
         db.add(messagebase)
+        db.flush()
+        db.execute(COUNTERS_AFTER_INSERT, counters_params(messagebase.chat_id, messagebase.id, messagebase.timestamp))
         db.commit()
         db.refresh(messagebase)
         return sqlalchemy_to_pydantic(messagebase, Message)
@@ -34,14 +53,8 @@ def create(db: Session, message: Message) -> Message:
 
 
 def get_messages_by_filter(db: Session, filters: List[Dict[str, Any]]) -> List[Message]:
-    query: Query = db.query(MessageBase)
     try:
-        for filter_item in filters:
-            column = list(filter_item.keys())[0]
-            value = filter_item[column]
-            query = query.filter(getattr(MessageBase, column) == value)
-
-        messagebase_list = query.all()
+        messagebase_list = db.execute(messages_filter_query(filters)).scalars().all()
     except SQLAlchemyError as e:
         raise Missing(msg=f"Database error occurred: {str(e)}")
     except NoResultFound:
@@ -52,9 +65,11 @@ def get_messages_by_filter(db: Session, filters: List[Dict[str, Any]]) -> List[M
 
 
 def delete(db: Session, message_id: int) -> None:
-    existing_messagebase = db.query(MessageBase).filter(MessageBase.id == message_id).first()
+    existing_messagebase = db.execute(message_query(message_id)).scalars().first()
     if not existing_messagebase:
         raise Missing(msg=f"Message id={message_id} not found")
     db.delete(existing_messagebase)
+    db.flush()
+    db.execute(COUNTERS_AFTER_DELETE, counters_delete_params(existing_messagebase.chat_id, existing_messagebase.id))
     db.commit()
     return None
\ No newline at end of file
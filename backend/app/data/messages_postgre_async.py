@@ -0,0 +1,335 @@
+import html
+import re
+
+from sqlalchemy import select, text, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import Message, MessageBase, ChatUser, MessagePage, MessageSearchHit, MessageSearchPage, pydantic_to_sqlalchemy, sqlalchemy_to_pydantic
+from ..errors import Duplicate, Missing
+from sqlalchemy.exc import IntegrityError
+from typing import List, Dict, Any, AsyncIterator
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm.exc import NoResultFound
+from datetime import datetime
+from .chats_postgre import COUNTERS_AFTER_INSERT, COUNTERS_AFTER_DELETE, counters_params, counters_delete_params, message_query
+from .messages_postgre import all_messages_query, messages_filter_query
+from ..settings import SEARCH_CONFIG, SEARCH_CANDIDATES
+
+
+# Асинхронная версия data.messages_postgre с теми же функциями и сигнатурами.
+
+
+async def get_one(db: AsyncSession, message_id: int) -> Message:
+    message = (await db.execute(message_query(message_id))).scalars().first()
+    if message:
+        return sqlalchemy_to_pydantic(message, Message)
+    else:
+        raise Missing(msg=f"Message id={message_id} not found")
+
+
+async def get_all(db: AsyncSession) -> list[Message]:
+    messagebase_list = (await db.execute(all_messages_query())).scalars().all()
+    return [sqlalchemy_to_pydantic(messagebase, Message) for messagebase in messagebase_list]
+
+
+async def create(db: AsyncSession, message: Message) -> Message:
+    messagebase = pydantic_to_sqlalchemy(message, MessageBase)
+    try:
+        db.add(messagebase)
+        await db.flush()
+        await db.execute(COUNTERS_AFTER_INSERT, counters_params(messagebase.chat_id, messagebase.id, messagebase.timestamp))
+        await db.commit()
+        await db.refresh(messagebase)
+        return sqlalchemy_to_pydantic(messagebase, Message)
+    except IntegrityError:
+        await db.rollback()
+        raise Duplicate(msg=f"Message with id={message.id} already exists")
+
+
+async def get_messages_by_filter(db: AsyncSession, filters: List[Dict[str, Any]]) -> List[Message]:
+    try:
+        messagebase_list = (await db.execute(messages_filter_query(filters))).scalars().all()
+    except SQLAlchemyError as e:
+        raise Missing(msg=f"Database error occurred: {str(e)}")
+    except NoResultFound:
+        raise Missing(msg="No messages found")
+    except Exception as e:
+        raise Missing(msg=f"An unexpected error occurred: {str(e)}")
+    return [sqlalchemy_to_pydantic(messagebase, Message) for messagebase in messagebase_list]
+
+
+# Колонки быстрого пути чтения в порядке api.responses.MESSAGE_FIELDS
+MESSAGE_COLUMNS = (MessageBase.id, MessageBase.content, MessageBase.timestamp, MessageBase.username, MessageBase.chat_id)
+
+
+async def _fetch_page(db: AsyncSession, query, before_id: int | None, after_id: int | None, limit: int) -> tuple[list, bool]:
+    """
+    Выполняет постраничный запрос по ключу (chat_id, id) без OFFSET.
+
+    Без курсоров берёт самые новые записи, с before_id листает назад, с after_id
+    вперёд. Записи в странице всегда идут по возрастанию id.
+    """
+    if before_id is not None:
+        query = query.filter(MessageBase.id < before_id)
+    if after_id is not None:
+        query = query.filter(MessageBase.id > after_id)
+
+    forward = after_id is not None and before_id is None
+    query = query.order_by(MessageBase.id.asc() if forward else MessageBase.id.desc())
+
+    # Берём на одну запись больше, чтобы узнать, есть ли следующая страница
+    rows = list((await db.execute(query.limit(limit + 1))).all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not forward:
+        rows.reverse()
+    return rows, has_more
+
+
+async def _fetch_page_at(db: AsyncSession, query, timestamp: datetime, limit: int) -> tuple[list, bool] | None:
+    """
+    Страница по ключу (timestamp, id), начиная с первого сообщения не раньше timestamp.
+
+    Порядок и has_more считаются по тому же ключу, что и начало страницы:
+    timestamp не обязан расти вместе с id (импорт, расхождение часов воркеров).
+    Использует индекс (chat_id, timestamp).
+
+    :return: Строки и has_more или None, если позже timestamp сообщений нет
+    """
+    query = (
+        query.filter(MessageBase.timestamp >= timestamp)
+        .order_by(MessageBase.timestamp.asc(), MessageBase.id.asc())
+        .limit(limit + 1)
+    )
+    rows = list((await db.execute(query)).all())
+    if not rows:
+        return None
+    return rows[:limit], len(rows) > limit
+
+
+async def get_page(db: AsyncSession, chat_id: int, before_id: int | None = None,
+                   after_id: int | None = None, limit: int = 50) -> MessagePage:
+    """
+    Страница истории чата по ключу (chat_id, id) без OFFSET.
+
+    Без курсоров возвращает самые новые сообщения, с before_id листает назад,
+    с after_id вперёд. Сообщения в странице всегда идут по возрастанию id.
+    """
+    rows, has_more = await _fetch_page(
+        db, select(MessageBase).filter(MessageBase.chat_id == chat_id), before_id, after_id, limit
+    )
+    return MessagePage(messages=[row.MessageBase.to_pydantic() for row in rows], has_more=has_more)
+
+
+async def get_page_rows(db: AsyncSession, chat_id: int, before_id: int | None = None,
+                        after_id: int | None = None, limit: int = 50) -> tuple[list, bool]:
+    """
+    То же, что get_page, но без ORM и Pydantic: кортежи колонок MESSAGE_COLUMNS.
+
+    :return: Строки страницы и признак has_more
+    """
+    return await _fetch_page(
+        db, select(*MESSAGE_COLUMNS).filter(MessageBase.chat_id == chat_id), before_id, after_id, limit
+    )
+
+
+async def get_page_at(db: AsyncSession, chat_id: int, timestamp: datetime, limit: int = 50) -> MessagePage:
+    """Страница истории, начинающаяся с первого сообщения не раньше timestamp, по ключу (timestamp, id)."""
+    page = await _fetch_page_at(db, select(MessageBase).filter(MessageBase.chat_id == chat_id), timestamp, limit)
+    if page is None:
+        # Позже timestamp сообщений нет - показываем самые новые
+        return await get_page(db, chat_id, limit=limit)
+    rows, has_more = page
+    return MessagePage(messages=[row.MessageBase.to_pydantic() for row in rows], has_more=has_more)
+
+
+async def get_page_at_rows(db: AsyncSession, chat_id: int, timestamp: datetime, limit: int = 50) -> tuple[list, bool]:
+    """То же, что get_page_at, в виде кортежей колонок MESSAGE_COLUMNS."""
+    page = await _fetch_page_at(db, select(*MESSAGE_COLUMNS).filter(MessageBase.chat_id == chat_id), timestamp, limit)
+    if page is None:
+        return await get_page_rows(db, chat_id, limit=limit)
+    return page
+
+
+async def stream_rows(db: AsyncSession, chat_id: int | None = None, username: str | None = None,
+                      since: datetime | None = None, until: datetime | None = None,
+                      after_id: int | None = None, batch_size: int = 1000) -> AsyncIterator[list]:
+    """
+    Сообщения по возрастанию id пачками по batch_size, без загрузки всей выборки в память.
+
+    Чтение идёт серверным курсором (yield_per), строки - кортежи MESSAGE_COLUMNS.
+    after_id продолжает выгрузку после последнего выгруженного сообщения.
+
+    :param chat_id: Только этот чат
+    :param username: Только чаты, в которых состоит пользователь
+    :param since: Не раньше этого времени
+    :param until: Раньше этого времени
+    """
+    query = select(*MESSAGE_COLUMNS).order_by(MessageBase.id)
+    if chat_id is not None:
+        query = query.filter(MessageBase.chat_id == chat_id)
+    if username is not None:
+        query = query.filter(MessageBase.chat_id.in_(select(ChatUser.chat_id).filter(ChatUser.username == username)))
+    if since is not None:
+        query = query.filter(MessageBase.timestamp >= since)
+    if until is not None:
+        query = query.filter(MessageBase.timestamp < until)
+    if after_id is not None:
+        query = query.filter(MessageBase.id > after_id)
+
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+    async for rows in result.partitions():
+        yield rows
+
+
+######### Полнотекстовый поиск ###########
+
+# Границы совпадений в выдаче СУБД; в HTML превращаются только после экранирования текста
+MARK_START, MARK_STOP = "\x02", "\x03"
+
+# Индекс и триггеры создаёт миграция 6 (db.migrate). Ранжируются только :candidates
+# самых новых совпадений: частое слово совпадает с большей частью базы, и считать
+# релевантность для всех совпадений слишком дорого. Одно лишнее совпадение в hits
+# показывает, что окно обрезано (truncated). Фрагмент строится только для
+# выбранной страницы: ts_headline дорогой
+SEARCH_POSTGRES = """
+WITH q AS (SELECT websearch_to_tsquery(CAST(:config AS regconfig), :query) AS query),
+hits AS (
+    SELECT m.id, ts_rank(m.search_vector, q.query) AS rank
+    FROM messages m, q
+    WHERE m.search_vector @@ q.query
+      AND m.chat_id IN (SELECT chat_id FROM chat_users WHERE username = :username)
+      {chat_filter}
+    ORDER BY m.id DESC
+    LIMIT :candidates + 1
+),
+ranked AS (
+    SELECT id, rank FROM hits ORDER BY id DESC LIMIT :candidates
+),
+page AS (
+    SELECT id, rank FROM ranked
+    {cursor_filter}
+    ORDER BY rank DESC, id DESC
+    LIMIT :limit
+)
+SELECT m.id, m.content, m.timestamp, m.username, m.chat_id, page.rank,
+       ts_headline(CAST(:config AS regconfig), m.content, q.query, :headline_options) AS highlight,
+       (SELECT count(*) FROM hits) > :candidates AS truncated
+FROM page JOIN messages m ON m.id = page.id, q
+ORDER BY page.rank DESC, page.id DESC
+"""
+HEADLINE_OPTIONS = f"StartSel={MARK_START}, StopSel={MARK_STOP}, MinWords=10, MaxWords=30, MaxFragments=2"
+
+# Локальная замена на SQLite FTS5 с тем же окном кандидатов. bm25 тем лучше,
+# чем меньше, поэтому берётся со знаком минус; колонка chat в релевантности не
+# участвует. snippet требует MATCH, поэтому для страницы индекс запрашивается
+# ещё раз, уже по rowid
+SEARCH_SQLITE = """
+WITH hits AS (
+    SELECT m.id AS id, -bm25(messages_fts, 1.0, 0.0) AS rank
+    FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+    WHERE messages_fts MATCH :query
+      AND m.chat_id IN (SELECT chat_id FROM chat_users WHERE username = :username)
+      {chat_filter}
+    ORDER BY messages_fts.rowid DESC
+    LIMIT :candidates + 1
+),
+ranked AS (
+    SELECT id, rank FROM hits ORDER BY id DESC LIMIT :candidates
+),
+page AS (
+    SELECT id, rank FROM ranked
+    {cursor_filter}
+    ORDER BY rank DESC, id DESC
+    LIMIT :limit
+)
+SELECT m.id, m.content, m.timestamp, m.username, m.chat_id, page.rank,
+       snippet(messages_fts, 0, char(2), char(3), '…', 32) AS highlight,
+       (SELECT count(*) FROM hits) > :candidates AS truncated
+FROM page
+JOIN messages_fts ON messages_fts.rowid = page.id
+JOIN messages m ON m.id = page.id
+WHERE messages_fts MATCH :query
+ORDER BY page.rank DESC, page.id DESC
+"""
+SEARCH_CURSOR = "WHERE rank < :rank OR (rank = :rank AND id < :before_id)"
+
+
+def search_terms(query: str) -> list[str]:
+    return re.findall(r"\w+", query)
+
+
+def render_highlight(fragment: str) -> str:
+    """Экранирует текст сообщения и заменяет границы совпадений на <mark>."""
+    return html.escape(fragment).replace(MARK_START, "<mark>").replace(MARK_STOP, "</mark>")
+
+
+async def search(db: AsyncSession, username: str, query: str, chat_id: int | None = None,
+                 before: tuple[float, int] | None = None, limit: int = 20) -> MessageSearchPage:
+    """
+    Полнотекстовый поиск по сообщениям чатов, в которых состоит пользователь.
+
+    В PostgreSQL - search_vector с GIN индексом, запрос в синтаксисе
+    websearch_to_tsquery со словоформами SEARCH_CONFIG; в SQLite - FTS5, все
+    слова запроса обязательны и ищутся точно. Ранжируются SEARCH_CANDIDATES
+    самых новых совпадений, порядок - по убыванию релевантности, пагинация по
+    ключу (релевантность, id). Если совпадений больше, в ответе truncated:
+    более старые совпадения не ищутся, запрос стоит уточнить.
+
+    :param chat_id: Искать только в этом чате
+    :param before: Ключ последнего сообщения предыдущей страницы
+    """
+    terms = search_terms(query)
+    if not terms:
+        return MessageSearchPage()
+
+    params = {"username": username, "limit": limit + 1, "candidates": SEARCH_CANDIDATES}
+    chat_filter = cursor_filter = ""
+    if chat_id is not None:
+        chat_filter = "AND m.chat_id = :chat_id"
+        params["chat_id"] = chat_id
+    if before is not None:
+        cursor_filter = SEARCH_CURSOR
+        params["rank"], params["before_id"] = before
+
+    if db.bind.dialect.name == "postgresql":
+        sql = SEARCH_POSTGRES
+        params.update(query=query, config=SEARCH_CONFIG, headline_options=HEADLINE_OPTIONS)
+    else:
+        sql = SEARCH_SQLITE
+        # Слова в кавычках: пользовательский ввод не должен разбираться как синтаксис FTS5.
+        # Без поиска по префиксу: префикс длинного слова сливает списки всех его продолжений
+        params["query"] = "content : (" + " ".join(f'"{term}"' for term in terms) + ")"
+        if chat_id is not None:
+            params["query"] += f' AND chat : "c{chat_id}"'
+    sql = sql.format(chat_filter=chat_filter, cursor_filter=cursor_filter)
+
+    rows = (await db.execute(text(sql).columns(timestamp=DateTime), params)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1].rank!r}:{rows[-1].id}"
+
+    hits = [
+        MessageSearchHit(
+            id=row.id,
+            content=row.content,
+            timestamp=row.timestamp,
+            username=row.username,
+            chat_id=row.chat_id,
+            rank=row.rank,
+            highlight=render_highlight(row.highlight),
+        )
+        for row in rows
+    ]
+    return MessageSearchPage(messages=hits, next_cursor=next_cursor, truncated=bool(rows and rows[0].truncated))
+
+
+async def delete(db: AsyncSession, message_id: int) -> None:
+    existing_messagebase = (await db.execute(message_query(message_id))).scalars().first()
+    if not existing_messagebase:
+        raise Missing(msg=f"Message id={message_id} not found")
+    await db.delete(existing_messagebase)
+    await db.flush()
+    await db.execute(COUNTERS_AFTER_DELETE, counters_delete_params(existing_messagebase.chat_id, existing_messagebase.id))
+    await db.commit()
+    return None
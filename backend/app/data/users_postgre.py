@@ -1,6 +1,8 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from ..models import UserBase, User, pydantic_to_sqlalchemy, sqlalchemy_to_pydantic
 from ..errors import Duplicate, Missing, MailDuplicate
+from ..cache import user_cache
 from sqlalchemy.exc import IntegrityError
 
 
@@ -22,15 +24,39 @@ def userbase_to_user(userbase: UserBase) -> User:
     )
 
 
+# Построители запросов общие для синхронной и асинхронной (users_postgre_async) версий
+
+
+def user_query(username: str):
+    return select(UserBase).filter(UserBase.username == username)
+
+
+def mail_query(email: str):
+    return select(UserBase).filter(UserBase.email == email)
+
+
+def all_users_query():
+    return select(UserBase)
+
+
+def copy_user(existing_userbase: UserBase, user: User) -> None:
+    """Переносит поля user в загруженную строку existing_userbase."""
+    userbase = user_to_userbase(user)
+    existing_userbase.username = userbase.username
+    existing_userbase.email = userbase.email
+    existing_userbase.password = userbase.password
+    existing_userbase.about = userbase.about
+
+
 def check_duplicate_mail(db: Session, email: str) -> None:
-    user = db.query(User).filter(User.email == email).first()
+    user = db.execute(mail_query(email)).scalars().first()
     if user:
         raise MailDuplicate(msg=f"Mail {email} already exists")
     return None
 
 
 def get_one(db: Session, username: str) -> User:
-    user = db.query(UserBase).filter(UserBase.username == username).first()
+    user = db.execute(user_query(username)).scalars().first()
     if user:
         #return userbase_to_user(user)
         return sqlalchemy_to_pydantic(user, User)
@@ -39,7 +65,7 @@ def get_one(db: Session, username: str) -> User:
 
 
 def get_all(db: Session) -> list[User]:
-    userbase_list = db.query(UserBase).all()
+    userbase_list = db.execute(all_users_query()).scalars().all()
     #return [userbase_to_user(userbase) for userbase in userbase_list]
     return [sqlalchemy_to_pydantic(userbase, User) for userbase in userbase_list]
 
@@ -59,19 +85,15 @@ def create(db: Session, user: User) -> User:
 
 
 def modify(db: Session, user: User) -> User:
-    existing_userbase = db.query(UserBase).filter(UserBase.username == user.username).first()
+    existing_userbase = db.execute(user_query(user.username)).scalars().first()
     
     if not existing_userbase:
         raise Missing(msg=f"User {user.username} not found")
 
-    userbase = user_to_userbase(user)
-
-    existing_userbase.username = userbase.username
-    existing_userbase.email = userbase.email
-    existing_userbase.password = userbase.password
-    existing_userbase.about = userbase.about
+    copy_user(existing_userbase, user)
     
     db.commit()
+    user_cache.invalidate(user.username)
     db.refresh(existing_userbase)
     
     #return userbase_to_user(existing_userbase)
@@ -82,12 +104,13 @@ def delete(db: Session, user: User) -> None:
     #userbase = user_to_userbase(user)
     userbase = pydantic_to_sqlalchemy(user, UserBase)
     
-    existing_userbase = db.query(UserBase).filter(UserBase.username == userbase.username).first()
+    existing_userbase = db.execute(user_query(userbase.username)).scalars().first()
     
     if not existing_userbase:
         raise Missing(msg=f"User {user.username} not found")
     
     db.delete(existing_userbase)
     db.commit()
+    user_cache.invalidate(user.username)
     
     return None
\ No newline at end of file
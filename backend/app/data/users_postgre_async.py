@@ -0,0 +1,122 @@
+from sqlalchemy import select, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import UserBase, User, PublicUserData, UserDirectoryPage, pydantic_to_sqlalchemy, sqlalchemy_to_pydantic
+from ..errors import Duplicate, Missing, MailDuplicate
+from ..cache import user_cache
+from sqlalchemy.exc import IntegrityError
+from .users_postgre import user_query, mail_query, all_users_query, copy_user
+
+
+# Асинхронная версия data.users_postgre с теми же функциями и сигнатурами.
+
+
+async def check_duplicate_mail(db: AsyncSession, email: str) -> None:
+    user = (await db.execute(mail_query(email))).scalars().first()
+    if user:
+        raise MailDuplicate(msg=f"Mail {email} already exists")
+    return None
+
+
+async def get_one(db: AsyncSession, username: str) -> User:
+    user = (await db.execute(user_query(username))).scalars().first()
+    if user:
+        return sqlalchemy_to_pydantic(user, User)
+    else:
+        raise Missing(msg=f"User {username} not found")
+
+
+async def get_public(db: AsyncSession, username: str) -> PublicUserData:
+    """Публичные данные пользователя: выбираются только нужные колонки, без хеша пароля."""
+    row = (await db.execute(
+        select(UserBase.username, UserBase.email, UserBase.about).filter(UserBase.username == username)
+    )).first()
+    if row:
+        return PublicUserData(username=row.username, email=row.email, about=row.about or "")
+    else:
+        raise Missing(msg=f"User {username} not found")
+
+
+async def get_all(db: AsyncSession) -> list[User]:
+    userbase_list = (await db.execute(all_users_query())).scalars().all()
+    return [sqlalchemy_to_pydantic(userbase, User) for userbase in userbase_list]
+
+
+def like_prefix(query: str) -> str:
+    """Шаблон LIKE для поиска по началу строки без учёта регистра; %, _ и \\ из запроса экранируются."""
+    escaped = query.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+async def get_directory(db: AsyncSession, query: str | None = None, after: str | None = None,
+                        limit: int = 50) -> UserDirectoryPage:
+    """
+    Справочник пользователей: только публичные колонки, по возрастанию username.
+
+    query ищется по началу username или email без учёта регистра. В PostgreSQL
+    поиск покрывают триграммные индексы миграции 7 (или text_pattern_ops, если
+    pg_trgm недоступен), в SQLite таблица просматривается целиком. Пагинация по
+    ключу username, а не по OFFSET.
+
+    :param after: username последнего пользователя предыдущей страницы
+    """
+    stmt = (
+        select(UserBase.username, UserBase.email, UserBase.about)
+        .order_by(UserBase.username)
+        .limit(limit + 1)
+    )
+    if query:
+        pattern = like_prefix(query)
+        stmt = stmt.where(or_(
+            func.lower(UserBase.username).like(pattern, escape="\\"),
+            func.lower(UserBase.email).like(pattern, escape="\\"),
+        ))
+    if after is not None:
+        stmt = stmt.where(UserBase.username > after)
+
+    rows = (await db.execute(stmt)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].username
+    users = [PublicUserData(username=row.username, email=row.email, about=row.about or "") for row in rows]
+    return UserDirectoryPage(users=users, next_cursor=next_cursor)
+
+
+async def create(db: AsyncSession, user: User) -> User:
+    userbase = pydantic_to_sqlalchemy(user, UserBase)
+    try:
+        db.add(userbase)
+        await db.commit()
+        await db.refresh(userbase)
+        return sqlalchemy_to_pydantic(userbase, User)
+    except IntegrityError:
+        await db.rollback()
+        raise Duplicate(msg=f"User with email {user.email} already exists")
+
+
+async def modify(db: AsyncSession, user: User) -> User:
+    existing_userbase = (await db.execute(user_query(user.username))).scalars().first()
+
+    if not existing_userbase:
+        raise Missing(msg=f"User {user.username} not found")
+
+    copy_user(existing_userbase, user)
+
+    await db.commit()
+    user_cache.invalidate(user.username)
+    await db.refresh(existing_userbase)
+
+    return sqlalchemy_to_pydantic(existing_userbase, User)
+
+
+async def delete(db: AsyncSession, user: User) -> None:
+    existing_userbase = (await db.execute(user_query(user.username))).scalars().first()
+
+    if not existing_userbase:
+        raise Missing(msg=f"User {user.username} not found")
+
+    await db.delete(existing_userbase)
+    await db.commit()
+    user_cache.invalidate(user.username)
+
+    return None
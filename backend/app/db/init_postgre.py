@@ -1,36 +1,165 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import OperationalError  # Импортируем исключение для обработки ошибок подключения
-from ..models import Base
-from dotenv import load_dotenv
+"""
+Подключение к базе данных.
+
+Импорт модуля ничего не открывает: движки создаются init_engines() при старте
+приложения (lifespan) или при первом обращении к engine, async_engine и
+фабрикам сессий, например из CLI и бенчмарков. Соединения открывает warm_up.
+"""
+import asyncio
 import os
+from threading import Lock
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from ..settings import logger, REPLICA_DATABASE_URL
+from .. import metrics, profiler
+from .routing import SessionRouter
+
+
+def to_async_url(url: str) -> str:
+    """Подбирает асинхронный драйвер для URL синхронного подключения."""
+    if url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url[len("postgresql+psycopg2://"):]
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    if url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url[len("postgres://"):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
 
 
 # Новый URL для подключения к базе данных 'mirror_postgre'
 DATABASE_URL = os.getenv('DATABASE_URL')
+# Асинхронный движок для обработчиков FastAPI, чтобы запросы не блокировали event loop
+ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL') or (to_async_url(DATABASE_URL) if DATABASE_URL else None)
+
+
+class LazySessionmaker(sessionmaker):
+    """sessionmaker, который при первом вызове создаёт движки."""
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            init_engines()
+        return super().__call__(**local_kw)
+
+
+class LazyAsyncSessionmaker(async_sessionmaker):
+    """async_sessionmaker, который при первом вызове создаёт движки."""
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            init_engines()
+        return super().__call__(**local_kw)
+
+
+SessionLocal = LazySessionmaker(autocommit=False, autoflush=False)
+AsyncSessionLocal = LazyAsyncSessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
+# Реплика для чтения: история, списки чатов, поиск и справочник пользователей
+ReplicaAsyncSessionLocal = (
+    LazyAsyncSessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    if REPLICA_DATABASE_URL else None
+)
+session_router = SessionRouter(AsyncSessionLocal, ReplicaAsyncSessionLocal)
+
+_init_lock = Lock()
 
-# Инициализация подключения к серверу PostgreSQL
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def test_connection():
+def init_engines() -> None:
+    """Создаёт движки и привязывает к ним фабрики сессий. Повторный вызов ничего не делает."""
+    with _init_lock:
+        if "engine" in globals():
+            return
+        if not DATABASE_URL:
+            raise RuntimeError("DATABASE_URL is not set")
+        sync_engine = create_engine(DATABASE_URL)
+        primary = create_async_engine(ASYNC_DATABASE_URL)
+        replica = create_async_engine(to_async_url(REPLICA_DATABASE_URL)) if REPLICA_DATABASE_URL else None
+
+        # Метрики (GET /metrics) и, если включён, профилировщик SQL: события на синхронном ядре движков
+        instrumented = {"sync": sync_engine, "primary": primary.sync_engine}
+        if replica is not None:
+            instrumented["replica"] = replica.sync_engine
+        for name, core in instrumented.items():
+            metrics.instrument_engine(core, name)
+            profiler.instrument_engine(core)
+
+        SessionLocal.configure(bind=sync_engine)
+        AsyncSessionLocal.configure(bind=primary)
+        if replica is not None:
+            ReplicaAsyncSessionLocal.configure(bind=replica)
+        globals().update(engine=sync_engine, async_engine=primary, replica_async_engine=replica)
+
+
+def __getattr__(name: str):
+    # engine, async_engine и replica_async_engine появляются в модуле после init_engines
+    if name in ("engine", "async_engine", "replica_async_engine"):
+        init_engines()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def async_engines() -> list:
+    init_engines()
+    return [engine for engine in (async_engine, replica_async_engine) if engine is not None]
+
+
+async def ping(timeout: float = 2) -> bool:
+    """Проверка готовности: SELECT 1 в основной базе и реплике."""
+    async def select_one(engine):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
     try:
-        # Пробуем подключиться к базе данных
-        with engine.connect() as conn:
-            print("Connection to the database was successful!")
-            return True
-    except OperationalError as e:
-        print(f"Failed to connect to the database. Error: {e}")
+        await asyncio.wait_for(asyncio.gather(*(select_one(engine) for engine in async_engines())), timeout)
+        return True
+    except Exception as ex:
+        logger.warning(f"Database ping failed: {ex!r}")
         return False
 
-# Проверка подключения
-if test_connection():
-    # Функция для создания таблиц в базе данных
-    def init_db():
-        # Создание всех таблиц, если их ещё нет
-        Base.metadata.create_all(bind=engine)
-
-    # Создаём таблицы
-    init_db()
-else:
-    print("Unable to initialize the database due to connection failure.")
+
+async def warm_up(connections: int, timeout: float) -> None:
+    """
+    Открывает connections соединений в пулах асинхронных движков, чтобы первые
+    запросы не платили за подключение.
+
+    Пока база недоступна, попытки повторяются с нарастающей паузой до timeout
+    секунд: короткий перезапуск базы не роняет старт воркера.
+
+    :raises ConnectionError: Если база так и не ответила
+    """
+    async def open_connections(engine):
+        held = []
+        try:
+            for _ in range(connections):
+                held.append(await engine.connect())
+            await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in held))
+        finally:
+            for conn in held:
+                await conn.close()
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = 0.5
+    while True:
+        try:
+            for engine in async_engines():
+                await open_connections(engine)
+            return
+        except Exception as ex:
+            if loop.time() + delay > deadline:
+                raise ConnectionError(f"Database is unavailable after {timeout}s: {ex!r}") from ex
+            logger.warning(f"Database is not ready, retrying in {delay}s: {ex!r}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 5)
+
+
+async def dispose_engines() -> None:
+    """Закрывает соединения всех пулов при остановке приложения."""
+    if "engine" not in globals():
+        return
+    for pool_owner in async_engines():
+        await pool_owner.dispose()
+    engine.dispose()
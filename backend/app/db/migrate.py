@@ -0,0 +1,280 @@
+"""
+Миграции схемы базы данных.
+
+Заменяют Base.metadata.create_all при импорте: каждая миграция выполняется один
+раз, применённые версии записываются в таблицу schema_migrations. Запуск:
+
+    python -m backend.app.db.migrate
+
+или автоматически при старте приложения, если MIGRATE_ON_STARTUP не выключен.
+"""
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import Column, Integer, String, DateTime, MetaData, Table, select, insert, text, inspect
+from sqlalchemy.engine import Connection, Engine
+
+from ..models import Base
+from ..settings import logger, SEARCH_CONFIG
+
+
+LOCK_KEY = 7_391_024  # Ключ pg_advisory_lock: миграции выполняет только один воркер
+BACKFILL_BATCH_SIZE = 5000  # Строк в одном пакете заполнения больших таблиц
+
+metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String, nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+class Migration:
+    """
+    Одна миграция схемы.
+
+    Транзакционные миграции выполняются целиком в одной транзакции. Миграции с
+    transactional=False работают в режиме AUTOCOMMIT: это нужно для
+    CREATE INDEX CONCURRENTLY, который PostgreSQL не выполняет внутри транзакции.
+    Такие миграции должны быть идемпотентными: если процесс упадёт до записи
+    версии, миграция выполнится повторно.
+    """
+
+    def __init__(self, version: int, name: str, upgrade: Callable[[Connection], None], transactional: bool = True):
+        self.version = version
+        self.name = name
+        self.upgrade = upgrade
+        self.transactional = transactional
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: int, name: str, transactional: bool = True):
+    """Регистрирует функцию как миграцию с номером version."""
+    def register(upgrade: Callable[[Connection], None]):
+        if any(m.version == version for m in MIGRATIONS):
+            raise ValueError(f"Migration {version} is already registered")
+        MIGRATIONS.append(Migration(version, name, upgrade, transactional))
+        return upgrade
+    return register
+
+
+def is_postgres(conn: Connection) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+def create_index(conn: Connection, name: str, table: str, columns: list[str], unique: bool = False,
+                 using: str | None = None) -> None:
+    """
+    Создаёт индекс, если его ещё нет.
+
+    В PostgreSQL индекс строится CONCURRENTLY, без блокировки записи в таблицу,
+    поэтому вызывать функцию можно только из миграции с transactional=False.
+    """
+    concurrently = ""
+    if is_postgres(conn):
+        # Прерванный CREATE INDEX CONCURRENTLY оставляет невалидный индекс,
+        # который IF NOT EXISTS молча пропустил бы
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": name}).first()
+        if invalid:
+            logger.warning(f"Dropping invalid index {name}")
+            conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+        concurrently = "CONCURRENTLY "
+    conn.execute(text(
+        f'CREATE {"UNIQUE " if unique else ""}INDEX {concurrently}IF NOT EXISTS "{name}" '
+        f'ON "{table}" {f"USING {using} " if using else ""}({", ".join(columns)})'
+    ))
+
+
+def add_column(conn: Connection, table: str, name: str, ddl: str) -> None:
+    """Добавляет колонку, если её ещё нет (в новых базах её уже создала миграция 1)."""
+    if name not in {column["name"] for column in inspect(conn).get_columns(table)}:
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN "{name}" {ddl}'))
+
+
+######### Миграции ###########
+
+@migration(1, "initial schema")
+def initial_schema(conn: Connection) -> None:
+    # Базы, созданные раньше через create_all, уже содержат таблицы: checkfirst их пропустит
+    Base.metadata.create_all(conn, checkfirst=True)
+
+
+@migration(2, "indexes for hot lookups", transactional=False)
+def hot_lookup_indexes(conn: Connection) -> None:
+    duplicates = conn.execute(text(
+        "SELECT email FROM users GROUP BY email HAVING COUNT(*) > 1 LIMIT 10"
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(f"Cannot create unique index on users.email, duplicated: {duplicates}")
+
+    create_index(conn, "ix_messages_chat_id_id", "messages", ["chat_id", "id"])
+    create_index(conn, "ix_messages_chat_id_timestamp", "messages", ["chat_id", "timestamp"])
+    create_index(conn, "ix_messages_username", "messages", ["username"])
+    create_index(conn, "ix_chat_users_username", "chat_users", ["username"])
+    create_index(conn, "ux_users_email", "users", ["email"], unique=True)
+
+
+@migration(3, "last read marker in chat_users")
+def last_read_marker(conn: Connection) -> None:
+    add_column(conn, "chat_users", "last_read_message_id", "INTEGER")
+    # Существующие участники считаются прочитавшими всю историю, иначе у всех сразу вся история непрочитана
+    conn.execute(text(
+        "UPDATE chat_users SET last_read_message_id = "
+        "(SELECT MAX(id) FROM messages WHERE messages.chat_id = chat_users.chat_id) "
+        "WHERE last_read_message_id IS NULL"
+    ))
+
+
+@migration(4, "activity counters in chats")
+def chat_activity_counters(conn: Connection) -> None:
+    add_column(conn, "chats", "last_message_id", "INTEGER")
+    add_column(conn, "chats", "last_message_at", "TIMESTAMP")
+    add_column(conn, "chats", "message_count", "INTEGER NOT NULL DEFAULT 0")
+
+
+@migration(5, "backfill activity counters", transactional=False)
+def backfill_activity_counters(conn: Connection) -> None:
+    from ..data.chats_postgre import recompute_counters
+
+    # Пакетами, чтобы не держать блокировку на всей таблице chats
+    recompute_counters(conn)
+    create_index(conn, "ix_chats_last_message_at", "chats", ["last_message_at"])
+
+
+@migration(6, "full-text search over messages", transactional=False)
+def message_search(conn: Connection) -> None:
+    if is_postgres(conn):
+        # Колонка с триггером, а не GENERATED ... STORED: та переписала бы всю таблицу под блокировкой
+        conn.execute(text('ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector'))
+        conn.execute(text(
+            "CREATE OR REPLACE FUNCTION messages_search_vector() RETURNS trigger AS $$ "
+            f"BEGIN NEW.search_vector := to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.content, '')); RETURN NEW; END "
+            "$$ LANGUAGE plpgsql"
+        ))
+        conn.execute(text('DROP TRIGGER IF EXISTS messages_search_vector ON messages'))
+        conn.execute(text(
+            'CREATE TRIGGER messages_search_vector BEFORE INSERT OR UPDATE OF content ON messages '
+            'FOR EACH ROW EXECUTE FUNCTION messages_search_vector()'
+        ))
+        # Старые сообщения диапазонами id по первичному ключу: каждый пакет коммитится сам
+        # (AUTOCOMMIT) и не ищет заново строки с NULL среди уже заполненных
+        last_id = 0
+        while (batch_end := conn.execute(text(
+            "SELECT max(id) FROM (SELECT id FROM messages WHERE id > :last_id ORDER BY id LIMIT :size) AS batch"
+        ), {"last_id": last_id, "size": BACKFILL_BATCH_SIZE}).scalar()) is not None:
+            conn.execute(text(
+                f"UPDATE messages SET search_vector = to_tsvector('{SEARCH_CONFIG}', coalesce(content, '')) "
+                "WHERE id > :last_id AND id <= :batch_end AND search_vector IS NULL"
+            ), {"last_id": last_id, "batch_end": batch_end})
+            last_id = batch_end
+        create_index(conn, "ix_messages_search_vector", "messages", ["search_vector"], using="gin")
+    else:
+        # SQLite: внешний индекс FTS5 поверх messages, синхронизируется триггерами.
+        # Чат индексируется токеном "c<chat_id>": поиск внутри чата пересекает два
+        # списка документов вместо фильтрации всех совпадений по chat_id
+        conn.execute(text(
+            "CREATE VIEW IF NOT EXISTS messages_fts_source AS "
+            "SELECT id, content, 'c' || chat_id AS chat FROM messages"
+        ))
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+            "content, chat, content='messages_fts_source', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+            "INSERT INTO messages_fts(rowid, content, chat) VALUES (new.id, new.content, 'c' || new.chat_id); END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+            "INSERT INTO messages_fts(messages_fts, rowid, content, chat) "
+            "VALUES ('delete', old.id, old.content, 'c' || old.chat_id); END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN "
+            "INSERT INTO messages_fts(messages_fts, rowid, content, chat) "
+            "VALUES ('delete', old.id, old.content, 'c' || old.chat_id); "
+            "INSERT INTO messages_fts(rowid, content, chat) VALUES (new.id, new.content, 'c' || new.chat_id); END"
+        ))
+        conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+
+
+@migration(7, "user directory search indexes", transactional=False)
+def user_directory_indexes(conn: Connection) -> None:
+    # SQLite: справочник ищет полным просмотром, для локальной базы этого достаточно
+    if not is_postgres(conn):
+        return
+    try:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except Exception as ex:
+        # Без прав на расширение - индексы только для поиска по началу строки
+        logger.warning(f"pg_trgm is not available, falling back to prefix indexes: {ex!r}")
+        create_index(conn, "ix_users_username_prefix", "users", ["lower(username) text_pattern_ops"])
+        create_index(conn, "ix_users_email_prefix", "users", ["lower(email) text_pattern_ops"])
+        return
+    create_index(conn, "ix_users_username_trgm", "users", ["lower(username) gin_trgm_ops"], using="gin")
+    create_index(conn, "ix_users_email_trgm", "users", ["lower(email) gin_trgm_ops"], using="gin")
+
+
+######### Запуск ###########
+
+def applied_versions(bind: Engine) -> set[int]:
+    with bind.connect() as conn:
+        return set(conn.execute(select(schema_migrations.c.version)).scalars().all())
+
+
+def run_migrations(bind: Engine) -> list[int]:
+    """
+    Применяет все ещё не применённые миграции по возрастанию версии.
+
+    :return: Номера применённых сейчас миграций
+    """
+    with bind.connect() as lock_conn:
+        if is_postgres(lock_conn):
+            lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+            lock_conn.commit()
+        try:
+            with bind.begin() as conn:
+                metadata.create_all(conn, checkfirst=True)
+            applied = applied_versions(bind)
+
+            done = []
+            for m in sorted(MIGRATIONS, key=lambda m: m.version):
+                if m.version in applied:
+                    continue
+                logger.info(f"Applying migration {m.version}: {m.name}")
+                if m.transactional:
+                    with bind.begin() as conn:
+                        m.upgrade(conn)
+                        record(conn, m)
+                else:
+                    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                        m.upgrade(conn)
+                        record(conn, m)
+                done.append(m.version)
+            return done
+        finally:
+            if is_postgres(lock_conn):
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+                lock_conn.commit()
+
+
+def record(conn: Connection, m: Migration) -> None:
+    conn.execute(insert(schema_migrations).values(version=m.version, name=m.name, applied_at=datetime.utcnow()))
+
+
+if __name__ == "__main__":
+    from .init_postgre import engine
+    from ..settings import configure_logging
+
+    configure_logging()
+
+    applied = run_migrations(engine)
+    print(f"Applied migrations: {applied}" if applied else "Schema is up to date")
@@ -0,0 +1,27 @@
+"""
+Пересчёт счётчиков активности чатов (ChatBase.last_message_id, last_message_at, message_count).
+
+Счётчики поддерживаются при записи сообщений, но расходятся, если сообщения
+удаляются в обход слоя данных, например каскадом при удалении пользователя.
+
+    python -m backend.app.db.repair_counters [--batch-size 500]
+"""
+import argparse
+
+from .init_postgre import SessionLocal
+from ..data.chats_postgre import recompute_counters
+from ..settings import configure_logging
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    configure_logging()
+    with SessionLocal() as db:
+        done = recompute_counters(db, batch_size=args.batch_size)
+    print(f"Recomputed counters for {done} chats")
+
+
+if __name__ == "__main__":
+    main()
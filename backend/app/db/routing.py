@@ -0,0 +1,36 @@
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from ..cache import TTLCache
+from ..settings import READ_YOUR_WRITES_SECONDS, USER_CACHE_SIZE
+
+
+class SessionRouter:
+    """
+    Выбор базы для сессии: запись - в основную, чтение - в реплику.
+
+    После собственной записи пользователь window секунд читает из основной базы
+    (read-your-writes): реплика может отставать, и без этого только что
+    отправленное сообщение или созданный чат пропадали бы из его же ответа.
+    Отметки о записи хранятся в памяти процесса, поэтому при нескольких
+    воркерах окно действует на том воркере, который принял запись.
+    """
+
+    def __init__(self, primary: async_sessionmaker[AsyncSession], replica: async_sessionmaker[AsyncSession] | None = None,
+                 window: float = READ_YOUR_WRITES_SECONDS, maxsize: int = USER_CACHE_SIZE):
+        self.primary = primary
+        self.replica = replica
+        self.recent_writers = TTLCache(maxsize=maxsize, ttl=window)
+
+    def mark_write(self, username: str | None) -> None:
+        if self.replica is not None and username:
+            self.recent_writers.set(username, True)
+
+    def reads_primary(self, username: str | None) -> bool:
+        return self.replica is None or (username is not None and self.recent_writers.get(username) is not None)
+
+    def for_read(self, username: str | None = None) -> async_sessionmaker[AsyncSession]:
+        """Фабрика сессий для чтения от имени username (None - анонимное чтение)."""
+        return self.primary if self.reads_primary(username) else self.replica
+
+    def for_write(self) -> async_sessionmaker[AsyncSession]:
+        return self.primary
@@ -10,4 +10,8 @@ class Duplicate(Exception):
 
 class MailDuplicate(Exception):
     def __init__(self, msg):
-        self.msg = msg
\ No newline at end of file
+        self.msg = msg
+
+class Overloaded(Exception):
+    def __init__(self, msg):
+        self.msg = msg
@@ -0,0 +1,228 @@
+"""
+Метрики процесса в текстовом формате Prometheus (GET /metrics).
+
+Счётчики и гистограммы живут в памяти процесса: запись - поиск корзины bisect
+и одна блокировка, без аллокаций на горячем пути. Значения, которые и так
+где-то хранятся (размер пула, число соединений), не дублируются, а читаются
+при сборе через Gauge(collect=...). При нескольких воркерах каждый отдаёт свои
+метрики, суммирует их Prometheus.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Iterable
+
+from .settings import METRICS_ENABLED
+
+
+# Латентности: от миллисекунды до десяти секунд
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: 'Metric') -> None:
+        if any(m.name == metric.name for m in self.metrics):
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Iterable[tuple[str, str]]) -> str:
+    pairs = [f'{key}="{escape(str(value))}"' for key, value in labels]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), registry: Registry | None = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.lock = threading.Lock()  # Запись идёт и из пула потоков (синхронные обработчики, to_thread)
+        if registry is not None:
+            registry.register(self)
+
+    def samples(self) -> Iterable[tuple[str, list, float]]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Растущее значение: inc() или, как у Gauge, функция collect для счётчиков, которые уже где-то ведутся."""
+    kind = "counter"
+
+    def __init__(self, *args, collect: Callable[[], Iterable[tuple[tuple, float]]] | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.collect = collect
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = list(self.values.items())
+        if self.collect is not None:
+            values += list(self.collect())
+        for label_values, value in values:
+            yield self.name, list(zip(self.labels, label_values)), value
+
+
+class Gauge(Metric):
+    """
+    Текущее значение: set() или функция collect, которая вызывается при сборе
+    и возвращает пары (значения меток, значение).
+    """
+    kind = "gauge"
+
+    def __init__(self, *args, collect: Callable[[], Iterable[tuple[tuple, float]]] | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.collect = collect
+        self.values: dict[tuple, float] = {}
+
+    def set(self, value: float, *label_values: str) -> None:
+        with self.lock:
+            self.values[label_values] = value
+
+    def samples(self):
+        with self.lock:
+            values = list(self.values.items())
+        if self.collect is not None:
+            values += list(self.collect())
+        for label_values, value in values:
+            yield self.name, list(zip(self.labels, label_values)), value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        # Значения меток -> [счётчики корзин..., +Inf, сумма]; корзины не накопительные, накопление при сборе
+        self.series: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self.lock:
+            series = [(label_values, list(values)) for label_values, values in self.series.items()]
+        for label_values, values in series:
+            labels = list(zip(self.labels, label_values))
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                total += count
+                yield self.name + "_bucket", labels + [("le", format_value(bound))], total
+            yield self.name + "_sum", labels, values[-1]
+            yield self.name + "_count", labels, total
+
+
+######### Запросы к базе ###########
+
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "SQL statement execution time.", ("engine",))
+DB_POOL_WAIT_SECONDS = Histogram("db_pool_wait_seconds", "Time to get a connection from the pool, including connect.",
+                                 ("engine",))
+
+# Запросы текущего HTTP запроса: [число, секунды]; заполняется событиями движка
+request_db_stats: ContextVar[list | None] = ContextVar("request_db_stats", default=None)
+
+_engines: dict[str, object] = {}  # Имя -> синхронный Engine, для размера пулов при сборе
+_timed_pools: dict[tuple[type, str], type] = {}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+    stats = request_db_stats.get()
+    if stats is not None:
+        stats[0] += 1
+
+
+def _after_cursor_execute(name: str):
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        DB_QUERY_SECONDS.observe(elapsed, name)
+        stats = request_db_stats.get()
+        if stats is not None:
+            stats[1] += elapsed
+    return listener
+
+
+def timed_pool_class(base: type, name: str) -> type:
+    """Подкласс пула, который замеряет ожидание соединения (_do_get) - у пулов нет события до выдачи."""
+    key = (base, name)
+    if key not in _timed_pools:
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return base._do_get(self)
+            finally:
+                DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started, name)
+        _timed_pools[key] = type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get})
+    return _timed_pools[key]
+
+
+def instrument_engine(engine, name: str) -> None:
+    """
+    Подключает метрики к синхронному Engine (для AsyncEngine - его sync_engine).
+
+    Класс пула подменяется подклассом с замером ожидания: Pool.recreate() при
+    dispose создаёт пул того же класса, так что замер переживает пересоздание.
+    """
+    if not METRICS_ENABLED:
+        return
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute(name))
+    engine.pool.__class__ = timed_pool_class(type(engine.pool), name)
+    _engines[name] = engine
+
+
+def _pool_checked_out():
+    for name, engine in list(_engines.items()):
+        checkedout = getattr(engine.pool, "checkedout", None)
+        if checkedout is not None:
+            yield (name,), checkedout()
+
+
+def _pool_size():
+    for name, engine in list(_engines.items()):
+        size = getattr(engine.pool, "size", None)
+        if size is not None:
+            yield (name,), size()
+
+
+Gauge("db_pool_checked_out", "Connections currently checked out of the pool.", ("engine",), collect=_pool_checked_out)
+Gauge("db_pool_size", "Configured pool size.", ("engine",), collect=_pool_size)
@@ -1,7 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter
 from datetime import datetime
-from typing import Union, Optional, TypeVar, Type, List
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from typing import Union, Optional, TypeVar, Type, List, Literal, Annotated
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from backend.app.settings import logger
@@ -67,6 +67,11 @@ class PublicUserData(BaseModel):
     about: str = ""
 
 
+class UserDirectoryPage(BaseModel):
+    users: list[PublicUserData] = []  # По возрастанию username
+    next_cursor: Optional[str] = None  # Курсор следующей страницы или None, если это последняя
+
+
 class LoginUser(BaseModel):
     username : str
     password: str
@@ -83,9 +88,80 @@ class Message(BaseModel):
         from_attributes = True
 
 
+class MessagePage(BaseModel):
+    messages: list[Message] = []  # По возрастанию id; страница на дату - по возрастанию (timestamp, id)
+    has_more: bool = False  # Есть ли ещё сообщения в направлении листания
+
+
+class MessageSearchHit(Message):
+    """Сообщение, найденное поиском"""
+    rank: float  # Релевантность, больше - лучше
+    highlight: str  # Фрагмент текста, совпадения обёрнуты в <mark>, остальное экранировано
+
+
+class MessageSearchPage(BaseModel):
+    messages: list[MessageSearchHit] = []  # По убыванию релевантности
+    next_cursor: Optional[str] = None  # Курсор следующей страницы или None, если это последняя
+    truncated: bool = False  # Совпадений больше SEARCH_CANDIDATES: ранжированы только самые новые
+
+
+class ChatSummary(BaseModel):
+    """Строка списка чатов: без участников и истории, только то, что нужно для боковой панели"""
+    id: int
+    title: str
+    member_count: int
+    unread_count: int  # Чужие сообщения после last_read_message_id участника
+    message_count: int = 0
+    last_message_id: Optional[int] = None
+    last_message_preview: Optional[str] = None  # Начало последнего сообщения
+    last_message_username: Optional[str] = None
+    last_message_at: Optional[datetime] = None
+
+
+class ChatSummaryPage(BaseModel):
+    chats: list[ChatSummary] = []  # По убыванию активности
+    next_cursor: Optional[str] = None  # Курсор следующей страницы или None, если это последняя
+
+
+MAX_MEMBERS_PER_REQUEST = 5000  # Имена разрешаются одним IN: держим список в пределах лимита параметров драйвера
+
+
+class MembersRequest(BaseModel):
+    usernames: list[str] = Field(..., min_length=1, max_length=MAX_MEMBERS_PER_REQUEST)
+
+
+class MembersResult(BaseModel):
+    chat_id: int
+    results: dict[str, str] = {}  # username -> итог (data.chats_postgre.MEMBER_*, USER_MISSING)
+
+
+class SendMessageRequest(BaseModel):
+    chat_id: int
+    content: str
+
+
+######### Кадры WebSocket от клиента ###############
+class WsSendFrame(SendMessageRequest):
+    type: Literal["send"]
+    client_id: Optional[str] = None  # Идентификатор клиента, возвращается в ack
+
+
+class WsAckFrame(BaseModel):
+    type: Literal["ack"]
+    chat_id: int
+    message_id: int  # Последнее сообщение чата, которое клиент получил
+
+
+class WsPingFrame(BaseModel):
+    type: Literal["ping"]
+
+
+WsInboundFrame = TypeAdapter(Annotated[Union[WsSendFrame, WsAckFrame, WsPingFrame], Field(discriminator="type")])
+
+
 class ChatCreateRequest(BaseModel):
     chat_title: str
-    users: list[str]
+    users: list[str] = Field(..., max_length=MAX_MEMBERS_PER_REQUEST)
 
 
 class ChatCreated(BaseModel):
@@ -117,6 +193,10 @@ class UserBase(Base):
     password = Column(String, nullable=False)
     about = Column(String, default="")
 
+    __table_args__ = (
+        Index('ux_users_email', 'email', unique=True),  # check_duplicate_mail и уникальность почты
+    )
+
     # Отношения
     chats = relationship('ChatBase', secondary='chat_users', back_populates='users')
     messages = relationship('MessageBase', back_populates='author')
@@ -141,6 +221,17 @@ class ChatBase(Base):
     owner_username = Column(String, ForeignKey('users.username'), nullable=False)
     owner = relationship('UserBase', backref='owned_chats', lazy=True)
 
+    # Денормализованные счётчики активности. Обновляются в той же транзакции, что и
+    # запись или удаление сообщения (data.chats_postgre.COUNTERS_AFTER_INSERT и др.),
+    # расхождения исправляет python -m backend.app.db.repair_counters
+    last_message_id = Column(Integer, nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
+    message_count = Column(Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        Index('ix_chats_last_message_at', 'last_message_at'),  # Поиск давно неактивных чатов
+    )
+
     users = relationship('UserBase', secondary='chat_users', back_populates='chats')
     messages = relationship('MessageBase', back_populates='chat')
 
@@ -159,7 +250,7 @@ class ChatBase(Base):
 
         # Инициализация списка пользователей
         self.users = users if users is not None else []
-        if owner not in self.users:
+        if all(user.username != owner.username for user in self.users):
             self.users.append(owner)  # Добавляем владельца в список пользователей, если его там нет
 
         # Инициализация списка сообщений
@@ -171,18 +262,18 @@ class ChatBase(Base):
         Преобразует Pydantic модель ChatCreated в SQLAlchemy модель ChatBase.
         """
         try:
-            # Получаем владельца чата из базы данных
-            owner = db.query(UserBase).filter(UserBase.username == chat_created.chat_owner.username).first()
-            if not owner:
-                raise ValueError(f"Владелец чата {chat_created.chat_owner.username} не найден")
-
-            # Получаем список пользователей из базы данных
-            users = []
-            for user_data in chat_created.users:
-                user = db.query(UserBase).filter(UserBase.username == user_data.username).first()
-                if not user:
-                    raise ValueError(f"Пользователь {user_data.username} не найден")
-                users.append(user)
+            # Владелец и все участники одним запросом
+            usernames = list(dict.fromkeys(user.username for user in chat_created.users))
+            owner_name = chat_created.chat_owner.username
+            found = {user.username: user for user in
+                     db.query(UserBase).filter(UserBase.username.in_(usernames + [owner_name])).all()}
+            if owner_name not in found:
+                raise ValueError(f"Владелец чата {owner_name} не найден")
+            missing = [name for name in usernames if name not in found]
+            if missing:
+                raise ValueError(f"Пользователи не найдены: {', '.join(missing)}")
+            owner = found[owner_name]
+            users = [found[name] for name in usernames]
 
             # Создаем объект ChatBase
             return cls(
@@ -194,9 +285,16 @@ class ChatBase(Base):
             logger.error(f"Convert from pydantic error: {ex}")
             raise ex
 
-    def to_pydantic(self) -> 'Chat':
+    def to_pydantic(self, with_messages: bool = True, with_users: bool = True) -> 'Chat':
         """
         Преобразует SQLAlchemy модель ChatBase в Pydantic модель Chat.
+
+        :param with_messages: Включать ли историю сообщений. История большая,
+            поэтому для метаданных чата её лучше не трогать и получать постранично.
+        :param with_users: Включать ли участников. Без них users будет None.
+            Связи, которые здесь читаются, должны быть загружены заранее
+            (профили загрузки в data.chats_postgre), иначе каждый чат даст
+            отдельный ленивый запрос.
         """
         # Преобразуем владельца чата в Pydantic модель
         owner_pydantic = PublicUserData(
@@ -213,7 +311,7 @@ class ChatBase(Base):
                 about=user.about
             )
             for user in self.users
-        ]
+        ] if with_users else None
 
         # Преобразуем список сообщений в Pydantic модель
         messages_pydantic = [
@@ -225,7 +323,7 @@ class ChatBase(Base):
                 chat_id=message.chat_id
             )
             for message in self.messages
-        ]
+        ] if with_messages else []
 
         # Создаем объект Pydantic модели Chat
         return Chat(
@@ -251,6 +349,13 @@ class MessageBase(Base):
     username = Column(String, ForeignKey('users.username', ondelete='CASCADE'))  # Пользователь, отправивший сообщение
     chat_id = Column(Integer, ForeignKey('chats.id', ondelete='CASCADE'))  # Чат, в который отправлено сообщение
 
+    # Индексы создаются миграцией 2 (db.migrate), здесь они описаны для новых баз
+    __table_args__ = (
+        Index('ix_messages_chat_id_id', 'chat_id', 'id'),  # Постраничная история по id
+        Index('ix_messages_chat_id_timestamp', 'chat_id', 'timestamp'),  # Переход к дате
+        Index('ix_messages_username', 'username'),  # Сообщения пользователя и каскадное удаление
+    )
+
     # Связи с пользователем и чатом
     author = relationship('UserBase', back_populates='messages')
     chat = relationship('ChatBase', back_populates='messages')
@@ -312,4 +417,10 @@ class ChatUser(Base):
     __tablename__ = 'chat_users'
 
     chat_id = Column(Integer, ForeignKey('chats.id', ondelete='CASCADE'), primary_key=True)
-    username = Column(String, ForeignKey('users.username', ondelete='CASCADE'), primary_key=True)
\ No newline at end of file
+    username = Column(String, ForeignKey('users.username', ondelete='CASCADE'), primary_key=True)
+    last_read_message_id = Column(Integer, nullable=True)  # Последнее прочитанное сообщение (ack от клиента)
+
+    # Первичный ключ (chat_id, username) не помогает искать чаты по одному username
+    __table_args__ = (
+        Index('ix_chat_users_username', 'username'),
+    )
\ No newline at end of file
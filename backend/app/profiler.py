@@ -0,0 +1,130 @@
+"""
+Профилировщик SQL для отладки (SQL_PROFILER=1).
+
+Записывает каждый запрос, выполненный внутри profile(): текст и время.
+Одинаковые по форме запросы, повторённые SQL_REPEAT_THRESHOLD и более раз,
+помечаются как подозрение на N+1. Для SELECT дольше SQL_SLOW_MS снимается
+план (EXPLAIN (ANALYZE, BUFFERS) в PostgreSQL, EXPLAIN QUERY PLAN в SQLite) и
+пишется в лог медленных запросов.
+
+EXPLAIN ANALYZE выполняет запрос повторно, поэтому профилировщик не для
+продакшена: включайте его локально или на стенде.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .settings import logger, SQL_PROFILER, SQL_REPEAT_THRESHOLD, SQL_SLOW_MS, SQL_SLOW_LOG
+
+
+slow_logger = logging.getLogger(__name__ + ".slow")
+
+# Списки параметров IN разной длины: (?, ?, ?), (%(id_1)s, %(id_2)s), ($1, $2)
+PARAMETER_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|\$\d+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+))*\s*\)")
+WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Форма запроса: параметры уже вынесены SQLAlchemy, схлопываются только списки IN и пробелы."""
+    return PARAMETER_LIST.sub("(...)", WHITESPACE.sub(" ", statement).strip())
+
+
+class Profile:
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.statements: list[tuple[str, float]] = []  # (форма запроса, секунды)
+        self.slow: list[dict] = []  # {"statement", "ms", "plan"}
+
+    @property
+    def total_ms(self) -> float:
+        return sum(seconds for _, seconds in self.statements) * 1000
+
+    def repeated(self, threshold: int = SQL_REPEAT_THRESHOLD) -> list[tuple[str, int]]:
+        """Подозрения на N+1: формы запросов, выполненные threshold и более раз."""
+        counts = Counter(shape for shape, _ in self.statements)
+        return [(shape, count) for shape, count in counts.most_common() if count >= threshold]
+
+    def summary(self) -> str:
+        return (f"queries={len(self.statements)}; time_ms={self.total_ms:.1f}; "
+                f"repeated={len(self.repeated())}; slow={len(self.slow)}")
+
+
+current_profile: ContextVar[Profile | None] = ContextVar("current_profile", default=None)
+
+
+@contextmanager
+def profile(label: str = ""):
+    """Записывает запросы, выполненные внутри блока, в том числе из пула потоков."""
+    current = Profile(label)
+    token = current_profile.set(current)
+    try:
+        yield current
+    finally:
+        current_profile.reset(token)
+
+
+def report(current: Profile) -> None:
+    logger.info(f"SQL profile {current.label}: {current.summary()}")
+    for shape, count in current.repeated():
+        logger.warning(f"Possible N+1 in {current.label}: {count} x {shape}")
+
+
+def explain(conn, statement: str, parameters) -> str | None:
+    """
+    План запроса на том же соединении и в той же транзакции.
+
+    Выполняется курсором драйвера в обход событий SQLAlchemy, чтобы EXPLAIN не
+    попал в профиль. Снимается только для SELECT: ANALYZE выполняет запрос.
+    """
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+    elif dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        prefix = "EXPLAIN "
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(" ".join(str(value) for value in row) for row in cursor.fetchall())
+    except Exception as ex:
+        return f"EXPLAIN failed: {ex!r}"
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile.get() is not None:
+        context._profiler_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    current = current_profile.get()
+    started = getattr(context, "_profiler_started", None)
+    if current is None or started is None:
+        return
+    elapsed = time.perf_counter() - started
+    current.statements.append((statement_shape(statement), elapsed))
+    if elapsed * 1000 < SQL_SLOW_MS or executemany:
+        return
+    plan = explain(conn, statement, parameters)
+    current.slow.append({"statement": statement, "ms": elapsed * 1000, "plan": plan})
+    slow_logger.warning(f"Slow query in {current.label or '-'} ({elapsed * 1000:.1f} ms):\n{statement}\n"
+                        f"parameters: {parameters!r}\n{plan or ''}")
+
+
+def instrument_engine(engine) -> None:
+    """Подключает профилировщик к синхронному Engine (для AsyncEngine - его sync_engine)."""
+    if not SQL_PROFILER:
+        return
+    from sqlalchemy import event
+
+    if SQL_SLOW_LOG and not slow_logger.handlers:
+        slow_logger.addHandler(logging.FileHandler(SQL_SLOW_LOG))
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
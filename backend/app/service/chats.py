@@ -8,49 +8,28 @@ from sqlalchemy.orm import Session
 from typing import List, Dict, Any
 
 
-def get_one(db: Session, chat_id: int) -> Message:
-    return data.get_one(db, chat_id)
+def get_one(db: Session, chat_id: int, profile: str = "full", history: int | None = None) -> Message:
+    return data.get_one(db, chat_id, profile=profile, history=history)
 
 
-def get_all(db: Session) -> list[Chat]:
-    return data.get_all(db)
+def get_all(db: Session, profile: str = "full", history: int | None = None) -> list[Chat]:
+    return data.get_all(db, profile=profile, history=history)
 
 
 def create(db: Session, chat: ChatCreateRequest, token: str) -> Chat:
     try:
-        # Получаем текущего пользователя (владельца чата)
-        owner = service_users.get_current_user(db=db, token=token)
+        # Владелец - из токена; он и все участники проверяются в слое данных одним запросом
+        owner = service_users.get_jwt_username(token)
         if not owner:
             raise ValueError("Владелец чата не найден")
-
-        # Получаем список пользователей
-        users = []
-        for username in chat.users:
-            user = service_users.get_one(db=db, username=username)
-            if not user:
-                raise ValueError(f"Пользователь {username} не найден")
-            users.append(user)
-
-        # Преобразуем SQLAlchemy объекты в Pydantic объекты
-        owner_pydantic = owner.to_public_data()
-        users_pydantic = [user.to_public_data() for user in users]
-
-        # Создаем объект ChatCreated
-        chat_created = ChatCreated(
-            title=chat.chat_title,
-            chat_owner=owner_pydantic,
-            users=users_pydantic
-        )
-
-        # Создаем чат в базе данных
-        return data.create(db=db, chat=chat_created)
+        return data.create_with_members(db=db, title=chat.chat_title, owner=owner, usernames=chat.users)
     except Exception as ex:
         logger.error(f"Service cant create chat: {ex}")
         raise ex
 
 
-def all_chats_by_user(db: Session, username: str) -> list[Chat]:
-    return data.get_all_chats_by_user(db=db, username=username)
+def all_chats_by_user(db: Session, username: str, profile: str = "full", history: int | None = None) -> list[Chat]:
+    return data.get_all_chats_by_user(db=db, username=username, profile=profile, history=history)
 
 
 def delete(db: Session, chat_id: int) -> bool:
@@ -61,6 +40,18 @@ def check_user_in_chat(db : Session, chat_id : int, username : str) -> bool:
     return data.check_user_in_chat(db, chat_id, username)
 
 
+def get_owner(db: Session, chat_id: int) -> str:
+    return data.get_owner(db, chat_id)
+
+
+def add_members(db: Session, chat_id: int, usernames: List[str]) -> Dict[str, str]:
+    return data.add_members(db, chat_id, usernames)
+
+
+def remove_members(db: Session, chat_id: int, usernames: List[str]) -> Dict[str, str]:
+    return data.remove_members(db, chat_id, usernames)
+
+
 def add_user_to_chat(db: Session, chat_id: int, username: str) -> bool:
     return data.add_user_to_chat(db,chat_id,username)
 
@@ -0,0 +1,122 @@
+from ..models import Message, Chat, ChatCreateRequest, ChatSummaryPage
+from ..data import chats_postgre_async as data
+from ..data.chats_postgre import MEMBER_ADDED, MEMBER_REMOVED
+from backend.app.service import users_async as service_users
+from backend.app.service import ingest
+from backend.app.settings import logger
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict
+
+
+# Асинхронная версия service.chats для обработчиков FastAPI.
+
+
+async def get_one(db: AsyncSession, chat_id: int, profile: str = "members", history: int | None = None) -> Chat:
+    return await data.get_one(db, chat_id, profile=profile, history=history)
+
+
+async def get_all(db: AsyncSession, profile: str = "full", history: int | None = None) -> list[Chat]:
+    return await data.get_all(db, profile=profile, history=history)
+
+
+async def create(db: AsyncSession, chat: ChatCreateRequest, token: str) -> Chat:
+    try:
+        # Владелец - из токена; он и все участники проверяются в слое данных одним запросом
+        owner = service_users.get_jwt_username(token)
+        if not owner:
+            raise ValueError("Владелец чата не найден")
+        return await data.create_with_members(db=db, title=chat.chat_title, owner=owner, usernames=chat.users)
+    except Exception as ex:
+        logger.error(f"Service cant create chat: {ex}")
+        raise ex
+
+
+async def all_chats_by_user(db: AsyncSession, username: str, profile: str = "full", history: int | None = None) -> list[Chat]:
+    return await data.get_all_chats_by_user(db=db, username=username, profile=profile, history=history)
+
+
+async def chat_ids_by_user(db: AsyncSession, username: str) -> list[int]:
+    return await data.get_chat_ids_by_user(db=db, username=username)
+
+
+def parse_cursor(cursor: str | None) -> tuple[int, int] | None:
+    """
+    Разбирает курсор списка чатов ("активность:chat_id").
+
+    :raises ValueError: Если курсор не разобрать
+    """
+    if not cursor:
+        return None
+    activity, _, chat_id = cursor.partition(":")
+    return int(activity), int(chat_id)
+
+
+async def summaries(db: AsyncSession, username: str, cursor: str | None = None, limit: int = 50) -> ChatSummaryPage:
+    """
+    Страница списка чатов пользователя.
+
+    :param cursor: next_cursor предыдущей страницы
+    :raises ValueError: Если курсор не разобрать
+    """
+    return await data.get_summaries(db, username, before=parse_cursor(cursor), limit=limit)
+
+
+async def summary_rows(db: AsyncSession, username: str, cursor: str | None = None, limit: int = 50) -> tuple[list, str | None]:
+    """То же, что summaries, в виде кортежей колонок для быстрого пути чтения."""
+    return await data.get_summary_rows(db, username, before=parse_cursor(cursor), limit=limit)
+
+
+async def mark_read(db: AsyncSession, chat_id: int, username: str, message_id: int) -> bool:
+    return await data.mark_read(db, chat_id, username, message_id)
+
+
+async def delete(db: AsyncSession, chat_id: int) -> bool:
+    return await data.delete(db, chat_id)
+
+
+async def check_user_in_chat(db: AsyncSession, chat_id: int, username: str) -> bool:
+    return await data.check_user_in_chat(db, chat_id, username)
+
+
+async def get_owner(db: AsyncSession, chat_id: int) -> str:
+    return await data.get_owner(db, chat_id)
+
+
+async def add_members(db: AsyncSession, chat_id: int, usernames: List[str]) -> Dict[str, str]:
+    return await data.add_members(db, chat_id, usernames)
+
+
+async def remove_members(db: AsyncSession, chat_id: int, usernames: List[str]) -> Dict[str, str]:
+    return await data.remove_members(db, chat_id, usernames)
+
+
+async def add_user_to_chat(db: AsyncSession, chat_id: int, username: str) -> bool:
+    return await data.add_user_to_chat(db, chat_id, username)
+
+
+async def remove_user_from_chat(db: AsyncSession, chat_id: int, username: str) -> bool:
+    return await data.remove_user_from_chat(db, chat_id, username)
+
+
+async def add_message_to_chat(db: AsyncSession, message_pydantic: Message) -> bool:
+    return await data.add_message_to_chat(db, message_pydantic)
+
+
+async def post_message(db: AsyncSession, chat_id: int, username: str, content: str) -> Message | None:
+    """
+    Сохраняет сообщение, если пользователь участник чата.
+
+    При включённой пакетной записи сообщение уходит в общий пакет ingestor,
+    иначе пишется сразу одним запросом.
+    """
+    if ingest.ingestor is not None and ingest.ingestor.running:
+        return await ingest.ingestor.submit(chat_id, username, content)
+    row = await data.insert_message_if_member(db, chat_id, username, content)
+    if row is None:
+        return None
+    message_id, timestamp = row
+    return Message(id=message_id, content=content, timestamp=timestamp, username=username, chat_id=chat_id)
+
+
+async def delete_message_from_chat(db: AsyncSession, message_id: int) -> bool:
+    return await data.delete_message_from_chat(db, message_id)
@@ -0,0 +1,169 @@
+"""
+Потоковая выгрузка истории сообщений в NDJSON или CSV.
+
+Сообщения читаются серверным курсором пачками и сразу кодируются, поэтому
+память не зависит от размера выгрузки. Выгрузка идёт по возрастанию id и
+продолжается после последнего выгруженного сообщения (after_id). Используется
+маршрутом GET /chats/export и из командной строки:
+
+    python -m backend.app.service.export --chat 1 [--since 2024-01-01] [--until 2025-01-01]
+        [--format ndjson|csv] [--gzip] [--after-id N | --resume] -o history.ndjson
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import zlib
+from contextlib import nullcontext
+from datetime import datetime
+from typing import AsyncIterator, Iterable, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..api.responses import MESSAGE_FIELDS, dumps
+from ..data import messages_postgre_async as data
+
+
+EXPORT_FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+BATCH_SIZE = 1000
+
+
+def encode_ndjson(rows: Iterable[Sequence]) -> bytes:
+    return b"".join(dumps(dict(zip(MESSAGE_FIELDS, row))) + b"\n" for row in rows)
+
+
+def encode_csv(rows: Iterable[Sequence], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(MESSAGE_FIELDS)
+    writer.writerows(
+        [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows
+    )
+    return buffer.getvalue().encode("utf-8")
+
+
+async def export_stream(db: AsyncSession, fmt: str = "ndjson", compress: bool = False,
+                        batch_size: int = BATCH_SIZE, **filters) -> AsyncIterator[bytes]:
+    """
+    Кодированная выгрузка кусками, по одному на пачку сообщений.
+
+    Заголовок CSV пишется только в начале выгрузки, не при продолжении после
+    after_id. При compress каждый вызов даёт отдельный член gzip, поэтому
+    продолжение можно дописать в конец уже сжатого файла.
+
+    :param filters: Фильтры data.messages_postgre_async.stream_rows
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31 - формат gzip
+    header = fmt == "csv" and filters.get("after_id") is None
+
+    async for rows in data.stream_rows(db, batch_size=batch_size, **filters):
+        if fmt == "ndjson":
+            chunk = encode_ndjson(rows)
+        else:
+            chunk, header = encode_csv(rows, header=header), False
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+
+    if header:
+        # Пустая выгрузка CSV - только заголовок
+        chunk = encode_csv([], header=True)
+        yield compressor.compress(chunk) if compressor is not None else chunk
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def last_exported_id(path: str, fmt: str, compress: bool) -> int | None:
+    """
+    id последнего полностью записанного сообщения в файле выгрузки.
+
+    :raises ValueError: Если сжатый файл обрезан: дописать к нему продолжение нельзя
+    """
+    if not os.path.exists(path):
+        return None
+    opener = gzip.open if compress else open
+    last = None
+    try:
+        with opener(path, "rt", encoding="utf-8", newline="") as file:
+            if fmt == "ndjson":
+                for line in file:
+                    if line.endswith("\n"):
+                        last = json.loads(line)["id"]
+            else:
+                for row in csv.reader(file):
+                    if row and row[0] != MESSAGE_FIELDS[0]:
+                        last = int(row[0])
+    except EOFError:
+        raise ValueError(f"{path} is truncated, export the rest into a new file with --after-id {last}")
+    return last
+
+
+def drop_partial_line(path: str) -> None:
+    """Обрезает недописанную последнюю строку несжатого файла, чтобы продолжение начиналось с новой строки."""
+    with open(path, "rb+") as file:
+        size = file.seek(0, os.SEEK_END)
+        position = size
+        while position > 0:
+            step = min(64 * 1024, position)
+            file.seek(position - step)
+            tail = file.read(step)
+            newline = tail.rfind(b"\n")
+            if newline != -1:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position != size:
+            file.truncate(position)
+
+
+async def export_to_file(path: str, fmt: str, compress: bool, **filters) -> None:
+    """Пишет выгрузку в файл или в stdout ("-"); при продолжении после after_id дописывает в конец."""
+    from ..db.init_postgre import AsyncSessionLocal, async_engine
+
+    mode = "ab" if filters.get("after_id") is not None else "wb"
+    try:
+        async with AsyncSessionLocal() as db:
+            with open(path, mode) if path != "-" else nullcontext(sys.stdout.buffer) as output:
+                async for chunk in export_stream(db, fmt, compress, **filters):
+                    output.write(chunk)
+    finally:
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chat", type=int, default=None, help="Только этот чат")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--after-id", type=int, default=None, help="Продолжить после этого сообщения")
+    parser.add_argument("--resume", action="store_true", help="Продолжить с последнего сообщения в файле -o")
+    parser.add_argument("-o", "--output", default="-")
+    args = parser.parse_args()
+
+    after_id = args.after_id
+    if args.resume:
+        if args.output == "-":
+            parser.error("--resume requires --output")
+        after_id = last_exported_id(args.output, args.format, args.gzip)
+        if after_id is not None and not args.gzip:
+            drop_partial_line(args.output)
+
+    asyncio.run(export_to_file(
+        args.output, args.format, args.gzip,
+        chat_id=args.chat, since=args.since, until=args.until, after_id=after_id,
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import asyncio
+from typing import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..data import chats_postgre_async as data
+from ..models import Message
+from ..settings import logger, INGEST_ENABLED, INGEST_BATCH_SIZE, INGEST_LINGER_MS
+
+
+class MessageIngestor:
+    """
+    Пакетная запись входящих сообщений (write-behind).
+
+    Сообщения копятся в очереди и сбрасываются одной транзакцией, когда набралось
+    batch_size штук или прошло linger_ms с первого сообщения пакета. Отправитель
+    ждёт future, которое разрешается id и timestamp только после коммита, так что
+    подтверждение и рассылка происходят уже после записи на диск.
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession],
+                 batch_size: int = INGEST_BATCH_SIZE, linger_ms: float = INGEST_LINGER_MS):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.linger = linger_ms / 1000
+        self.queue: asyncio.Queue | None = None
+        self.worker: asyncio.Task | None = None
+        self.closing = False
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Останавливает приём и дописывает всё, что уже стоит в очереди.
+
+        Сообщения, до которых воркер не дошёл (например, он упал), завершаются
+        ошибкой, чтобы отправители не ждали вечно.
+        """
+        if self.worker is None:
+            return
+        self.closing = True
+        self.queue.put_nowait(None)
+        try:
+            await self.worker
+        finally:
+            self.worker = None
+            self.closing = False
+            self._fail_pending(RuntimeError("Message ingestor stopped"))
+
+    @property
+    def running(self) -> bool:
+        return self.worker is not None and not self.closing
+
+    def _fail_pending(self, ex: Exception) -> None:
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not None and not item[3].done():
+                item[3].set_exception(ex)
+
+    async def submit(self, chat_id: int, username: str, content: str) -> Message | None:
+        """
+        Ставит сообщение в очередь и ждёт его записи.
+
+        :return: Сохранённое сообщение или None, если пользователь не участник чата
+        :raises RuntimeError: Конвейер не запущен или останавливается
+        """
+        if not self.running:
+            raise RuntimeError("Message ingestor is not running")
+        future = asyncio.get_running_loop().create_future()
+        # Без await между проверкой и постановкой: stop не вклинится и не оставит сообщение в очереди
+        self.queue.put_nowait((chat_id, username, content, future))
+        row = await future
+        if row is None:
+            return None
+        message_id, timestamp = row
+        return Message(id=message_id, content=content, timestamp=timestamp, username=username, chat_id=chat_id)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.linger
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list) -> None:
+        items = [(chat_id, username, content) for chat_id, username, content, _ in batch]
+        try:
+            async with self.session_factory() as db:
+                results = await data.insert_messages_batch(db, items)
+        except Exception as ex:
+            logger.error(f"Message batch of {len(batch)} failed: {ex!r}")
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(ex)
+            return
+        for (*_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+def create_ingestor() -> MessageIngestor | None:
+    """Создаёт конвейер пакетной записи, если он включён через INGEST_ENABLED."""
+    if not INGEST_ENABLED:
+        return None
+    from ..db.init_postgre import AsyncSessionLocal
+    return MessageIngestor(AsyncSessionLocal)
+
+
+ingestor = create_ingestor()
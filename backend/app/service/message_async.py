@@ -0,0 +1,85 @@
+from ..models import Message, MessagePage, MessageSearchPage
+from ..data import messages_postgre_async as data
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Any
+from datetime import datetime
+
+
+# Асинхронная версия service.message.
+
+
+async def get_one(db: AsyncSession, message_id: int) -> Message:
+    return await data.get_one(db, message_id)
+
+
+async def get_all(db: AsyncSession) -> list[Message]:
+    return await data.get_all(db)
+
+
+async def create(db: AsyncSession, message: Message) -> Message:
+    return await data.create(db, message)
+
+
+async def delete(db: AsyncSession, message_id: int) -> bool:
+    return await data.delete(db, message_id)
+
+
+async def get_page(db: AsyncSession, chat_id: int, before_id: int | None = None,
+                   after_id: int | None = None, limit: int = 50) -> MessagePage:
+    return await data.get_page(db, chat_id, before_id=before_id, after_id=after_id, limit=limit)
+
+
+async def get_page_at(db: AsyncSession, chat_id: int, timestamp: datetime, limit: int = 50) -> MessagePage:
+    return await data.get_page_at(db, chat_id, timestamp=timestamp, limit=limit)
+
+
+async def get_page_rows(db: AsyncSession, chat_id: int, before_id: int | None = None,
+                        after_id: int | None = None, limit: int = 50) -> tuple[list, bool]:
+    return await data.get_page_rows(db, chat_id, before_id=before_id, after_id=after_id, limit=limit)
+
+
+async def get_page_at_rows(db: AsyncSession, chat_id: int, timestamp: datetime, limit: int = 50) -> tuple[list, bool]:
+    return await data.get_page_at_rows(db, chat_id, timestamp=timestamp, limit=limit)
+
+
+async def find_messages_by_sender_in_chat(db: AsyncSession, sender_name: str, chat_id: int) -> list[Message]:
+    filters: List[Dict[str, Any]] = []
+    filters.append({'chat_id': chat_id})
+    filters.append({'username': sender_name})
+    return await data.get_messages_by_filter(db=db, filters=filters)
+
+
+async def find_all_messages_by_sender(db: AsyncSession, sender_name: str) -> list[Message]:
+    filters: List[Dict[str, Any]] = []
+    filters.append({'username': sender_name})
+    return await data.get_messages_by_filter(db=db, filters=filters)
+
+
+async def find_message_by_content_in_chat(db: AsyncSession, content: str, chat_id: int) -> list[Message]:
+    filters: List[Dict[str, Any]] = []
+    filters.append({'content': content})
+    filters.append({'chat_id': chat_id})
+    return await data.get_messages_by_filter(db=db, filters=filters)
+
+
+def parse_search_cursor(cursor: str | None) -> tuple[float, int] | None:
+    """
+    Разбирает курсор поиска ("релевантность:id").
+
+    :raises ValueError: Если курсор не разобрать
+    """
+    if not cursor:
+        return None
+    rank, _, message_id = cursor.rpartition(":")
+    return float(rank), int(message_id)
+
+
+async def search(db: AsyncSession, username: str, query: str, chat_id: int | None = None,
+                 cursor: str | None = None, limit: int = 20) -> MessageSearchPage:
+    """
+    Поиск по сообщениям чатов пользователя.
+
+    :param cursor: next_cursor предыдущей страницы
+    :raises ValueError: Если курсор не разобрать
+    """
+    return await data.search(db, username, query, chat_id=chat_id, before=parse_search_cursor(cursor), limit=limit)
@@ -0,0 +1,128 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable
+
+from ..errors import Overloaded
+from ..metrics import Counter, Gauge
+from ..settings import logger, PASSWORD_POOL, PASSWORD_WORKERS, PASSWORD_QUEUE_MAX
+
+
+@lru_cache(maxsize=None)
+def pwd_context():
+    """CryptContext создаётся при первой проверке пароля: passlib не нужен для старта воркера."""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated = "auto")
+
+
+# Функции верхнего уровня, чтобы их можно было передать в ProcessPoolExecutor.
+# Модуль не импортирует слой данных, поэтому дочерний процесс не подключается к базе.
+def verify_password(plain : str, hash : str) -> bool:
+    """Хеширование строки и сравнение её с базой данных"""
+    return pwd_context().verify(plain, hash)
+
+
+def get_hash(plain : str) -> str:
+    return pwd_context().hash(plain)
+
+
+class PasswordPool:
+    """
+    Ограниченный пул для bcrypt.
+
+    Одна проверка пароля занимает сотни миллисекунд CPU, поэтому она уходит в
+    пул потоков (bcrypt отпускает GIL) или процессов. Одновременно в работе и
+    очереди может быть не больше workers + queue_max задач; сверх этого run
+    сразу бросает Overloaded, и обработчик отвечает 503, а не копит очередь.
+    """
+
+    def __init__(self, kind: str = PASSWORD_POOL, workers: int = PASSWORD_WORKERS,
+                 queue_max: int = PASSWORD_QUEUE_MAX):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unsupported PASSWORD_POOL: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.queue_max = queue_max
+        self.executor: Executor | None = None
+        # Счётчики меняются только из event loop, блокировка не нужна.
+        # in_flight - задачи, которые ещё занимают пул, даже если ожидающий их запрос отменён
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @property
+    def queued(self) -> int:
+        """Задачи, которые ждут свободного воркера."""
+        return max(0, self.in_flight - self.workers)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    def _get_executor(self) -> Executor:
+        if self.executor is None:
+            if self.kind == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self.executor
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self.in_flight >= self.workers + self.queue_max:
+            self.rejected += 1
+            logger.warning(f"Password pool saturated: {self.in_flight} tasks in flight")
+            raise Overloaded(msg="Server is busy, try again later")
+        loop = asyncio.get_running_loop()
+        future = self._get_executor().submit(func, *args)
+        self.in_flight += 1
+        # Слот освобождается, когда задача действительно завершилась в пуле, а не когда
+        # перестали ждать её результат: отменённый запрос не должен открывать место для новых
+        future.add_done_callback(lambda done: self._release(loop, done))
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _release(self, loop: asyncio.AbstractEventLoop, future) -> None:
+        # Вызывается из потока пула: счётчики меняются в event loop
+        try:
+            loop.call_soon_threadsafe(self._on_done, future)
+        except RuntimeError:
+            pass  # Цикл уже закрыт, считать некому
+
+    def _on_done(self, future) -> None:
+        self.in_flight -= 1
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    async def verify(self, plain: str, hash: str) -> bool:
+        return await self.run(verify_password, plain, hash)
+
+    async def hash(self, plain: str) -> str:
+        return await self.run(get_hash, plain)
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+
+password_pool = PasswordPool()
+
+# Глубина очереди и отказы пула на /metrics: значения читаются из password_pool при сборе
+Gauge("password_pool_in_flight", "bcrypt tasks running or waiting in the pool.",
+      collect=lambda: [((), password_pool.in_flight)])
+Gauge("password_pool_queued", "bcrypt tasks waiting for a free worker.",
+      collect=lambda: [((), password_pool.queued)])
+Counter("password_pool_completed_total", "bcrypt tasks finished successfully.",
+        collect=lambda: [((), password_pool.completed)])
+Counter("password_pool_failed_total", "bcrypt tasks that raised or were cancelled.",
+        collect=lambda: [((), password_pool.failed)])
+Counter("password_pool_rejected_total", "bcrypt tasks rejected because the pool was saturated.",
+        collect=lambda: [((), password_pool.rejected)])
@@ -1,5 +1,4 @@
 from ..models import User
-from jose import jwt, JWTError
 from datetime import timedelta, datetime
 from fastapi import Request
 from ..errors import Duplicate, Missing
@@ -8,23 +7,13 @@ from sqlalchemy.orm import Session
 
 from ..data import users_postgre as data
 
-from passlib.context import CryptContext
 from ..settings import SECRET_KEY, ALGORITHM
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated = "auto")
-
-
-def verify_password(plain : str, hash : str) -> bool:
-    """Хеширование строки и сравнение её с базой данных"""
-    return pwd_context.verify(plain, hash)
-
-
-def get_hash(plain : str) -> str:
-    return pwd_context.hash(plain)
+from .passwords import verify_password, get_hash
 
 
 def get_jwt_username(token : str) -> str | None:
     """Возврат имени пользователя из jwt доступа"""
+    from jose import jwt, JWTError  # jose загружается при первом запросе, а не при старте воркера
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHM)
         if not (username := payload.get("sub")):
@@ -64,6 +53,7 @@ def auth_user(db : Session, username : str, plain : str) -> User | None:
 
 def create_access_token(data: dict, expires: timedelta | None = None):
     """Возвращение токена доступа"""
+    from jose import jwt
     src = data.copy()
     now = datetime.utcnow()
     if not expires:
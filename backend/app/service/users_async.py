@@ -0,0 +1,92 @@
+from ..models import User, PublicUserData, UserDirectoryPage
+from ..errors import Missing
+from ..cache import user_cache
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..data import users_postgre_async as data
+from .users import get_jwt_username, create_access_token
+from .passwords import password_pool
+
+
+# Асинхронная версия service.users. Работа с JWT не обращается к базе данных и
+# переиспользуется из синхронного модуля, а bcrypt выполняется в password_pool.
+
+
+async def verify_password(plain : str, hash : str) -> bool:
+    """Проверка пароля в пуле; при переполнении пула бросает Overloaded"""
+    return await password_pool.verify(plain, hash)
+
+
+async def get_hash(plain : str) -> str:
+    return await password_pool.hash(plain)
+
+
+async def get_current_user(db : AsyncSession, token : str) -> User | None:
+    """Декодирование токена доступа и возврат объекта User"""
+    if not (username := get_jwt_username(token)):
+        return None
+    if (user := await lookup_user(db, username)):
+        return user
+    return None
+
+
+async def lookup_user(db : AsyncSession, username : str) -> User | None:
+    """Возврат совподающего пользователя из базы данных для строки name"""
+    try:
+        if (user := await data.get_one(db, username)):
+            return user
+    except Missing:
+        return None
+
+
+async def get_public(db : AsyncSession, username : str) -> PublicUserData | None:
+    """Публичные данные пользователя из кеша, при промахе - из базы данных"""
+    if (user := user_cache.get(username)) is not None:
+        return user
+    try:
+        user = await data.get_public(db, username)
+    except Missing:
+        return None
+    user_cache.set(username, user)
+    return user
+
+
+async def resolve_principal(db : AsyncSession, token : str) -> PublicUserData | None:
+    """Однократное декодирование токена и возврат публичных данных пользователя"""
+    if not (username := get_jwt_username(token)):
+        return None
+    return await get_public(db, username)
+
+
+async def auth_user(db : AsyncSession, username : str, plain : str) -> User | None:
+    """Аутентификация пользователя name и plain пароль"""
+    if not (user := await lookup_user(db, username = username)):
+        return None
+    if not await verify_password(plain, user.password):
+        return None
+    return user
+
+
+async def get_one(db : AsyncSession, username : str) -> User:
+    return await data.get_one(db, username)
+
+
+async def get_all(db : AsyncSession) -> list[User]:
+    return await data.get_all(db)
+
+
+async def get_directory(db : AsyncSession, query : str | None = None, cursor : str | None = None,
+                        limit : int = 50) -> UserDirectoryPage:
+    return await data.get_directory(db, query=query, after=cursor, limit=limit)
+
+
+async def create(db : AsyncSession, user : User) -> User:
+    return await data.create(db, user)
+
+
+async def modify(db : AsyncSession, user : User) -> User:
+    return await data.modify(db, user)
+
+
+async def delete(db : AsyncSession, user : User) -> bool:
+    return await data.delete(db, user)
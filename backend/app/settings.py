@@ -1,14 +1,71 @@
-from fastapi.templating import Jinja2Templates
 import logging
 from dotenv import load_dotenv
 import os
 
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 
-TEMPLATES = Jinja2Templates(directory="frontend/templates")
+def configure_logging() -> None:
+    """Настройка логов процесса: вызывается при старте приложения и в CLI, а не при импорте."""
+    logging.basicConfig(level=logging.INFO)
+
+
+class LazyTemplates:
+    """Jinja2Templates, которые создаются при первом рендере: jinja2 не загружается при старте воркера."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.templates = None
+
+    def load(self):
+        if self.templates is None:
+            from fastapi.templating import Jinja2Templates
+            self.templates = Jinja2Templates(directory=self.directory)
+        return self.templates
+
+    def __getattr__(self, name: str):
+        return getattr(self.load(), name)
+
+
+TEMPLATES = LazyTemplates(directory="frontend/templates")
 SECRET_KEY = os.getenv('SECRET_KEY')
 ALGORITHM = os.getenv('ALGORITHM')
 
+# Пакетная запись сообщений (service.ingest): выключена по умолчанию
+INGEST_ENABLED = os.getenv('INGEST_ENABLED', '').lower() in ('1', 'true', 'yes')
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '200'))  # Максимум сообщений в одной вставке
+INGEST_LINGER_MS = float(os.getenv('INGEST_LINGER_MS', '5'))  # Сколько ждать добора пакета
+
+# Кеш публичных данных пользователей для аутентификации запросов
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '60'))  # Секунды
+
+# Пул для bcrypt (service.passwords): хеширование не должно блокировать event loop
+PASSWORD_POOL = os.getenv('PASSWORD_POOL', 'thread')  # thread или process
+PASSWORD_WORKERS = int(os.getenv('PASSWORD_WORKERS', str(os.cpu_count() or 4)))
+PASSWORD_QUEUE_MAX = int(os.getenv('PASSWORD_QUEUE_MAX', '64'))  # Сколько задач может ждать свободного воркера
+
+# Применять миграции схемы (db.migrate) при старте приложения
+MIGRATE_ON_STARTUP = os.getenv('MIGRATE_ON_STARTUP', '1').lower() in ('1', 'true', 'yes')
+
+# Конфигурация полнотекстового поиска PostgreSQL (to_tsvector); меняется только вместе с пересчётом search_vector
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'russian')
+SEARCH_CANDIDATES = int(os.getenv('SEARCH_CANDIDATES', '2000'))  # Сколько самых новых совпадений ранжирует поиск
+
+# Реплика для чтения (db.routing): без неё все запросы идут в основную базу
+REPLICA_DATABASE_URL = os.getenv('REPLICA_DATABASE_URL', '')
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))  # Сколько после своей записи читать из основной базы
+
+# Старт воркера (api.main.lifespan): сколько соединений открыть заранее и сколько ждать базу
+DB_WARM_CONNECTIONS = int(os.getenv('DB_WARM_CONNECTIONS', '5'))
+DB_STARTUP_TIMEOUT = float(os.getenv('DB_STARTUP_TIMEOUT', '30'))  # Секунды
+
+# Метрики Prometheus (backend.app.metrics, GET /metrics)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+
+# Профилировщик SQL (backend.app.profiler): только для отладки, выключен по умолчанию
+SQL_PROFILER = os.getenv('SQL_PROFILER', '').lower() in ('1', 'true', 'yes')
+SQL_REPEAT_THRESHOLD = int(os.getenv('SQL_REPEAT_THRESHOLD', '3'))  # С какого числа одинаковых запросов подозревать N+1
+SQL_SLOW_MS = float(os.getenv('SQL_SLOW_MS', '100'))  # Запросы дольше этого попадают в лог медленных с EXPLAIN
+SQL_SLOW_LOG = os.getenv('SQL_SLOW_LOG', '')  # Файл лога медленных запросов; пусто - общий лог
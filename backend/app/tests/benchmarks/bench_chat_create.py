@@ -0,0 +1,77 @@
+"""
+POST /chats/create: поимённое разрешение участников против одного запроса IN.
+
+Для каждого размера чата печатаются время создания и число SQL запросов.
+
+    python -m backend.app.tests.benchmarks.bench_chat_create [--users 20000] [--members 10 500 5000] [--out result.json]
+"""
+import argparse
+import asyncio
+import time
+
+from backend.app.tests.benchmarks.common import use_temp_database, seed, write_results
+
+use_temp_database()
+
+from backend.app.db.init_postgre import SessionLocal, AsyncSessionLocal, engine, async_engine
+from backend.app.data import chats_postgre_async
+from backend.app.models import ChatBase, UserBase
+from backend.app.tests.utils import count_queries
+
+
+def legacy_create(title: str, owner: str, usernames: list[str]) -> int:
+    """Как было: service_users.get_one на каждое имя, затем from_pydantic ещё раз по одному."""
+    with SessionLocal() as db:
+        for name in usernames:
+            db.query(UserBase).filter(UserBase.username == name).first()
+        owner_row = db.query(UserBase).filter(UserBase.username == owner).first()
+        users = [db.query(UserBase).filter(UserBase.username == name).first() for name in usernames]
+        chat = ChatBase(title=title, owner=owner_row, users=users)
+        db.add(chat)
+        db.commit()
+        return chat.id
+
+
+async def bulk_create(title: str, owner: str, usernames: list[str]) -> int:
+    async with AsyncSessionLocal() as db:
+        return (await chats_postgre_async.create_with_members(db, title, owner, usernames)).id
+
+
+async def run(users: int, sizes: list[int]) -> dict:
+    with SessionLocal() as db:
+        usernames, _ = seed(db, users=users, chats=0, members_per_chat=0)
+
+    results = {"database": async_engine.url.render_as_string(hide_password=True), "users": users, "runs": []}
+    for size in sizes:
+        members = usernames[1:size + 1]
+        with count_queries(engine) as counter:
+            started = time.perf_counter()
+            await asyncio.to_thread(legacy_create, f"legacy_{size}", usernames[0], members)
+            legacy_ms = (time.perf_counter() - started) * 1000
+        legacy_queries = counter.count
+
+        with count_queries(async_engine.sync_engine) as counter:
+            started = time.perf_counter()
+            await bulk_create(f"bulk_{size}", usernames[0], members)
+            bulk_ms = (time.perf_counter() - started) * 1000
+
+        results["runs"].append({
+            "members": size,
+            "legacy_ms": legacy_ms, "legacy_queries": legacy_queries,
+            "bulk_ms": bulk_ms, "bulk_queries": counter.count,
+        })
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--members", type=int, nargs="+", default=[10, 500, 5000])
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    write_results(asyncio.run(run(args.users, args.members)), args.out)
+
+
+if __name__ == "__main__":
+    main()
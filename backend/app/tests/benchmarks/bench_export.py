@@ -0,0 +1,85 @@
+"""
+Выгрузка истории большого чата: Chat со всеми сообщениями в памяти против потоковой выгрузки.
+
+Для каждого варианта печатаются время, размер результата и пик выделенной
+памяти (tracemalloc). Пик потоковой выгрузки не должен расти с числом сообщений.
+
+    python -m backend.app.tests.benchmarks.bench_export [--messages 100000 300000] [--out result.json]
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from backend.app.tests.benchmarks.common import use_temp_database, seed, write_results
+
+use_temp_database()
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import insert
+
+from backend.app.data import chats_postgre
+from backend.app.db.init_postgre import SessionLocal, AsyncSessionLocal, async_engine
+from backend.app.models import MessageBase
+from backend.app.service.export import export_stream
+
+
+async def legacy_export(chat_id: int) -> int:
+    """Как было: GET /chats/{id} с полным профилем загрузки и одним JSON ответом."""
+    with SessionLocal() as db:
+        return len(JSONResponse(jsonable_encoder(chats_postgre.get_one(db, chat_id, profile="full"))).body)
+
+
+async def stream_export(chat_id: int, fmt: str, compress: bool) -> int:
+    size = 0
+    async with AsyncSessionLocal() as db:
+        async for chunk in export_stream(db, fmt, compress, chat_id=chat_id):
+            size += len(chunk)  # Кусок уходит клиенту и сразу освобождается
+    return size
+
+
+async def measure(export) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = await export()
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": seconds, "bytes": size, "peak_alloc_mb": peak / 2 ** 20}
+
+
+async def run(sizes: list[int]) -> dict:
+    with SessionLocal() as db:
+        usernames, chat_ids = seed(db, users=2, chats=1, members_per_chat=2)
+    chat_id = chat_ids[0]
+
+    results = {"database": async_engine.url.render_as_string(hide_password=True)}
+    inserted = 0
+    for size in sorted(sizes):
+        with SessionLocal() as db:
+            db.execute(insert(MessageBase), [
+                {"chat_id": chat_id, "username": usernames[i % 2], "content": f"Сообщение {i} для выгрузки за год"}
+                for i in range(inserted, size)
+            ])
+            db.commit()
+        inserted = size
+        results[str(size)] = {
+            "legacy_chat_json": await measure(lambda: legacy_export(chat_id)),
+            "stream_ndjson": await measure(lambda: stream_export(chat_id, "ndjson", False)),
+            "stream_csv_gzip": await measure(lambda: stream_export(chat_id, "csv", True)),
+        }
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, nargs="+", default=[100_000, 300_000])
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    write_results(asyncio.run(run(args.messages)), args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Холодный старт: время импорта backend.app.api.main в новом процессе.
+
+Каждый запуск - отдельный интерпретатор, поэтому модули не берутся из уже
+загруженных. Печатаются медиана и минимум, самые дорогие модули по
+-X importtime и тяжёлые зависимости, попавшие в импорт. С --max-ms код выхода
+ненулевой, если медиана больше порога: так регрессия старта ловится в CI.
+
+    python -m backend.app.tests.benchmarks.bench_import [--runs 10] [--max-ms 1500] [--out result.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from backend.app.tests.benchmarks.common import use_temp_database, write_results
+
+use_temp_database()
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..'))
+TARGET = "backend.app.api.main"
+HEAVY_MODULES = ("jinja2", "passlib", "jose", "uvicorn", "asyncpg", "psycopg2", "aiosqlite")
+
+PROBE = (
+    "import json, sys, time\n"
+    "started = time.perf_counter()\n"
+    f"import {TARGET}\n"
+    "elapsed = time.perf_counter() - started\n"
+    f"print(json.dumps({{'ms': elapsed * 1000, 'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))"
+)
+
+
+def probe() -> dict:
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def top_modules(limit: int) -> list[dict]:
+    """Модули с наибольшим собственным временем импорта по -X importtime."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {TARGET}"],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({"module": name.strip(), "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    return sorted(rows, key=lambda row: row["self_ms"], reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=None, help="Порог медианы, мс")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    probe()  # Прогрев: .pyc и файловый кеш ОС
+    runs = [probe() for _ in range(args.runs)]
+    timings = [run["ms"] for run in runs]
+    results = {
+        "target": TARGET,
+        "runs": args.runs,
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "heavy_modules_loaded": sorted({name for run in runs for name in run["heavy"]}),
+        "top_modules": top_modules(args.top),
+    }
+    write_results(results, args.out)
+    if args.max_ms is not None and results["median_ms"] > args.max_ms:
+        sys.exit(f"Import time {results['median_ms']:.0f} ms exceeds {args.max_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Пропускная способность записи сообщений: транзакция на сообщение против пакетной записи.
+
+    python -m backend.app.tests.benchmarks.bench_ingest [--messages 5000] [--concurrency 50]
+        [--batch-size 200] [--linger-ms 5] [--out result.json]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from backend.app.tests.benchmarks.common import use_temp_database, seed, write_results
+
+use_temp_database()
+
+from backend.app.db.init_postgre import SessionLocal, AsyncSessionLocal, async_engine
+from backend.app.data import chats_postgre_async as data
+from backend.app.service.ingest import MessageIngestor
+from backend.app.tests.utils import count_queries
+
+
+async def direct_send(chat_id: int, username: str, content: str):
+    async with AsyncSessionLocal() as db:
+        return await data.insert_message_if_member(db, chat_id, username, content)
+
+
+async def drive(send, senders: list[tuple[int, str]], messages: int, concurrency: int) -> dict:
+    """Гоняет messages сообщений через send из concurrency параллельных отправителей."""
+    latencies: list[float] = []
+    per_sender = messages // concurrency
+
+    async def sender(index: int):
+        chat_id, username = senders[index % len(senders)]
+        for i in range(per_sender):
+            started = time.perf_counter()
+            if await send(chat_id, username, f"message {index}-{i}") is None:
+                raise RuntimeError("not a member")
+            latencies.append(time.perf_counter() - started)
+
+    with count_queries(async_engine.sync_engine) as counter:
+        started = time.perf_counter()
+        await asyncio.gather(*(sender(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    total = per_sender * concurrency
+    latencies.sort()
+    return {
+        "messages": total,
+        "messages_per_second": total / elapsed,
+        "commits": counter.commits,
+        "queries": counter.count,
+        "latency_ms_p50": statistics.median(latencies) * 1000,
+        "latency_ms_p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def run(messages: int, concurrency: int, batch_size: int, linger_ms: float) -> dict:
+    with SessionLocal() as db:
+        usernames, chat_ids = seed(db, users=concurrency, chats=10, members_per_chat=concurrency)
+    senders = [(chat_ids[i % len(chat_ids)], usernames[i]) for i in range(concurrency)]
+
+    ingestor = MessageIngestor(AsyncSessionLocal, batch_size=batch_size, linger_ms=linger_ms)
+    await ingestor.start()
+
+    results = {
+        "database": async_engine.url.render_as_string(hide_password=True),
+        "concurrency": concurrency,
+        "batch_size": batch_size,
+        "linger_ms": linger_ms,
+        "per_message_transaction": await drive(direct_send, senders, messages, concurrency),
+        "batched": await drive(ingestor.submit, senders, messages, concurrency),
+    }
+    await ingestor.stop()
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--linger-ms", type=float, default=5)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    write_results(asyncio.run(run(args.messages, args.concurrency, args.batch_size, args.linger_ms)), args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Сквозная нагрузка: POST /chats/send с заданной частотой и доставка по WebSocket.
+
+Создаёт users пользователей и chats чатов, поднимает сервер (uvicorn в
+отдельном процессе) или берёт уже запущенный по --url, открывает clients
+WebSocket соединений на /chats/ws/{username} и шлёт сообщения от участников
+чатов с частотой rate в секунду в течение duration секунд. Нагрузка открытая:
+запросы уходят по расписанию, не дожидаясь ответов на предыдущие, поэтому
+медленный сервер виден по задержкам, а не по сниженной частоте.
+
+Печатаются пропускная способность, перцентили задержки ответа на send и
+задержки доставки: от начала запроса до получения сообщения каждым
+подключённым участником чата, кроме отправителя.
+
+Без DATABASE_URL используется временная SQLite база. Для PostgreSQL задайте
+DATABASE_URL; с --url сервер должен смотреть в ту же базу, что и сидирование.
+
+    python -m backend.app.tests.benchmarks.bench_load [--users 1000] [--chats 100] [--members 20]
+        [--clients 500] [--rate 200] [--duration 10] [--workers 1] [--url http://...] [--out result.json]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from contextlib import nullcontext
+
+from backend.app.tests.benchmarks.common import use_temp_database, seed, write_results, latency_summary, serve
+
+use_temp_database()
+
+import httpx
+from sqlalchemy import select
+from websockets.asyncio.client import connect
+
+from backend.app.db.init_postgre import SessionLocal
+from backend.app.models import ChatUser
+from backend.app.service.users import create_access_token
+
+PREFIX = "load "  # Метка сообщений бенчмарка: "load <номер>"
+
+
+def memberships() -> dict[int, list[str]]:
+    with SessionLocal() as db:
+        chats: dict[int, list[str]] = {}
+        for chat_id, username in db.execute(select(ChatUser.chat_id, ChatUser.username)):
+            chats.setdefault(chat_id, []).append(username)
+        return chats
+
+
+class Deliveries:
+    """Время отправки каждого сообщения и задержки его получения."""
+
+    def __init__(self):
+        self.sent_at: dict[int, float] = {}
+        self.latencies: list[float] = []
+        self.expected = 0
+        self.done = asyncio.Event()
+
+    def received(self, payload: str) -> None:
+        event = json.loads(payload)
+        content = event.get("message", {}).get("content", "") if event.get("type") == "new_message" else ""
+        if not content.startswith(PREFIX):
+            return
+        started = self.sent_at.get(int(content[len(PREFIX):]))
+        if started is not None:
+            self.latencies.append(time.perf_counter() - started)
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+async def listen(url: str, username: str, deliveries: Deliveries, ready: asyncio.Event) -> None:
+    token = create_access_token({"sub": username})
+    async with connect(f"{url}/chats/ws/{username}?token={token}", max_queue=None) as websocket:
+        ready.set()
+        async for payload in websocket:
+            deliveries.received(payload)
+
+
+async def run(url: str, args) -> dict:
+    chats = memberships()
+    connected = set(sorted({name for members in chats.values() for name in members})[:args.clients])
+    deliveries = Deliveries()
+
+    ws_url = "ws" + url[len("http"):]
+    readiness = []
+    listeners = []
+    for username in connected:
+        ready = asyncio.Event()
+        readiness.append(ready)
+        listeners.append(asyncio.create_task(listen(ws_url, username, deliveries, ready)))
+    await asyncio.wait_for(asyncio.gather(*(ready.wait() for ready in readiness)), 60)
+    # Соединение регистрируется в ConnectionManager после accept: даём серверу его завершить
+    await asyncio.sleep(0.5)
+
+    # Сообщения шлют участники чатов, у которых есть подключённые собеседники
+    senders = [(chat_id, username) for chat_id, members in chats.items() for username in members
+               if any(other in connected and other != username for other in members)]
+    if not senders:
+        raise RuntimeError("No chat has connected recipients: increase --clients or --members")
+    random.Random(0).shuffle(senders)
+    tokens = {username: create_access_token({"sub": username}) for _, username in senders}
+    expected_per_send = {
+        (chat_id, username): sum(1 for other in chats[chat_id] if other in connected and other != username)
+        for chat_id, username in senders
+    }
+
+    send_latencies: list[float] = []
+    errors: dict[str, int] = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        async def send(seq: int, chat_id: int, username: str):
+            deliveries.sent_at[seq] = started = time.perf_counter()
+            try:
+                response = await client.post("/chats/send", json={"chat_id": chat_id, "content": f"{PREFIX}{seq}"},
+                                             cookies={"access_token": tokens[username]})
+                response.raise_for_status()
+                send_latencies.append(time.perf_counter() - started)
+            except httpx.HTTPError as ex:
+                key = type(ex).__name__ if not isinstance(ex, httpx.HTTPStatusError) else str(ex.response.status_code)
+                errors[key] = errors.get(key, 0) + 1
+                deliveries.expected -= expected_per_send[(chat_id, username)]
+
+        loop = asyncio.get_running_loop()
+        total = int(args.rate * args.duration)
+        started = loop.time()
+        tasks = []
+        for seq, (chat_id, username) in zip(range(total), itertools.cycle(senders)):
+            delay = started + seq / args.rate - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            deliveries.expected += expected_per_send[(chat_id, username)]
+            tasks.append(asyncio.create_task(send(seq, chat_id, username)))
+        await asyncio.gather(*tasks)
+        send_elapsed = loop.time() - started
+
+    if len(deliveries.latencies) < deliveries.expected:
+        try:
+            await asyncio.wait_for(deliveries.done.wait(), args.drain)
+        except asyncio.TimeoutError:
+            pass
+    elapsed = loop.time() - started
+    for task in listeners:
+        task.cancel()
+    await asyncio.gather(*listeners, return_exceptions=True)
+
+    return {
+        "sent": len(send_latencies),
+        "errors": errors,
+        "send_seconds": send_elapsed,
+        "send_throughput_per_s": len(send_latencies) / send_elapsed,
+        "send_latency": latency_summary(send_latencies),
+        "deliveries": {"expected": deliveries.expected, "received": len(deliveries.latencies)},
+        "delivery_throughput_per_s": len(deliveries.latencies) / elapsed,
+        "delivery_latency": latency_summary(deliveries.latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--members", type=int, default=20, help="Участников в чате")
+    parser.add_argument("--clients", type=int, default=500, help="Открытых WebSocket соединений")
+    parser.add_argument("--rate", type=float, default=200, help="Сообщений в секунду")
+    parser.add_argument("--duration", type=float, default=10, help="Секунд отправки")
+    parser.add_argument("--concurrency", type=int, default=100, help="HTTP соединений клиента")
+    parser.add_argument("--drain", type=float, default=10, help="Сколько ждать доставки после отправки")
+    parser.add_argument("--workers", type=int, default=1, help="Воркеров uvicorn, если сервер запускается здесь")
+    parser.add_argument("--url", default=None, help="Уже запущенный сервер вместо локального")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        seed(db, args.users, args.chats, args.members)
+    with (nullcontext((args.url, None)) if args.url else serve(args.workers)) as (url, _):
+        results = asyncio.run(run(url, args))
+    write_results({"config": vars(args), **results}, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Пропускная способность входа при конкуренции: bcrypt в event loop против PasswordPool.
+
+Кроме логинов в секунду меряется задержка event loop: пока идёт проверка пароля
+прямо в обработчике, все WebSocket и остальные запросы воркера стоят.
+
+    python -m backend.app.tests.benchmarks.bench_login [--logins 200] [--concurrency 50]
+        [--workers 4] [--queue-max 64] [--pool thread] [--out result.json]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from backend.app.tests.benchmarks.common import use_temp_database, seed, write_results
+
+use_temp_database()
+
+from backend.app.db.init_postgre import SessionLocal, AsyncSessionLocal, async_engine
+from backend.app.errors import Overloaded
+from backend.app.service import users_async
+from backend.app.service.passwords import PasswordPool, verify_password, get_hash
+
+PASSWORD = "benchmark-password"
+TICK = 0.01  # Период пульса, по задержке которого видно блокировку event loop
+
+
+async def heartbeat(lags: list[float], stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(TICK)
+        lags.append(loop.time() - started - TICK)
+
+
+def percentile(values: list[float], share: float) -> float:
+    values = sorted(values)
+    return values[max(0, int(len(values) * share) - 1)] if values else 0.0
+
+
+async def drive(verify, usernames: list[str], logins: int, concurrency: int) -> dict:
+    """Гоняет logins входов (поиск пользователя и проверка пароля) из concurrency задач."""
+    latencies: list[float] = []
+    lags: list[float] = []
+    rejected = 0
+    per_task = logins // concurrency
+
+    async def client(index: int):
+        nonlocal rejected
+        for i in range(per_task):
+            started = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                user = await users_async.lookup_user(db, usernames[(index + i) % len(usernames)])
+            try:
+                if not await verify(PASSWORD, user.password):
+                    raise RuntimeError("wrong password")
+            except Overloaded:
+                rejected += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    stop = asyncio.Event()
+    pulse = asyncio.create_task(heartbeat(lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await pulse
+
+    return {
+        "logins": len(latencies),
+        "rejected": rejected,
+        "logins_per_second": len(latencies) / elapsed,
+        "latency_ms_p50": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "latency_ms_p99": percentile(latencies, 0.99) * 1000,
+        "loop_lag_ms_p99": percentile(lags, 0.99) * 1000,
+        "loop_lag_ms_max": max(lags, default=0.0) * 1000,
+    }
+
+
+async def inline_verify(plain: str, hash: str) -> bool:
+    # Так обработчики проверяли пароль раньше: синхронно, внутри event loop
+    return verify_password(plain, hash)
+
+
+async def run(logins: int, concurrency: int, workers: int, queue_max: int, kind: str) -> dict:
+    with SessionLocal() as db:
+        usernames, _ = seed(db, users=concurrency, chats=0, members_per_chat=0, password_hash=get_hash(PASSWORD))
+
+    pool = PasswordPool(kind, workers=workers, queue_max=queue_max)
+    results = {
+        "database": async_engine.url.render_as_string(hide_password=True),
+        "concurrency": concurrency,
+        "pool": kind,
+        "workers": workers,
+        "queue_max": queue_max,
+        "inline": await drive(inline_verify, usernames, logins, concurrency),
+        "pooled": await drive(pool.verify, usernames, logins, concurrency),
+    }
+    pool.shutdown()
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue-max", type=int, default=64)
+    parser.add_argument("--pool", choices=["thread", "process"], default="thread")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    write_results(asyncio.run(run(args.logins, args.concurrency, args.workers, args.queue_max, args.pool)), args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Цена метрик на горячем пути: запись в гистограмму, SQL запрос с событиями
+движка и HTTP запрос через MetricsMiddleware против тех же операций без них.
+
+HTTP запросы идут напрямую в ASGI приложение, без сети и TestClient, чтобы
+накладные расходы middleware не терялись в шуме.
+
+    python -m backend.app.tests.benchmarks.bench_metrics [--iterations 20000] [--out result.json]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from backend.app.tests.benchmarks.common import use_temp_database, write_results
+
+use_temp_database()
+
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+
+from backend.app import metrics
+from backend.app.api.middleware import MetricsMiddleware
+
+
+def bench_observe(iterations: int) -> float:
+    histogram = metrics.Histogram("bench_seconds", "Bench.", ("route",), registry=None)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        histogram.observe(0.003, "/chats/{chat_id}")
+    return (time.perf_counter() - started) / iterations
+
+
+def bench_queries(iterations: int, instrumented: bool) -> float:
+    # Синхронный движок: у aiosqlite шум переключения потоков больше самих событий
+    path = os.path.join(tempfile.mkdtemp(prefix="mirror_bench_metrics_"), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    if instrumented:
+        metrics.instrument_engine(engine, "bench")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        started = time.perf_counter()
+        for _ in range(iterations):
+            conn.execute(text("SELECT 1"))
+        elapsed = time.perf_counter() - started
+    engine.dispose()
+    return elapsed / iterations
+
+
+def make_app(instrumented: bool):
+    app = FastAPI()
+
+    @app.get("/chats/{chat_id}")
+    async def chat(chat_id: int):
+        return {"id": chat_id}
+
+    return MetricsMiddleware(app) if instrumented else app
+
+
+async def bench_requests(iterations: int, instrumented: bool) -> float:
+    app = make_app(instrumented)
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/chats/1", "raw_path": b"/chats/1", "root_path": "", "query_string": b"", "headers": [],
+        "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(100):
+        await app(dict(scope), receive, send)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / iterations
+
+
+async def run(iterations: int) -> dict:
+    plain_query = bench_queries(iterations, instrumented=False)
+    timed_query = bench_queries(iterations, instrumented=True)
+    plain_request = await bench_requests(iterations, instrumented=False)
+    timed_request = await bench_requests(iterations, instrumented=True)
+    return {
+        "iterations": iterations,
+        "observe_us": bench_observe(iterations * 10) * 1e6,
+        "query_us": {"plain": plain_query * 1e6, "instrumented": timed_query * 1e6,
+                     "overhead": (timed_query - plain_query) * 1e6},
+        "request_us": {"plain": plain_request * 1e6, "instrumented": timed_request * 1e6,
+                       "overhead": (timed_request - plain_request) * 1e6},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    write_results(asyncio.run(run(args.iterations)), args.out)
+
+
+if __name__ == "__main__":
+    main()
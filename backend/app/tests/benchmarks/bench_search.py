@@ -0,0 +1,110 @@
+"""
+Задержка полнотекстового поиска (GET /chats/search) на большой базе сообщений.
+
+Сообщения собираются из словаря с распределением Ципфа, поэтому в наборе есть
+и частые слова (десятки тысяч совпадений), и редкие. Для каждого вида запроса
+печатаются медиана и p95 в миллисекундах. Без DATABASE_URL работает на SQLite FTS5,
+с PostgreSQL - на search_vector и GIN индексе.
+
+    python -m backend.app.tests.benchmarks.bench_search [--messages 1000000] [--repeat 20] [--out result.json]
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import statistics
+import time
+
+from backend.app.tests.benchmarks.common import use_temp_database, seed, write_results
+
+use_temp_database()
+
+from sqlalchemy import insert
+
+from backend.app.data import messages_postgre_async as data
+from backend.app.db.init_postgre import SessionLocal, AsyncSessionLocal, async_engine
+from backend.app.models import MessageBase
+
+VOCABULARY = 5000
+BATCH = 50_000
+
+
+def word(rank: int) -> str:
+    # Разные слова с разными префиксами, чтобы префиксный поиск не склеивал ранги
+    return f"слово{rank:04d}x"
+
+
+WORDS = [word(rank) for rank in range(VOCABULARY)]
+CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(VOCABULARY)))
+
+
+def zipf_words(rng: random.Random, count: int) -> list[str]:
+    return rng.choices(WORDS, cum_weights=CUM_WEIGHTS, k=count)
+
+
+def fill(chat_ids: list[int], usernames: list[str], messages: int) -> None:
+    rng = random.Random(42)
+    with SessionLocal() as db:
+        for start in range(0, messages, BATCH):
+            size = min(BATCH, messages - start)
+            db.execute(insert(MessageBase), [
+                {"chat_id": rng.choice(chat_ids), "username": rng.choice(usernames),
+                 "content": " ".join(zipf_words(rng, rng.randint(3, 15)))}
+                for _ in range(size)
+            ])
+            db.commit()
+
+
+async def measure(username: str, query: str, chat_id: int | None, repeat: int) -> dict:
+    timings = []
+    async with AsyncSessionLocal() as db:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            page = await data.search(db, username, query, chat_id=chat_id)
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "query": query,
+        "hits_on_page": len(page.messages),
+        "median_ms": statistics.median(timings),
+        "p95_ms": timings[int(len(timings) * 0.95) - 1],
+    }
+
+
+async def run(messages: int, repeat: int) -> dict:
+    with SessionLocal() as db:
+        usernames, chat_ids = seed(db, users=200, chats=1000, members_per_chat=20)
+    started = time.perf_counter()
+    fill(chat_ids, usernames, messages)
+    seconds = time.perf_counter() - started
+
+    user = usernames[0]
+    queries = {
+        "frequent_word": (word(0), None),
+        "medium_word": (word(100), None),
+        "rare_word": (word(4000), None),
+        "two_words": (f"{word(1)} {word(50)}", None),
+        "frequent_in_chat": (word(0), chat_ids[0]),
+    }
+    results = {
+        "database": async_engine.url.render_as_string(hide_password=True),
+        "messages": messages,
+        "fill_seconds": seconds,
+    }
+    for name, (query, chat_id) in queries.items():
+        results[name] = await measure(user, query, chat_id, repeat)
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    write_results(asyncio.run(run(args.messages, args.repeat)), args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Запросы к базе данных на одно сообщение: старый путь POST /chats/send против быстрого.
+
+    python -m backend.app.tests.benchmarks.bench_send_queries [--messages 500] [--out result.json]
+"""
+import argparse
+import asyncio
+import time
+
+from backend.app.tests.benchmarks.common import use_temp_database, seed, write_results
+
+use_temp_database()
+
+from backend.app.db.init_postgre import SessionLocal, AsyncSessionLocal, async_engine
+from backend.app.models import Message
+from backend.app.service import users as service_users
+from backend.app.service import users_async
+from backend.app.service import chats_async as service_chats
+from backend.app.tests.utils import count_queries
+
+
+async def legacy_send(db, token: str, chat_id: int, content: str):
+    """Путь до быстрой вставки: пользователь, участие, вставка с повторными проверками, второй коммит."""
+    user = await users_async.get_current_user(db, token)
+    if not await service_chats.check_user_in_chat(db, chat_id, user.username):
+        raise RuntimeError("not a member")
+    db_message = await service_chats.add_message_to_chat(db=db, message_pydantic=Message(
+        content=content, username=user.username, chat_id=chat_id
+    ))
+    db.add(db_message)
+    await db.commit()
+    await db.refresh(db_message)
+
+
+async def fast_send(db, token: str, chat_id: int, content: str):
+    username = service_users.get_jwt_username(token)
+    if await service_chats.post_message(db, chat_id, username, content) is None:
+        raise RuntimeError("not a member")
+
+
+async def measure(send, token: str, chat_id: int, messages: int) -> dict:
+    with count_queries(async_engine.sync_engine) as counter:
+        started = time.perf_counter()
+        for i in range(messages):
+            # Отдельная сессия на сообщение, как в обработчике запроса
+            async with AsyncSessionLocal() as db:
+                await send(db, token, chat_id, f"message {i}")
+        elapsed = time.perf_counter() - started
+    return {
+        "queries_per_message": counter.count / messages,
+        "commits_per_message": counter.commits / messages,
+        "ms_per_message": elapsed * 1000 / messages,
+    }
+
+
+async def run(messages: int) -> dict:
+    with SessionLocal() as db:
+        usernames, chat_ids = seed(db, users=10, chats=1, members_per_chat=10)
+    token = service_users.create_access_token({"sub": usernames[0]})
+
+    # Прогрев пула и кешей компиляции
+    await measure(fast_send, token, chat_ids[0], 10)
+    await measure(legacy_send, token, chat_ids[0], 10)
+
+    results = {
+        "messages": messages,
+        "database": async_engine.url.render_as_string(hide_password=True),
+        "legacy": await measure(legacy_send, token, chat_ids[0], messages),
+        "fast_path": await measure(fast_send, token, chat_ids[0], messages),
+    }
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    write_results(asyncio.run(run(args.messages)), args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Стоимость отдачи истории: ORM + Pydantic + сериализация FastAPI против запроса по колонкам с RawJSONResponse.
+
+Для каждого размера меряется полный путь от запроса до байтов ответа и отдельно
+сериализация, в микросекундах на сообщение.
+
+    python -m backend.app.tests.benchmarks.bench_serialization [--sizes 10000 100000] [--repeat 3] [--out result.json]
+"""
+import argparse
+import asyncio
+import time
+
+from backend.app.tests.benchmarks.common import use_temp_database, seed, write_results
+
+use_temp_database()
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+
+from backend.app.api.responses import RawJSONResponse, encode_message_page
+from backend.app.db.init_postgre import SessionLocal, AsyncSessionLocal, async_engine
+from backend.app.data.messages_postgre_async import MESSAGE_COLUMNS
+from backend.app.models import MessageBase, MessagePage
+
+page_adapter = TypeAdapter(MessagePage)
+
+
+async def legacy_path(chat_id: int, limit: int) -> tuple[bytes, float]:
+    """Как было: ORM объекты, Message на каждую строку, затем валидация response_model и json.dumps."""
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(MessageBase).filter(MessageBase.chat_id == chat_id).order_by(MessageBase.id).limit(limit)
+        )).scalars().all()
+    started = time.perf_counter()
+    page = MessagePage(messages=[row.to_pydantic() for row in rows], has_more=False)
+    # Так FastAPI обрабатывает возвращённую модель при заданном response_model
+    content = page_adapter.dump_python(page_adapter.validate_python(page, from_attributes=True), mode="json")
+    body = JSONResponse(content).body
+    return body, time.perf_counter() - started
+
+
+async def fast_path(chat_id: int, limit: int) -> tuple[bytes, float]:
+    """Быстрый путь: кортежи колонок сразу в JSON."""
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(*MESSAGE_COLUMNS).filter(MessageBase.chat_id == chat_id).order_by(MessageBase.id).limit(limit)
+        )).all()
+    started = time.perf_counter()
+    body = RawJSONResponse(encode_message_page(rows, False)).body
+    return body, time.perf_counter() - started
+
+
+async def measure(path, chat_id: int, size: int, repeat: int) -> dict:
+    best_total = best_serialize = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body, serialize = await path(chat_id, size)
+        best_total = min(best_total, time.perf_counter() - started)
+        best_serialize = min(best_serialize, serialize)
+    return {
+        "total_us_per_message": best_total / size * 1e6,
+        "serialize_us_per_message": best_serialize / size * 1e6,
+        "bytes": len(body),
+    }
+
+
+async def run(sizes: list[int], repeat: int) -> dict:
+    with SessionLocal() as db:
+        usernames, chat_ids = seed(db, users=2, chats=1, members_per_chat=2)
+        db.execute(insert(MessageBase), [
+            {"chat_id": chat_ids[0], "username": usernames[i % 2], "content": f"Сообщение номер {i} с текстом средней длины"}
+            for i in range(max(sizes))
+        ])
+        db.commit()
+
+    results = {"database": async_engine.url.render_as_string(hide_password=True), "repeat": repeat}
+    for size in sizes:
+        legacy = await measure(legacy_path, chat_ids[0], size, repeat)
+        fast = await measure(fast_path, chat_ids[0], size, repeat)
+        results[str(size)] = {
+            "legacy": legacy,
+            "fast_path": fast,
+            "total_speedup": legacy["total_us_per_message"] / fast["total_us_per_message"],
+            "serialize_speedup": legacy["serialize_us_per_message"] / fast["serialize_us_per_message"],
+        }
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    write_results(asyncio.run(run(args.sizes, args.repeat)), args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+GET /users/: выгрузка всей таблицы users против страницы справочника.
+
+Для каждого варианта печатаются время, размер ответа и пик выделенной памяти
+(tracemalloc) на построение ответа.
+
+    python -m backend.app.tests.benchmarks.bench_user_directory [--users 50000] [--out result.json]
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from backend.app.tests.benchmarks.common import use_temp_database, seed, write_results
+
+use_temp_database()
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from backend.app.db.init_postgre import SessionLocal, AsyncSessionLocal, async_engine
+from backend.app.data import users_postgre
+from backend.app.data import users_postgre_async
+
+
+def legacy_response() -> bytes:
+    """Как было: все строки UserBase в User (с хешами паролей) одним ответом."""
+    with SessionLocal() as db:
+        return JSONResponse(jsonable_encoder(users_postgre.get_all(db))).body
+
+
+async def directory_response(query: str | None) -> bytes:
+    async with AsyncSessionLocal() as db:
+        page = await users_postgre_async.get_directory(db, query=query, limit=50)
+    return JSONResponse(jsonable_encoder(page)).body
+
+
+async def measure(build) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    body = await build()
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ms": seconds * 1000, "bytes": len(body), "peak_alloc_mb": peak / 2 ** 20}
+
+
+async def run(users: int) -> dict:
+    with SessionLocal() as db:
+        seed(db, users=users, chats=0, members_per_chat=0, password_hash="$2b$12$" + "x" * 53)
+
+    async def legacy():
+        return legacy_response()
+
+    results = {"database": async_engine.url.render_as_string(hide_password=True), "users": users}
+    results["legacy_all_users"] = await measure(legacy)
+    results["directory_first_page"] = await measure(lambda: directory_response(None))
+    results["directory_prefix"] = await measure(lambda: directory_response("bench_user_12"))
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    write_results(asyncio.run(run(args.users)), args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Ёмкость одного воркера по простаивающим WebSocket соединениям.
+
+Поднимает сервер с одним воркером uvicorn и ступенями (--steps) доводит
+число аутентифицированных соединений на /chats/ws/{username} до десятков
+тысяч. На каждой ступени меряются:
+- RSS процесса сервера и прирост на соединение;
+- задержка GET /healthz в простое и во время волны heartbeat - её рост
+  показывает задержку event loop воркера;
+- процессорное время сервера в простое и на один heartbeat: каждое
+  соединение шлёт {"type": "ping"} за --heartbeat-seconds (браузер - раз в
+  25 секунд, так что 5 секунд - пятикратный запас), сервер отвечает pong;
+- занятые соединения пула базы и число соединений в реестре по /metrics:
+  простаивающее соединение не должно держать сессию.
+
+Колено кривой - последняя ступень, на которой p99 /healthz во время heartbeat
+укладывается в --lag-budget-ms и все соединения открылись. Код выхода
+ненулевой, если наклон RSS от числа соединений больше --max-kb-per-connection
+(по умолчанию MAX_KB_PER_CONNECTION, 0 отключает проверку): так регрессия
+памяти на соединение ловится в CI без дополнительных флагов.
+
+RSS и процессорное время читаются из /proc, поэтому бенчмарк работает на
+Linux. Клиент и сервер - разные процессы, каждому нужен лимит открытых файлов
+больше старшей ступени (ulimit -n); мягкий лимит поднимается до жёсткого.
+
+    python -m backend.app.tests.benchmarks.bench_ws_soak [--steps 1000 5000 10000 15000]
+        [--lag-budget-ms 100] [--max-kb-per-connection 128] [--out result.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+
+from backend.app.tests.benchmarks.common import use_temp_database, seed, write_results, latency_summary, serve
+
+use_temp_database()
+
+import httpx
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed, WebSocketException
+
+from backend.app.db.init_postgre import SessionLocal
+from backend.app.service.users import create_access_token
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+# Порог памяти на простаивающее соединение: соединение с учётом буферов
+# websockets и индекса ConnectionManager занимает десятки килобайт, порог с запасом
+MAX_KB_PER_CONNECTION = 128
+TICK = 0.01
+
+
+def process_stats(pid: int) -> tuple[float, float]:
+    """RSS в мегабайтах и процессорное время (user + system) в секундах."""
+    with open(f"/proc/{pid}/status") as status:
+        rss_kb = next(int(line.split()[1]) for line in status if line.startswith("VmRSS:"))
+    with open(f"/proc/{pid}/stat") as stat:
+        # Поля после имени процесса в скобках: utime и stime - 14-е и 15-е поля строки
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return rss_kb / 1024, (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def raise_open_files_limit(needed: int) -> int:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        soft = hard
+    if soft < needed:
+        sys.exit(f"Open files limit {soft} is below {needed}: raise ulimit -n")
+    return soft
+
+
+class Fleet:
+    """Открытые клиентские соединения и подсчёт ответов pong."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.sockets = []
+        self.readers = []
+        self.failed = 0
+        self.pongs = 0
+        self.expected_pongs = 0
+        self.all_pongs = asyncio.Event()
+
+    async def open(self, usernames: list[str], concurrency: int) -> None:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(username: str):
+            token = create_access_token({"sub": username})
+            async with semaphore:
+                try:
+                    # Без пингов протокола: heartbeat шлёт сам бенчмарк
+                    websocket = await connect(f"{self.url}/chats/ws/{username}?token={token}",
+                                              ping_interval=None, max_queue=None, open_timeout=60)
+                except (OSError, WebSocketException, asyncio.TimeoutError):
+                    self.failed += 1
+                    return
+            self.sockets.append(websocket)
+            self.readers.append(asyncio.create_task(self.read(websocket)))
+
+        await asyncio.gather(*(one(username) for username in usernames))
+
+    async def read(self, websocket) -> None:
+        try:
+            async for payload in websocket:
+                if json.loads(payload).get("type") == "pong":
+                    self.pongs += 1
+                    if self.pongs >= self.expected_pongs:
+                        self.all_pongs.set()
+        except ConnectionClosed:
+            pass
+
+    async def heartbeat(self, spread: float, timeout: float) -> None:
+        """
+        Один ping от каждого соединения, равномерно за spread секунд, как у
+        клиентов со своими таймерами; ждёт все pong.
+        """
+        self.pongs = 0
+        self.expected_pongs = len(self.sockets)
+        self.all_pongs.clear()
+        frame = json.dumps({"type": "ping"})
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        sent = 0
+        while sent < len(self.sockets):
+            # Пачками раз в TICK: отдельный sleep на каждое соединение дороже самой отправки
+            due = min(len(self.sockets), int((loop.time() - started) / spread * len(self.sockets)) + 1)
+            await asyncio.gather(*(websocket.send(frame) for websocket in self.sockets[sent:due]),
+                                 return_exceptions=True)
+            sent = due
+            await asyncio.sleep(TICK)
+        await asyncio.wait_for(self.all_pongs.wait(), timeout)
+
+    async def close(self) -> None:
+        for reader in self.readers:
+            reader.cancel()
+        await asyncio.gather(*self.readers, *(websocket.close() for websocket in self.sockets), return_exceptions=True)
+
+
+async def probe_health(client: httpx.AsyncClient, stop: asyncio.Event, interval: float = 0.05) -> list[float]:
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/healthz")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def read_gauges(client: httpx.AsyncClient) -> dict:
+    """Соединения в реестре и занятые соединения пула по /metrics; пусто, если метрики выключены."""
+    response = await client.get("/metrics")
+    if response.status_code != 200:
+        return {}
+    gauges = {}
+    for line in response.text.splitlines():
+        if line.startswith(("websocket_active_connections ", 'db_pool_checked_out{engine="primary"} ')):
+            name, value = line.rsplit(" ", 1)
+            gauges[name] = float(value)
+    return gauges
+
+
+def slope(points: list[tuple[float, float]]) -> float:
+    """Наклон прямой по методу наименьших квадратов."""
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread if spread else 0.0
+
+
+async def wait_registered(client: httpx.AsyncClient, count: int, timeout: float) -> None:
+    """
+    Сервер принимает соединение до аутентификации и запроса чатов: ждём, пока
+    все соединения попадут в реестр, иначе замер простоя захватит их обработку.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        registered = (await read_gauges(client)).get("websocket_active_connections")
+        if registered is None or registered >= count:
+            return
+        await asyncio.sleep(0.2)
+
+
+async def measure_step(fleet: Fleet, client: httpx.AsyncClient, pid: int, args) -> dict:
+    # Простой: процессорное время и /healthz без кадров от клиентов
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_health(client, stop))
+    _, cpu_before = process_stats(pid)
+    await asyncio.sleep(args.idle_seconds)
+    _, cpu_after = process_stats(pid)
+    stop.set()
+    idle_latencies = await probe
+    idle_cpu_rate = (cpu_after - cpu_before) / args.idle_seconds
+
+    # Heartbeat: по ping от каждого соединения за heartbeat_seconds
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_health(client, stop))
+    _, cpu_started = process_stats(pid)
+    started = time.perf_counter()
+    try:
+        await fleet.heartbeat(args.heartbeat_seconds, args.heartbeat_timeout)
+        completed = True
+    except asyncio.TimeoutError:
+        completed = False
+    elapsed = time.perf_counter() - started
+    _, cpu_finished = process_stats(pid)
+    stop.set()
+    heartbeat_latencies = await probe
+
+    rss_mb, _ = process_stats(pid)
+    gauges = await read_gauges(client)
+    heartbeat_cpu = max(0.0, cpu_finished - cpu_started - idle_cpu_rate * elapsed)
+    return {
+        "rss_mb": rss_mb,
+        "idle_cpu_percent": idle_cpu_rate * 100,
+        "idle_healthz": latency_summary(idle_latencies),
+        "heartbeat": {
+            "completed": completed,
+            "seconds": elapsed,
+            "pongs": fleet.pongs,
+            "cpu_us_per_heartbeat": heartbeat_cpu / max(1, fleet.pongs) * 1e6,
+            "healthz": latency_summary(heartbeat_latencies),
+        },
+        "server_connections": gauges.get("websocket_active_connections"),
+        "db_pool_checked_out": gauges.get('db_pool_checked_out{engine="primary"}'),
+    }
+
+
+async def run(url: str, pid: int, usernames: list[str], args) -> dict:
+    fleet = Fleet("ws" + url[len("http"):])
+    results = {"steps": []}
+    async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+        await client.get("/healthz")
+        results["baseline_rss_mb"], _ = process_stats(pid)
+        try:
+            for target in args.steps:
+                started = time.perf_counter()
+                await fleet.open(usernames[len(fleet.sockets) + fleet.failed:target], args.connect_concurrency)
+                await wait_registered(client, len(fleet.sockets), args.heartbeat_timeout)
+                opened_seconds = time.perf_counter() - started
+                await asyncio.sleep(args.settle)
+                step = {"connections": len(fleet.sockets), "failed": fleet.failed, "open_seconds": opened_seconds}
+                step.update(await measure_step(fleet, client, pid, args))
+                results["steps"].append(step)
+                print(f"{step['connections']} connections: {step['rss_mb']:.0f} MB, "
+                      f"heartbeat p99 /healthz {step['heartbeat']['healthz']['p99_ms']:.1f} ms", file=sys.stderr)
+        finally:
+            await fleet.close()
+    return results
+
+
+def knee(steps: list[dict], lag_budget_ms: float) -> int | None:
+    """Последняя ступень, на которой воркер держал все соединения и отвечал в пределах бюджета."""
+    best = None
+    for step in steps:
+        healthy = (step["failed"] == 0 and step["heartbeat"]["completed"]
+                   and step["heartbeat"]["healthz"]["p99_ms"] <= lag_budget_ms)
+        if not healthy:
+            break
+        best = step["connections"]
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--steps", type=int, nargs="+", default=[1000, 5000, 10000, 15000])
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--members", type=int, default=20, help="Участников в чате")
+    parser.add_argument("--connect-concurrency", type=int, default=200, help="Одновременных подключений")
+    parser.add_argument("--settle", type=float, default=1, help="Пауза после подключения, секунд")
+    parser.add_argument("--idle-seconds", type=float, default=5, help="Окно замера простоя")
+    parser.add_argument("--heartbeat-seconds", type=float, default=5,
+                        help="За сколько секунд каждое соединение шлёт ping (в браузере - раз в 25 с)")
+    parser.add_argument("--heartbeat-timeout", type=float, default=60)
+    parser.add_argument("--lag-budget-ms", type=float, default=100, help="Порог p99 /healthz для колена")
+    parser.add_argument("--max-kb-per-connection", type=float, default=MAX_KB_PER_CONNECTION,
+                        help="Порог памяти на соединение, KB; 0 - без проверки")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    args.steps = sorted(args.steps)
+
+    # Запас на соединения с базой, логи и слушающий сокет
+    raise_open_files_limit(args.steps[-1] + 1000)
+    with SessionLocal() as db:
+        usernames, _ = seed(db, args.steps[-1], args.chats, args.members)
+    with serve(workers=1) as (url, pid):
+        results = asyncio.run(run(url, pid, usernames, args))
+
+    points = [(0, results["baseline_rss_mb"])] + [(step["connections"], step["rss_mb"]) for step in results["steps"]]
+    results["kb_per_connection"] = slope(points) * 1024
+    results["knee_connections"] = knee(results["steps"], args.lag_budget_ms)
+    write_results({"config": vars(args), **results}, args.out)
+    if args.max_kb_per_connection and results["kb_per_connection"] > args.max_kb_per_connection:
+        sys.exit(f"Memory per connection {results['kb_per_connection']:.1f} KB "
+                 f"exceeds {args.max_kb_per_connection:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
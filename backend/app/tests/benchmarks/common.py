@@ -0,0 +1,122 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..'))
+sys.path.insert(0, ROOT)
+
+
+def use_temp_database() -> str:
+    """
+    Направляет приложение на временную SQLite базу, если DATABASE_URL не задан.
+
+    Вызывается до импорта backend.app.db: движки создаются из DATABASE_URL.
+    """
+    if not os.getenv("DATABASE_URL"):
+        path = Path(tempfile.mkdtemp(prefix="mirror_bench_")) / "bench.db"
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    return os.environ["DATABASE_URL"]
+
+
+def seed(db, users: int, chats: int, members_per_chat: int, password_hash: str = "x") -> tuple[list[str], list[int]]:
+    """
+    Создаёт пользователей bench_user_N и чаты с участниками bulk вставками.
+
+    :return: Имена пользователей и id чатов
+    """
+    from sqlalchemy import insert, select
+    from backend.app.models import UserBase, ChatBase, ChatUser
+    from backend.app.db.migrate import run_migrations
+
+    run_migrations(db.get_bind())
+    usernames = [f"bench_user_{i}" for i in range(users)]
+    db.execute(insert(UserBase), [
+        {"username": name, "email": f"{name}@example.com", "password": password_hash, "about": ""}
+        for name in usernames
+    ])
+    chat_ids = []
+    for i in range(chats):
+        owner = usernames[i % users]
+        chat_id = db.execute(
+            insert(ChatBase).values(title=f"bench_chat_{i}", owner_username=owner).returning(ChatBase.id)
+        ).scalar_one()
+        members = {owner} | {usernames[(i + j) % users] for j in range(members_per_chat)}
+        db.execute(insert(ChatUser), [{"chat_id": chat_id, "username": name} for name in members])
+        chat_ids.append(chat_id)
+    db.commit()
+    return usernames, chat_ids
+
+
+def write_results(results: dict, path: str | None) -> None:
+    """Печатает результаты и, если задан путь, сохраняет их в JSON для сравнения запусков."""
+    text = json.dumps(results, ensure_ascii=False, indent=2, default=str)
+    print(text)
+    if path:
+        Path(path).write_text(text, encoding="utf-8")
+
+
+def latency_summary(seconds: list[float]) -> dict:
+    """Перцентили задержек в миллисекундах."""
+    values = sorted(seconds)
+
+    def at(share: float) -> float:
+        return values[min(len(values) - 1, int(len(values) * share))] * 1000 if values else 0.0
+
+    return {"count": len(values), "p50_ms": at(0.5), "p95_ms": at(0.95), "p99_ms": at(0.99), "max_ms": at(1.0)}
+
+
+@contextmanager
+def serve(workers: int = 1, timeout: float = 30):
+    """
+    Запускает приложение в uvicorn на свободном порту и ждёт /readyz.
+
+    Сервер - отдельный процесс с тем же окружением (DATABASE_URL, BROADCAST_URL):
+    клиенты бенчмарка не делят с ним GIL и event loop. При workers > 1 нужна
+    общая шина рассылки (BROADCAST_URL=postgres или unix://), иначе сообщения
+    не дойдут до соединений других воркеров. Лог сервера пишется во временный
+    файл, его путь печатается при ошибке старта.
+
+    :return: Базовый URL (например http://127.0.0.1:8123) и pid процесса сервера;
+        при workers=1 uvicorn обслуживает запросы в этом же процессе
+    """
+    import httpx
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    log = tempfile.NamedTemporaryFile(prefix="mirror_bench_server_", suffix=".log", delete=False)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app.api.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, stdout=log, stderr=subprocess.STDOUT,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}, see {log.name}")
+            try:
+                if httpx.get(url + "/readyz", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Server is not ready after {timeout}s, see {log.name}")
+            time.sleep(0.2)
+        yield url, process.pid
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
@@ -0,0 +1,70 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+import asyncio
+import tempfile
+from typing import Any, Awaitable, Callable
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+
+class TempDatabase:
+    """
+    Временная SQLite база со схемой из миграций.
+
+    Данные готовятся синхронным движком (engine, insert, add_users, add_chat),
+    проверки идут через асинхронную сессию в run - как в обработчиках.
+    """
+
+    def __init__(self, directory: str):
+        from backend.app.db.migrate import run_migrations
+
+        path = os.path.join(directory, "test.db")
+        self.url = f"sqlite:///{path}"
+        self.async_url = f"sqlite+aiosqlite:///{path}"
+        self.engine = create_engine(self.url)
+        run_migrations(self.engine)
+
+    def insert(self, model, rows: list[dict]) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(insert(model), rows)
+
+    def add_users(self, *usernames: str) -> None:
+        from backend.app.models import UserBase
+
+        self.insert(UserBase, [
+            {"username": name, "email": f"{name}@example.com", "password": "hash", "about": ""} for name in usernames
+        ])
+
+    def add_chat(self, chat_id: int, owner: str, members: tuple[str, ...] = (), **fields) -> None:
+        """Чат с владельцем среди участников; fields - дополнительные колонки chats."""
+        from backend.app.models import ChatBase, ChatUser
+
+        self.insert(ChatBase, [{"id": chat_id, "title": f"chat {chat_id}", "owner_username": owner, **fields}])
+        self.insert(ChatUser, [{"chat_id": chat_id, "username": name} for name in dict.fromkeys((owner, *members))])
+
+    def run(self, scenario: Callable[[AsyncSession], Awaitable[Any]]) -> Any:
+        """Выполняет scenario(db) с асинхронной сессией; движок закрывается после сценария."""
+        async def main():
+            engine = create_async_engine(self.async_url)
+            try:
+                async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+                    return await scenario(db)
+            finally:
+                await engine.dispose()
+
+        return asyncio.run(main())
+
+    def dispose(self) -> None:
+        self.engine.dispose()
+
+
+@pytest.fixture
+def database():
+    db = TempDatabase(tempfile.mkdtemp(prefix="mirror_test_"))
+    yield db
+    db.dispose()
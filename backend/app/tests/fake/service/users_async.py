@@ -0,0 +1,30 @@
+from backend.app.models import User, PublicUserData
+from backend.app.service.passwords import password_pool
+from backend.app.tests.fake.service import users as service
+
+
+# Асинхронная обёртка над фейковым сервисом: те же имена, что у service.users_async.
+# Хеш нового пароля считается в настоящем password_pool, пользователи - в фейковой базе; db не используется.
+
+
+async def verify_password(plain : str, hash : str) -> bool:
+    return await password_pool.verify(plain, hash)
+
+
+async def get_hash(plain : str) -> str:
+    return await password_pool.hash(plain)
+
+
+async def resolve_principal(db, token : str) -> PublicUserData | None:
+    if not (user := service.get_curret_user(token)):
+        return None
+    return user.to_public_data()
+
+
+async def auth_user(db, username : str, plain : str) -> User | None:
+    # Через синхронный фейк, чтобы тесты могли подменять service.auth_user
+    return service.auth_user(username, plain)
+
+
+async def create(db, user : User) -> User:
+    return service.create(user)
@@ -0,0 +1,62 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+
+class ChatApi:
+    """
+    Роутер чатов поверх временной базы (фикстура database).
+
+    Сессии без пула: TestClient может запускать запросы в разных event loop.
+    Реплика - та же база, так что окно read-your-writes видно в router.
+    """
+
+    def __init__(self, database):
+        from backend.app.api.routes import chats
+        from backend.app.db.routing import SessionRouter
+
+        self.database = database
+        self.engine = create_async_engine(database.async_url, poolclass=NullPool)
+        self.sessions = async_sessionmaker(self.engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+        self.router = SessionRouter(self.sessions, self.sessions)
+        self.app = FastAPI()
+        self.app.include_router(chats.router)
+
+    def client(self, username: str | None = None) -> TestClient:
+        """Клиент с cookie access_token пользователя username."""
+        from backend.app.service.users import create_access_token
+
+        client = TestClient(self.app, follow_redirects=False)
+        if username:
+            client.cookies.set("access_token", create_access_token({"sub": username}))
+        return client
+
+
+@pytest.fixture
+def chat_api(database, monkeypatch):
+    from backend.app.api import deps
+    from backend.app.api.routes import chats
+    from backend.app.cache import user_cache
+    from backend.app.service import users as service_users
+
+    # Ключ подписи не зависит от окружения, в котором запущены тесты
+    monkeypatch.setattr(service_users, "SECRET_KEY", "chat-api-test-secret")
+    monkeypatch.setattr(service_users, "ALGORITHM", "HS256")
+
+    api = ChatApi(database)
+    monkeypatch.setattr(deps, "session_router", api.router)
+    monkeypatch.setattr(chats, "session_router", api.router)
+    monkeypatch.setattr(chats, "AsyncSessionLocal", api.sessions)
+    user_cache.clear()
+    yield api
+    user_cache.clear()
+    asyncio.run(api.engine.dispose())
@@ -0,0 +1,73 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.api.deps import get_async_db
+from backend.app.models import UserBase
+
+
+@pytest.fixture
+def notes(chat_api):
+    """Маршруты, которые пишут пользователя через get_async_db и по-разному завершаются."""
+    app = FastAPI()
+
+    def row(username):
+        return UserBase(username=username, email=f"{username}@example.com", password="hash", about="")
+
+    @app.post("/commit/{username}")
+    async def committed(username: str, db: AsyncSession = Depends(get_async_db)):
+        db.add(row(username))
+        await db.commit()
+
+    @app.post("/fail/{username}")
+    async def failed(username: str, db: AsyncSession = Depends(get_async_db)):
+        db.add(row(username))
+        await db.flush()
+        raise HTTPException(status_code=400, detail="fail")
+
+    @app.get("/read/{username}")
+    async def read(username: str, db: AsyncSession = Depends(get_async_db)):
+        return (await db.execute(select(UserBase.username).filter(UserBase.username == username))).scalar()
+
+    def client(username=None):
+        client = TestClient(app)
+        client.cookies = chat_api.client(username).cookies
+        return client
+
+    chat_api.notes = client
+    return chat_api
+
+
+def stored(api, username):
+    with api.database.engine.connect() as conn:
+        return conn.execute(select(UserBase.username).filter(UserBase.username == username)).scalar()
+
+
+def test_committed_write_persists_and_opens_read_your_writes_window(notes):
+    assert notes.notes("alice").post("/commit/dave").status_code == 200
+    assert stored(notes, "dave") == "dave"
+    # Окно открывается по имени из токена, без get_principal
+    assert notes.router.reads_primary("alice") and not notes.router.reads_primary("bob")
+
+
+def test_failed_request_rolls_back_and_does_not_mark_write(notes):
+    assert notes.notes("alice").post("/fail/erin").status_code == 400
+    # Незакоммиченная запись откатывается при закрытии сессии
+    assert stored(notes, "erin") is None
+    assert not notes.router.reads_primary("alice")
+
+
+def test_safe_methods_do_not_mark_write(notes):
+    notes.notes("alice").post("/commit/dave")
+    assert notes.notes("bob").get("/read/dave").json() == "dave"
+    assert not notes.router.reads_primary("bob")
+    # Запись без токена не открывает окно никому: в окне по-прежнему только alice
+    assert notes.notes().post("/commit/frank").status_code == 200
+    assert stored(notes, "frank") == "frank" and len(notes.router.recent_writers) == 1
@@ -0,0 +1,175 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import asyncio
+import tempfile
+
+import pytest
+
+from backend.app.api import broadcast as broadcast_module
+from backend.app.api.broadcast import LocalBroker, MemoryBroadcast, PostgresBroadcast, UnixSocketBroadcast, encode_event, decode_event
+from backend.app.api.connections import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, payload):
+        self.sent.append(payload)
+
+
+def collector():
+    received = []
+
+    async def handler(header, payload):
+        received.append((header, payload))
+
+    return received, handler
+
+
+def test_encode_decode_event_keeps_payload_untouched():
+    payload = '{"content": "строка\\nс переводом"}'
+    header, decoded = decode_event(encode_event({"chat_id": 1, "exclude": "bob"}, payload))
+
+    assert header == {"chat_id": 1, "exclude": "bob"}
+    assert decoded == payload
+
+
+def test_memory_broadcast_delivers_to_own_handler():
+    received, handler = collector()
+    broadcast = MemoryBroadcast(handler=handler)
+
+    asyncio.run(broadcast.publish({"chat_id": 7, "exclude": None}, '{"type": "new_message"}'))
+
+    assert received == [({"chat_id": 7, "exclude": None}, '{"type": "new_message"}')]
+
+
+def test_unix_broker_fans_out_to_every_worker():
+    async def scenario():
+        with tempfile.TemporaryDirectory() as tmp:
+            broker = LocalBroker(os.path.join(tmp, "broker.sock"))
+            await broker.start()
+
+            received_a, handler_a = collector()
+            received_b, handler_b = collector()
+            worker_a = UnixSocketBroadcast(broker.path, handler=handler_a)
+            worker_b = UnixSocketBroadcast(broker.path, handler=handler_b)
+            await worker_a.connect()
+            await worker_b.connect()
+
+            await worker_a.publish({"chat_id": 3, "exclude": "alice"}, '{"content": "привет"}')
+            for _ in range(100):
+                if received_a and received_b:
+                    break
+                await asyncio.sleep(0.01)
+
+            await worker_a.disconnect()
+            await worker_b.disconnect()
+            await broker.stop()
+            return received_a, received_b
+
+    received_a, received_b = asyncio.run(scenario())
+
+    expected = [({"chat_id": 3, "exclude": "alice"}, '{"content": "привет"}')]
+    assert received_a == expected
+    assert received_b == expected
+
+
+def test_unix_broadcast_reconnects_after_broker_restart(monkeypatch):
+    monkeypatch.setattr(UnixSocketBroadcast, "RECONNECT_DELAY", 0.01)
+
+    async def wait_for(condition):
+        for _ in range(200):
+            if condition():
+                return True
+            await asyncio.sleep(0.01)
+        return False
+
+    async def scenario():
+        with tempfile.TemporaryDirectory() as tmp:
+            broker = LocalBroker(os.path.join(tmp, "broker.sock"))
+            await broker.start()
+            received, handler = collector()
+            worker = UnixSocketBroadcast(broker.path, handler=handler)
+            await worker.connect()
+            assert await wait_for(lambda: broker.clients)
+
+            await broker.stop()
+            assert await wait_for(lambda: worker.writer is None)
+            # Пока брокера нет, публикация не теряется молча
+            with pytest.raises(ConnectionError):
+                await worker.publish({"chat_id": 1}, "lost")
+
+            await broker.start()
+            assert await wait_for(lambda: worker.writer is not None)
+            await worker.publish({"chat_id": 1}, "after restart")
+            await wait_for(lambda: received)
+
+            await worker.disconnect()
+            await broker.stop()
+            return received
+
+    assert asyncio.run(scenario()) == [({"chat_id": 1}, "after restart")]
+
+
+def test_membership_event_updates_chat_index():
+    manager = ConnectionManager()
+    sockets = {name: FakeWebSocket() for name in ("alice", "bob", "carol")}
+    manager.connect("alice", sockets["alice"], [5])
+    manager.connect("bob", sockets["bob"], [])
+    manager.connect("carol", sockets["carol"], [5])
+
+    async def scenario():
+        await manager.on_broadcast({"chat_id": 5, "type": "membership", "added": ["bob", "dave"], "removed": []}, "add")
+        await manager.on_broadcast({"chat_id": 5, "type": "membership", "added": [], "removed": ["carol"]}, "remove")
+        await manager.on_broadcast({"chat_id": 5, "exclude": None}, "message")
+
+    asyncio.run(scenario())
+
+    # Добавленный сразу получает событие и сообщения, удалённый - событие об удалении последним
+    assert sockets["bob"].sent == ["add", "remove", "message"]
+    assert sockets["carol"].sent == ["add", "remove"]
+    assert manager.chat_members[5] == {"alice", "bob"}
+    assert "dave" not in manager.user_chats
+
+
+def test_postgres_publish_without_connection_fails_loudly():
+    broadcast = PostgresBroadcast("postgresql://nobody@127.0.0.1:1/none")
+    with pytest.raises(ConnectionError):
+        asyncio.run(broadcast.publish({"chat_id": 1}, "{}"))
+
+
+def test_postgres_chunks_reassemble_and_stale_parts_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(broadcast_module.time, "monotonic", lambda: now[0])
+    received, handler = collector()
+    broadcast = PostgresBroadcast("postgresql://unused", handler=handler)
+
+    async def scenario():
+        # Событие из трёх частей, между ними - короткое
+        frame = encode_event({"chat_id": 1}, "x")
+        broadcast._on_notify(None, 1, broadcast.channel, "~a:0:3:" + frame[:5])
+        broadcast._on_notify(None, 1, broadcast.channel, "=" + encode_event({"chat_id": 2}, "short"))
+        broadcast._on_notify(None, 1, broadcast.channel, "~a:1:3:" + frame[5:8])
+        broadcast._on_notify(None, 1, broadcast.channel, "~a:2:3:" + frame[8:])
+
+        # Обрыв после первой части: сборка не висит в памяти вечно
+        broadcast._on_notify(None, 1, broadcast.channel, "~lost:0:2:abc")
+        now[0] += broadcast.CHUNK_TTL + 1
+        broadcast._on_notify(None, 1, broadcast.channel, "~b:0:2:" + frame[:4])
+        assert set(broadcast.chunks) == {"b"}
+
+        # Пропущенная часть: событие отбрасывается, а не склеивается неверно
+        broadcast._on_notify(None, 1, broadcast.channel, "~c:1:2:tail")
+        assert "c" not in broadcast.chunks
+        # Задачи доставки хранятся до завершения, а не висят на слабых ссылках event loop
+        assert len(broadcast.tasks) == 2
+        await asyncio.gather(*broadcast.tasks)
+        await asyncio.sleep(0)
+        assert broadcast.tasks == set()
+
+    asyncio.run(scenario())
+    assert received == [({"chat_id": 2}, "short"), ({"chat_id": 1}, "x")]
@@ -0,0 +1,44 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import json
+
+from backend.app.api import connections
+from backend.app.api.broadcast import MemoryBroadcast
+from backend.app.api.connections import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, payload):
+        self.sent.append(json.loads(payload))
+
+
+def test_created_chat_reaches_members_on_every_worker(chat_api, monkeypatch):
+    chat_api.database.add_users("alice", "bob", "carol")
+
+    # Два воркера на одной шине: запрос обрабатывает первый, bob подключён ко второму
+    worker_a, worker_b = ConnectionManager(), ConnectionManager()
+
+    async def both_workers(header, payload):
+        await worker_a.on_broadcast(header, payload)
+        await worker_b.on_broadcast(header, payload)
+
+    monkeypatch.setattr(connections, "broadcast", MemoryBroadcast(handler=both_workers))
+    alice, bob = FakeWebSocket(), FakeWebSocket()
+    worker_a.connect("alice", alice, [])
+    worker_b.connect("bob", bob, [])
+
+    response = chat_api.client("alice").post("/chats/create", json={"chat_title": "team", "users": ["bob", "carol"]})
+    assert response.status_code == 200
+
+    [event] = bob.sent
+    assert event["type"] == "membership" and set(event["added"]) == {"alice", "bob", "carol"}
+    chat_id = event["chat_id"]
+    assert worker_b.chat_members[chat_id] == {"bob"}
+    assert worker_a.chat_members[chat_id] == {"alice"}
+    assert alice.sent == [event]
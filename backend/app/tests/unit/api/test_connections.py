@@ -0,0 +1,79 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import asyncio
+import json
+
+from backend.app.api import connections
+from backend.app.api.connections import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0, error: Exception | None = None):
+        self.delay = delay
+        self.error = error
+        self.sent = []
+
+    async def send_text(self, payload):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        self.sent.append(json.loads(payload))
+
+
+def test_disconnect_and_leave_clean_up_indexes():
+    manager = ConnectionManager()
+    alice, bob = FakeWebSocket(), FakeWebSocket()
+    manager.connect("alice", alice, [1, 2])
+    manager.connect("bob", bob, [2])
+    # Неподключённый пользователь в индекс не попадает
+    manager.join(1, "carol")
+    assert manager.chat_members == {1: {"alice"}, 2: {"alice", "bob"}}
+
+    manager.leave(2, "alice")
+    assert manager.chat_members == {1: {"alice"}, 2: {"bob"}} and manager.user_chats["alice"] == {1}
+
+    # Старое соединение не снимает новую вкладку того же пользователя
+    newer = FakeWebSocket()
+    manager.connect("alice", newer, [1])
+    manager.disconnect("alice", alice)
+    assert manager.is_connected("alice")
+
+    manager.disconnect("alice", newer)
+    manager.disconnect("bob")
+    # Пустые чаты удаляются из индекса целиком
+    assert manager.active_connections == {} and manager.chat_members == {} and manager.user_chats == {}
+
+
+def test_send_reaches_only_connected_members():
+    manager = ConnectionManager()
+    alice, bob, mallory = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    manager.connect("alice", alice, [1])
+    manager.connect("bob", bob, [1])
+    manager.connect("mallory", mallory, [2])
+
+    failed = asyncio.run(manager.send_to_chat(1, {"type": "new_message", "id": 1}, exclude="alice"))
+    assert failed == []
+    assert bob.sent == [{"type": "new_message", "id": 1}]
+    assert alice.sent == [] and mallory.sent == []
+    assert asyncio.run(manager.send_to_chat(3, {"type": "new_message"})) == []
+
+
+def test_slow_and_failed_sockets_are_dropped(monkeypatch):
+    monkeypatch.setattr(connections, "SEND_TIMEOUT", 0.05)
+    manager = ConnectionManager()
+    fast, slow, broken = FakeWebSocket(), FakeWebSocket(delay=1), FakeWebSocket(error=RuntimeError("closed"))
+    manager.connect("fast", fast, [1])
+    manager.connect("slow", slow, [1])
+    manager.connect("broken", broken, [1, 2])
+
+    failed = asyncio.run(manager.deliver(1, json.dumps({"type": "new_message"})))
+
+    assert sorted(failed) == ["broken", "slow"]
+    assert fast.sent == [{"type": "new_message"}] and slow.sent == []
+    # Упавшие соединения сняты со всех чатов, быстрый получатель остался
+    assert manager.chat_members == {1: {"fast"}}
+    assert not manager.is_connected("slow") and not manager.is_connected("broken")
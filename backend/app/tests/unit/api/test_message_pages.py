@@ -0,0 +1,54 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+from datetime import datetime, timedelta
+
+from backend.app.models import MessageBase
+
+
+START = datetime(2024, 1, 1)
+
+
+def seed(database):
+    database.add_users("alice", "mallory")
+    database.add_chat(1, "alice")
+    database.insert(MessageBase, [
+        {"chat_id": 1, "username": "alice", "content": f"m{i}", "timestamp": START + timedelta(minutes=i)}
+        for i in range(5)
+    ])
+
+
+def test_history_routes_page_by_cursor_and_timestamp(chat_api):
+    seed(chat_api.database)
+    client = chat_api.client("alice")
+
+    newest = client.get("/chats/1/messages", params={"limit": 2}).json()
+    assert [message["content"] for message in newest["messages"]] == ["m3", "m4"]
+    assert newest["has_more"] is True
+    assert set(newest["messages"][0]) == {"id", "content", "timestamp", "username", "chat_id"}
+
+    older = client.get("/chats/1/messages", params={"before_id": newest["messages"][0]["id"], "limit": 3}).json()
+    assert [message["content"] for message in older["messages"]] == ["m0", "m1", "m2"]
+    assert older["has_more"] is False
+
+    at = client.get("/chats/1/messages/at", params={"timestamp": (START + timedelta(minutes=1)).isoformat(), "limit": 2}).json()
+    assert [message["content"] for message in at["messages"]] == ["m1", "m2"]
+    assert at["messages"][0]["timestamp"] == (START + timedelta(minutes=1)).isoformat()
+
+
+def test_history_routes_reject_non_members_and_bad_limits(chat_api):
+    seed(chat_api.database)
+
+    outsider = chat_api.client("mallory")
+    for path, params in (("/chats/1/messages", {}), ("/chats/1/messages/at", {"timestamp": START.isoformat()})):
+        response = outsider.get(path, params=params)
+        assert response.status_code == 403
+        assert response.json()["detail"] == "Вы не участник этого чата"
+
+    client = chat_api.client("alice")
+    assert client.get("/chats/1/messages", params={"limit": 0}).status_code == 422
+    assert client.get("/chats/1/messages", params={"limit": 201}).status_code == 422
+    # Без токена - на регистрацию
+    assert chat_api.client().get("/chats/1/messages").status_code == 302
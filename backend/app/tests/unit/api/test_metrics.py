@@ -0,0 +1,100 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import asyncio
+import tempfile
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from backend.app import metrics
+from backend.app.api import connections
+from backend.app.api.connections import ConnectionManager
+from backend.app.api.middleware import MetricsMiddleware, REQUEST_SECONDS, REQUEST_DB_QUERIES
+
+
+class FakeWebSocket:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+
+    async def send_text(self, payload):
+        if self.fail:
+            raise RuntimeError("connection closed")
+
+
+def test_render_histogram_is_cumulative():
+    registry = metrics.Registry()
+    histogram = metrics.Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1), registry=registry)
+    metrics.Counter("errors_total", "Errors.", registry=registry).inc(amount=2)
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, '/a"b')
+
+    lines = registry.render().splitlines()
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{route="/a\\"b",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a\\"b",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a\\"b",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/a\\"b"} 3' in lines
+    assert 'latency_seconds_sum{route="/a\\"b"} 5.55' in lines
+    assert "errors_total 2" in lines
+
+
+def test_middleware_records_route_template_and_queries():
+    path = os.path.join(tempfile.mkdtemp(prefix="mirror_metrics_"), "test.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    metrics.instrument_engine(engine.sync_engine, "test")
+
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics-test/{item_id}")
+    async def item(item_id: int):
+        async with engine.connect() as conn:
+            for _ in range(3):
+                await conn.execute(text("SELECT 1"))
+        return {"id": item_id}
+
+    client = TestClient(app)
+    for item_id in (1, 2):
+        assert client.get(f"/metrics-test/{item_id}").status_code == 200
+    assert client.get("/metrics-test/x").status_code == 422
+
+    route = "/metrics-test/{item_id}"
+    assert REQUEST_SECONDS.series[("GET", route, "200")][-1] > 0
+    assert sum(REQUEST_SECONDS.series[("GET", route, "200")][:-1]) == 2
+    assert sum(REQUEST_SECONDS.series[("GET", route, "422")][:-1]) == 1
+    # Три запроса на обработчик: корзина le="3"
+    queries = REQUEST_DB_QUERIES.series[(route,)]
+    assert queries[metrics.COUNT_BUCKETS.index(3)] == 2
+    assert sum(metrics.DB_POOL_WAIT_SECONDS.series[("test",)][:-1]) >= 1
+    assert 'db_pool_checked_out{engine="test"} 0' in metrics.REGISTRY.render()
+    asyncio.run(engine.dispose())
+
+
+def test_fanout_counts_failed_sends():
+    manager = ConnectionManager()
+    manager.connect("alice", FakeWebSocket(), [1])
+    manager.connect("bob", FakeWebSocket(fail=True), [1])
+    sends = connections.FANOUT_SENDS.values.get((), 0)
+    failed = connections.FANOUT_FAILED_SENDS.values.get((), 0)
+
+    assert asyncio.run(manager.deliver(1, "{}")) == ["bob"]
+    assert connections.FANOUT_SENDS.values[()] == sends + 2
+    assert connections.FANOUT_FAILED_SENDS.values[()] == failed + 1
+
+
+def test_password_pool_depth_is_exported(monkeypatch):
+    from backend.app.service.passwords import password_pool
+
+    monkeypatch.setattr(password_pool, "in_flight", password_pool.workers + 2)
+    monkeypatch.setattr(password_pool, "rejected", 5)
+    lines = metrics.REGISTRY.render().splitlines()
+
+    assert "# TYPE password_pool_rejected_total counter" in lines
+    assert f"password_pool_in_flight {password_pool.workers + 2}" in lines
+    assert "password_pool_queued 2" in lines
+    assert "password_pool_rejected_total 5" in lines
@@ -0,0 +1,76 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import tempfile
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from backend.app import profiler
+from backend.app.api.middleware import SQLProfilerMiddleware
+
+
+def profiled_engine(monkeypatch):
+    monkeypatch.setattr(profiler, "SQL_PROFILER", True)
+    path = os.path.join(tempfile.mkdtemp(prefix="mirror_profiler_"), "test.db")
+    engine = create_engine(f"sqlite:///{path}")
+    profiler.instrument_engine(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (username TEXT PRIMARY KEY)"))
+        conn.execute(text("INSERT INTO users VALUES ('alice'), ('bob'), ('carol')"))
+    return engine
+
+
+def test_statement_shape_collapses_in_lists():
+    assert profiler.statement_shape("SELECT 1 FROM t\n WHERE id IN (?, ?, ?)") == "SELECT 1 FROM t WHERE id IN (...)"
+    assert profiler.statement_shape("WHERE id IN (%(id_1_1)s, %(id_1_2)s)") == "WHERE id IN (...)"
+    assert profiler.statement_shape("WHERE id IN ($1, $2) AND x = $3") == "WHERE id IN (...) AND x = $3"
+
+
+def test_profile_flags_repeated_statements_and_explains_slow(monkeypatch):
+    engine = profiled_engine(monkeypatch)
+    monkeypatch.setattr(profiler, "SQL_SLOW_MS", 0)
+
+    with profiler.profile("test") as current, engine.connect() as conn:
+        for name in ("alice", "bob", "carol"):
+            conn.execute(text("SELECT username FROM users WHERE username = :name"), {"name": name})
+        conn.execute(text("SELECT count(*) FROM users"))
+
+    assert len(current.statements) == 4
+    assert current.repeated(threshold=3) == [("SELECT username FROM users WHERE username = ?", 3)]
+    # План снят для каждого SELECT, а сам EXPLAIN в профиль не попал
+    assert len(current.slow) == 4
+    assert "USING" in current.slow[0]["plan"] and "SCAN" in current.slow[-1]["plan"]
+    assert current.summary().startswith("queries=4;")
+    assert current.summary().endswith("repeated=1; slow=4")
+
+
+def test_statements_outside_profile_are_ignored(monkeypatch):
+    engine = profiled_engine(monkeypatch)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    with profiler.profile() as current:
+        pass
+    assert current.statements == []
+
+
+def test_middleware_returns_summary_header(monkeypatch):
+    engine = profiled_engine(monkeypatch)
+    app = FastAPI()
+    app.add_middleware(SQLProfilerMiddleware)
+
+    @app.get("/users/{username}")
+    def user(username: str):
+        # Синхронный обработчик: запросы идут из пула потоков
+        with engine.connect() as conn:
+            for _ in range(3):
+                conn.execute(text("SELECT username FROM users WHERE username = :name"), {"name": username})
+        return {"username": username}
+
+    response = TestClient(app).get("/users/alice")
+    assert response.status_code == 200
+    assert response.headers["x-sql-profile"].startswith("queries=3;")
+    assert "repeated=1" in response.headers["x-sql-profile"]
@@ -0,0 +1,41 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import json
+from datetime import datetime
+
+from backend.app.api.responses import encode_message_page, encode_chat_summary_page
+from backend.app.models import Message, MessagePage, ChatSummary, ChatSummaryPage
+
+
+def test_message_page_matches_pydantic_output():
+    rows = [
+        (1, "привет", datetime(2024, 5, 1, 12, 30, 15, 123456), "alice", 7),
+        (2, 'кавычки " и \n перевод строки', datetime(2024, 5, 1, 12, 31), "bob", 7),
+    ]
+    expected = MessagePage(
+        messages=[Message(id=i, content=c, timestamp=t, username=u, chat_id=ch) for i, c, t, u, ch in rows],
+        has_more=True,
+    )
+
+    assert json.loads(encode_message_page(rows, True)) == expected.model_dump(mode="json")
+
+
+def test_chat_summary_page_matches_pydantic_output():
+    rows = [
+        (3, "чат", 2, 1, 5, 10, "последнее", "bob", datetime(2024, 5, 1, 9, 0), 10),  # Последняя колонка - activity
+        (4, "пустой", 1, 0, 0, None, None, None, None, 0),
+    ]
+    expected = ChatSummaryPage(
+        chats=[
+            ChatSummary(id=3, title="чат", member_count=2, unread_count=1, message_count=5, last_message_id=10,
+                        last_message_preview="последнее", last_message_username="bob",
+                        last_message_at=datetime(2024, 5, 1, 9, 0)),
+            ChatSummary(id=4, title="пустой", member_count=1, unread_count=0, message_count=0),
+        ],
+        next_cursor="0:4",
+    )
+
+    assert json.loads(encode_chat_summary_page(rows, "0:4")) == expected.model_dump(mode="json")
@@ -0,0 +1,144 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import asyncio
+import tempfile
+import time
+
+import pytest
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from backend.app.api import deps
+from backend.app.cache import user_cache
+from backend.app.db.migrate import run_migrations
+from backend.app.db.routing import SessionRouter
+from backend.app.models import PublicUserData, UserBase
+from backend.app.service import users as service_users
+from backend.app.service.users import create_access_token
+
+
+@pytest.fixture(autouse=True)
+def jwt_settings(monkeypatch):
+    """Ключ подписи не зависит от окружения, в котором запущены тесты."""
+    monkeypatch.setattr(service_users, "SECRET_KEY", "routing-test-secret")
+    monkeypatch.setattr(service_users, "ALGORITHM", "HS256")
+    user_cache.clear()
+    yield
+    user_cache.clear()
+
+
+def database(name: str, users: tuple[str, ...] = ()) -> async_sessionmaker:
+    """Отдельный SQLite файл, который помнит, какая это база."""
+    path = os.path.join(tempfile.mkdtemp(prefix="mirror_routing_"), f"{name}.db")
+    engine = create_engine(f"sqlite:///{path}")
+    run_migrations(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE whoami (name TEXT)"))
+        conn.execute(text("INSERT INTO whoami VALUES (:name)"), {"name": name})
+        if users:
+            # email выдаёт, из какой базы прочитан пользователь
+            conn.execute(insert(UserBase), [
+                {"username": user, "email": f"{user}@{name}.example", "password": "hash", "about": ""} for user in users
+            ])
+    engine.dispose()
+    return async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"), expire_on_commit=False)
+
+
+async def whoami(db: AsyncSession) -> str:
+    return (await db.execute(text("SELECT name FROM whoami"))).scalar_one()
+
+
+def test_router_reads_replica_until_own_write():
+    router = SessionRouter(database("primary"), database("replica"), window=0.2)
+
+    async def read(username):
+        async with router.for_read(username)() as db:
+            return await whoami(db)
+
+    assert asyncio.run(read("alice")) == "replica"
+    router.mark_write("alice")
+    assert asyncio.run(read("alice")) == "primary"
+    # Окно только для того, кто писал
+    assert asyncio.run(read("bob")) == "replica"
+    assert asyncio.run(read(None)) == "replica"
+    time.sleep(0.25)
+    assert asyncio.run(read("alice")) == "replica"
+
+
+def test_router_without_replica_uses_primary():
+    router = SessionRouter(database("primary"))
+    router.mark_write("alice")
+    assert router.for_read("bob") is router.primary
+    assert not router.recent_writers.data
+
+
+def test_dependencies_route_reads_and_open_window_after_write(monkeypatch):
+    monkeypatch.setattr(deps, "session_router", SessionRouter(database("primary"), database("replica"), window=60))
+
+    app = FastAPI()
+
+    @app.get("/read")
+    async def read(db: AsyncSession = Depends(deps.get_read_db)):
+        return await whoami(db)
+
+    @app.post("/write")
+    async def write(request: Request, db: AsyncSession = Depends(deps.get_async_db)):
+        request.state.principal = PublicUserData(username="alice", email="alice@example.com")
+        return await whoami(db)
+
+    client = TestClient(app)
+    client.cookies.set("access_token", create_access_token({"sub": "alice"}))
+
+    assert client.get("/read").json() == "replica"
+    assert client.post("/write").json() == "primary"
+    assert client.get("/read").json() == "primary"
+
+    other = TestClient(app)
+    other.cookies.set("access_token", create_access_token({"sub": "bob"}))
+    assert other.get("/read").json() == "replica"
+
+
+def test_write_without_principal_opens_window_by_token(monkeypatch):
+    router = SessionRouter(database("primary"), database("replica"), window=60)
+    monkeypatch.setattr(deps, "session_router", router)
+
+    app = FastAPI()
+
+    @app.post("/write", dependencies=[Depends(deps.oauth2_dep)])
+    async def write(db: AsyncSession = Depends(deps.get_async_db)):
+        return await whoami(db)
+
+    client = TestClient(app)
+    client.cookies.set("access_token", create_access_token({"sub": "alice"}))
+    assert client.post("/write").json() == "primary"
+    assert router.reads_primary("alice")
+
+
+def test_principal_cache_miss_reads_replica_and_falls_back_to_primary(monkeypatch):
+    router = SessionRouter(database("primary", ("alice", "carol")), database("replica", ("alice",)), window=60)
+    monkeypatch.setattr(deps, "session_router", router)
+
+    app = FastAPI()
+
+    @app.get("/me")
+    async def me(principal: PublicUserData = Depends(deps.get_principal)):
+        return principal.email
+
+    def get_me(username):
+        client = TestClient(app, follow_redirects=False)
+        client.cookies.set("access_token", create_access_token({"sub": username}))
+        return client.get("/me")
+
+    assert get_me("alice").json() == "alice@replica.example"
+    # Новый пользователь ещё не доехал до реплики
+    assert get_me("carol").json() == "carol@primary.example"
+    assert get_me("nobody").status_code == 302
+
+    user_cache.clear()
+    router.mark_write("alice")
+    assert get_me("alice").json() == "alice@primary.example"
@@ -0,0 +1,50 @@
+import sys
+import os
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..'))
+sys.path.insert(0, ROOT)
+
+import json
+import subprocess
+import tempfile
+
+# Каждая проверка - в отдельном процессе: важно состояние чистого импорта
+HEAVY_MODULES = ("jinja2", "passlib", "jose", "uvicorn")
+# Из окружения тестов берётся только то, что нужно интерпретатору:
+# MIRROR_TESTS, REPLICA_DATABASE_URL и прочие настройки приложения не протекают
+INHERITED_ENV = ("PATH", "HOME", "LANG", "PYTHONPATH", "VIRTUAL_ENV", "SYSTEMROOT", "TMPDIR")
+
+
+def run_python(code: str, database_url: str) -> dict:
+    env = {name: os.environ[name] for name in INHERITED_ENV if name in os.environ}
+    env.update(DATABASE_URL=database_url, SECRET_KEY="x", ALGORITHM="HS256")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_does_not_touch_database_or_heavy_modules():
+    # Недоступная база не мешает импорту: подключение откладывается до lifespan
+    loaded = run_python(
+        "import json, sys\n"
+        "import backend.app.api.main\n"
+        f"print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))",
+        "postgresql://nobody@127.0.0.1:1/none",
+    )
+    assert loaded == []
+
+
+def test_lifespan_warms_database_and_reports_readiness():
+    path = os.path.join(tempfile.mkdtemp(prefix="mirror_startup_"), "test.db")
+    statuses = run_python(
+        "import json\n"
+        "from fastapi.testclient import TestClient\n"
+        "from backend.app.api.main import app\n"
+        "client = TestClient(app)\n"
+        "before = client.get('/readyz').status_code\n"
+        "with client:\n"
+        "    live, ready = client.get('/healthz').status_code, client.get('/readyz').json()\n"
+        "print(json.dumps({'before': before, 'live': live, 'ready': ready}))",
+        f"sqlite:///{path}",
+    )
+    assert statuses == {"before": 503, "live": 200, "ready": {"status": "ready"}}
@@ -0,0 +1,125 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from starlette.websockets import WebSocketDisconnect
+
+from backend.app.api.connections import manager
+from backend.app.errors import Overloaded
+from backend.app.models import ChatUser, MessageBase
+from backend.app.service import chats_async as service_chats
+
+
+@pytest.fixture
+def team(chat_api):
+    chat_api.database.add_users("alice", "bob", "mallory")
+    chat_api.database.add_chat(1, "alice", ("bob",))
+    chat_api.database.add_chat(2, "mallory")
+    return chat_api
+
+
+def test_ping_and_invalid_frames_get_replies(team):
+    with team.client("alice").websocket_connect("/chats/ws/alice") as ws:
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+
+        ws.send_json({"type": "unknown"})
+        error = ws.receive_json()
+        assert error["type"] == "error" and isinstance(error["detail"], list)
+
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
+
+        # Соединение живо после ошибок
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+    assert "alice" not in manager.active_connections
+
+
+def test_send_frame_acks_sender_and_fans_out_to_members(team):
+    with team.client("alice").websocket_connect("/chats/ws/alice") as alice, \
+            team.client("bob").websocket_connect("/chats/ws/bob") as bob:
+        # accept приходит раньше регистрации в manager: pong значит, что bob уже в индексе чатов
+        bob.send_json({"type": "ping"})
+        assert bob.receive_json() == {"type": "pong"}
+        alice.send_json({"type": "send", "chat_id": 1, "content": "hello", "client_id": "c1"})
+        ack = alice.receive_json()
+        assert ack["type"] == "ack" and ack["client_id"] == "c1"
+        assert ack["message"]["content"] == "hello" and ack["message"]["id"] == ack["message_id"]
+
+        event = bob.receive_json()
+        assert event == {"type": "new_message", "chat_id": 1, "message": ack["message"]}
+
+        alice.send_json({"type": "send", "chat_id": 2, "content": "spam", "client_id": "c2"})
+        assert alice.receive_json() == {"type": "error", "client_id": "c2", "detail": "Вы не участник этого чата"}
+        alice.send_json({"type": "send", "chat_id": 1, "content": "   ", "client_id": "c3"})
+        assert alice.receive_json() == {"type": "error", "client_id": "c3", "detail": "Пустое сообщение"}
+
+    with team.database.engine.connect() as conn:
+        assert conn.execute(select(MessageBase.content)).scalars().all() == ["hello"]
+    # Запись по WebSocket открывает окно read-your-writes
+    assert team.router.reads_primary("alice") and not team.router.reads_primary("bob")
+
+
+def test_ack_frame_moves_read_marker_forward_only(team):
+    team.database.insert(MessageBase, [{"chat_id": 1, "username": "alice", "content": f"m{i}"} for i in range(3)])
+
+    def marker():
+        with team.database.engine.connect() as conn:
+            return conn.execute(select(ChatUser.last_read_message_id)
+                                .where(ChatUser.chat_id == 1, ChatUser.username == "bob")).scalar()
+
+    with team.client("bob").websocket_connect("/chats/ws/bob") as ws:
+        for message_id in (2, 1):
+            ws.send_json({"type": "ack", "chat_id": 1, "message_id": message_id})
+            # ack без ответа: ping служит барьером, после него запись уже выполнена
+            ws.send_json({"type": "ping"})
+            assert ws.receive_json() == {"type": "pong"}
+            assert marker() == 2
+    assert team.router.reads_primary("bob")
+
+
+def test_failed_ack_does_not_open_read_your_writes_window(team, monkeypatch):
+    async def broken_mark_read(*args):
+        raise OperationalError("UPDATE chat_users", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(service_chats, "mark_read", broken_mark_read)
+    with team.client("bob").websocket_connect("/chats/ws/bob") as ws:
+        ws.send_json({"type": "ack", "chat_id": 1, "message_id": 1})
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+    assert not team.router.reads_primary("bob")
+
+
+@pytest.mark.parametrize("error", [RuntimeError("Message ingestor is not running"), Overloaded(msg="busy")])
+def test_rejected_send_answers_with_error_frame(team, monkeypatch, error):
+    async def rejecting_post_message(*args):
+        raise error
+
+    monkeypatch.setattr(service_chats, "post_message", rejecting_post_message)
+    with team.client("alice").websocket_connect("/chats/ws/alice") as ws:
+        ws.send_json({"type": "send", "chat_id": 1, "content": "hello", "client_id": "c1"})
+        reply = ws.receive_json()
+        assert reply["type"] == "error" and reply["client_id"] == "c1"
+        # Соединение не закрывается
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+    assert not team.router.reads_primary("alice")
+
+
+def test_connection_requires_matching_token(team):
+    with pytest.raises(WebSocketDisconnect):
+        with team.client("alice").websocket_connect("/chats/ws/bob") as ws:
+            ws.receive_json()
+    with pytest.raises(WebSocketDisconnect):
+        with team.client().websocket_connect("/chats/ws/alice") as ws:
+            ws.receive_json()
+    # Токен можно передать параметром запроса
+    token = team.client("alice").cookies["access_token"]
+    with team.client().websocket_connect(f"/chats/ws/alice?token={token}") as ws:
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
@@ -0,0 +1,109 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.data import chats_postgre, chats_postgre_async, messages_postgre, messages_postgre_async
+from backend.app.data import users_postgre, users_postgre_async
+from backend.app.errors import Duplicate, MailDuplicate, Missing
+from backend.app.models import Message, User
+
+
+def user(name: str, **fields) -> User:
+    return User(**{"username": name, "email": f"{name}@example.com", "password": "hash", "about": "", **fields})
+
+
+def test_async_user_crud_matches_sync(database):
+    async def scenario(db):
+        created = await users_postgre_async.create(db, user("alice"))
+        with pytest.raises(Duplicate):
+            await users_postgre_async.create(db, user("alice"))
+        with pytest.raises(MailDuplicate):
+            await users_postgre_async.check_duplicate_mail(db, "alice@example.com")
+        assert await users_postgre_async.check_duplicate_mail(db, "bob@example.com") is None
+
+        modified = await users_postgre_async.modify(db, user("alice", about="hi"))
+        with pytest.raises(Missing):
+            await users_postgre_async.modify(db, user("ghost"))
+        return created, modified, await users_postgre_async.get_one(db, "alice"), await users_postgre_async.get_all(db)
+
+    created, modified, one, everyone = database.run(scenario)
+    assert created == user("alice") and modified == one == user("alice", about="hi")
+
+    # Синхронная версия видит то же самое
+    with sessionmaker(database.engine)() as db:
+        assert users_postgre.get_one(db, "alice") == one
+        assert users_postgre.get_all(db) == everyone == [one]
+
+    async def remove(db):
+        await users_postgre_async.delete(db, user("alice"))
+        with pytest.raises(Missing):
+            await users_postgre_async.delete(db, user("alice"))
+        with pytest.raises(Missing):
+            await users_postgre_async.get_one(db, "alice")
+
+    database.run(remove)
+
+
+def test_async_message_crud_matches_sync(database):
+    database.add_users("alice", "bob")
+    database.add_chat(1, "alice", ("bob",))
+    database.add_chat(2, "bob")
+
+    async def scenario(db):
+        first = await messages_postgre_async.create(db, Message(content="hello", username="alice", chat_id=1))
+        second = await messages_postgre_async.create(db, Message(content="hi", username="bob", chat_id=1))
+        await messages_postgre_async.create(db, Message(content="other", username="bob", chat_id=2))
+        assert await messages_postgre_async.get_one(db, first.id) == first
+        by_bob = await messages_postgre_async.get_messages_by_filter(db, [{"chat_id": 1}, {"username": "bob"}])
+        assert by_bob == [second]
+        with pytest.raises(Missing):
+            await messages_postgre_async.get_messages_by_filter(db, [{"no_such_column": 1}])
+
+        await messages_postgre_async.delete(db, first.id)
+        with pytest.raises(Missing):
+            await messages_postgre_async.get_one(db, first.id)
+        with pytest.raises(Missing):
+            await messages_postgre_async.delete(db, first.id)
+        return await messages_postgre_async.get_all(db)
+
+    remaining = database.run(scenario)
+    assert [message.content for message in remaining] == ["hi", "other"]
+
+    with sessionmaker(database.engine)() as db:
+        assert messages_postgre.get_all(db) == remaining
+        assert messages_postgre.get_messages_by_filter(db, [{"chat_id": 2}]) == remaining[1:]
+        assert chats_postgre.get_one(db, 1).messages == remaining[:1]
+
+
+def test_async_chat_crud_matches_sync(database):
+    database.add_users("alice", "bob", "carol")
+    database.add_chat(1, "alice", ("bob",))
+    database.add_chat(2, "bob", ("carol",))
+
+    async def scenario(db):
+        assert [chat.id for chat in await chats_postgre_async.get_all_chats_by_user(db, "bob")] == [1, 2]
+        with pytest.raises(Missing):
+            await chats_postgre_async.get_all_chats_by_user(db, "ghost")
+        assert [chat.id for chat in await chats_postgre_async.get_chats_by_filter(db, [{"owner_username": "bob"}])] == [2]
+
+        assert await chats_postgre_async.add_message_to_chat(db, Message(content="x", username="alice", chat_id=99)) is False
+        message = await chats_postgre_async.add_message_to_chat(db, Message(content="hello", username="alice", chat_id=1))
+        assert await chats_postgre_async.delete_message_from_chat(db, message.id) is True
+        assert await chats_postgre_async.delete_message_from_chat(db, message.id) is False
+
+        await chats_postgre_async.delete(db, 2)
+        with pytest.raises(Missing):
+            await chats_postgre_async.delete(db, 2)
+        return await chats_postgre_async.get_all(db)
+
+    remaining = database.run(scenario)
+    assert [chat.id for chat in remaining] == [1] and remaining[0].messages == []
+
+    with sessionmaker(database.engine)() as db:
+        assert chats_postgre.get_all(db) == remaining
+        assert [chat.id for chat in chats_postgre.get_all_chats_by_user(db, "bob")] == [1]
+        assert chats_postgre.get_chats_by_filter(db, [{"owner_username": "bob"}]) == []
@@ -0,0 +1,73 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+from sqlalchemy import select
+
+from backend.app.data import chats_postgre_async as data
+from backend.app.data import messages_postgre_async as messages
+from backend.app.data.chats_postgre import counters_recompute
+from backend.app.models import ChatBase
+from backend.app.tests.utils import count_queries
+
+
+async def read_counters(db):
+    rows = (await db.execute(
+        select(ChatBase.id, ChatBase.message_count, ChatBase.last_message_id, ChatBase.last_message_at).order_by(ChatBase.id)
+    )).all()
+    return [tuple(row) for row in rows]
+
+
+def test_write_paths_keep_counters_consistent(database):
+    database.add_users("alice")
+    database.add_chat(1, "alice")
+    database.add_chat(2, "alice")
+
+    async def scenario(db):
+        await data.insert_message_if_member(db, 1, "alice", "one")
+        await data.insert_messages_batch(db, [(1, "alice", "two"), (2, "alice", "three"), (1, "alice", "four")])
+        last_id, _ = await data.insert_message_if_member(db, 2, "alice", "five")
+        await data.delete_message_from_chat(db, last_id)
+
+        maintained = await read_counters(db)
+        await db.execute(counters_recompute([1, 2]))
+        await db.commit()
+        recomputed = await read_counters(db)
+        return maintained, recomputed
+
+    maintained, recomputed = database.run(scenario)
+
+    assert maintained == recomputed
+    assert [(chat_id, count, last_id) for chat_id, count, last_id, _ in maintained] == [(1, 3, 4), (2, 1, 3)]
+
+
+def test_single_delete_adjusts_counters_without_recount(database):
+    database.add_users("alice")
+    database.add_chat(1, "alice")
+    database.add_chat(2, "alice")
+
+    async def scenario(db):
+        ids = [(await data.insert_message_if_member(db, 1, "alice", f"m{i}"))[0] for i in range(3)]
+        only_id, _ = await data.insert_message_if_member(db, 2, "alice", "only")
+
+        with count_queries(db.bind.sync_engine) as middle:
+            await data.delete_message_from_chat(db, ids[1])
+        after_middle = await read_counters(db)
+        await messages.delete(db, ids[2])
+        after_last = await read_counters(db)
+        await data.delete_message_from_chat(db, only_id)
+        after_only = await read_counters(db)
+
+        await db.execute(counters_recompute([1, 2]))
+        await db.commit()
+        return ids, middle.statements, after_middle, after_last, after_only, await read_counters(db)
+
+    ids, statements, after_middle, after_last, after_only, recomputed = database.run(scenario)
+
+    # Сообщения чата не пересчитываются: count(*) есть только в полной починке
+    assert not any("count(" in statement.lower() for statement in statements)
+    assert [(chat_id, count, last_id) for chat_id, count, last_id, _ in after_middle][0] == (1, 2, ids[2])
+    assert [(chat_id, count, last_id) for chat_id, count, last_id, _ in after_last][0] == (1, 1, ids[0])
+    assert after_only[1] == (2, 0, None, None)
+    assert after_only == recomputed
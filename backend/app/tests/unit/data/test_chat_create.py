@@ -0,0 +1,53 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import pytest
+from sqlalchemy import select
+
+from backend.app.data import chats_postgre_async as data
+from backend.app.errors import Missing
+from backend.app.models import ChatBase, ChatUser
+from backend.app.tests.utils import count_queries
+
+
+USERS = [f"user{i:04}" for i in range(1000)]
+
+
+def test_create_chat_query_count_does_not_depend_on_members(database):
+    database.add_users("owner", *USERS)
+
+    async def scenario(db):
+        with count_queries(db.bind.sync_engine) as small:
+            await data.create_with_members(db, "small", "owner", USERS[:3])
+        with count_queries(db.bind.sync_engine) as large:
+            chat = await data.create_with_members(db, "large", "owner", USERS + ["owner", USERS[0]])
+        assert small.count == large.count == 3
+        assert large.commits == 1
+        # Владелец среди участников один раз, повторы имён схлопываются
+        assert chat.chat_owner == "owner" and chat.owner.username == "owner"
+        assert [user.username for user in chat.users] == ["owner"] + USERS
+        return chat.id
+
+    chat_id = database.run(scenario)
+    with database.engine.connect() as conn:
+        assert len(conn.execute(select(ChatUser.username).where(ChatUser.chat_id == chat_id)).all()) == 1001
+
+
+def test_create_chat_reports_all_missing_users_at_once(database):
+    database.add_users("owner", *USERS)
+
+    async def scenario(db):
+        with pytest.raises(Missing) as missing:
+            await data.create_with_members(db, "team", "owner", ["user0001", "ghost1", "ghost2", "ghost1"])
+        assert missing.value.msg == "Users not found: ghost1, ghost2"
+        with pytest.raises(Missing) as missing:
+            await data.create_with_members(db, "team", "nobody", ["user0001"])
+        assert "nobody" in missing.value.msg
+
+    database.run(scenario)
+    # Ни чата, ни участников не создано
+    with database.engine.connect() as conn:
+        assert conn.execute(select(ChatBase.id)).first() is None
+        assert conn.execute(select(ChatUser.chat_id)).first() is None
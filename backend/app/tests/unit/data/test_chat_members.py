@@ -0,0 +1,77 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.data import chats_postgre as sync_data
+from backend.app.data import chats_postgre_async as data
+from backend.app.errors import Missing
+from backend.app.models import ChatUser
+from backend.app.tests.utils import count_queries
+
+
+USERS = [f"user{i:03}" for i in range(200)]
+
+
+@pytest.fixture
+def team(database):
+    database.add_users("owner", *USERS)
+    database.add_chat(1, "owner", ("user000",), title="team", last_message_id=42)
+    return database
+
+
+def test_add_and_remove_members_report_outcome_per_user(team):
+    async def scenario(db):
+        results = await data.add_members(db, 1, ["user000", "user001", "ghost", "user001"])
+        assert results == {"user000": "already_member", "user001": "added", "ghost": "unknown_user"}
+        assert await data.check_user_in_chat(db, 1, "user001")
+
+        results = await data.remove_members(db, 1, ["owner", "user001", "user002"])
+        assert results == {"owner": "owner", "user001": "removed", "user002": "not_member"}
+        assert not await data.check_user_in_chat(db, 1, "user001")
+        assert await data.check_user_in_chat(db, 1, "owner")
+
+        with pytest.raises(Missing):
+            await data.add_members(db, 99, ["user001"])
+        with pytest.raises(Missing):
+            await data.remove_members(db, 99, ["user001"])
+
+    team.run(scenario)
+
+
+def test_bulk_membership_query_count_does_not_depend_on_list_size(team):
+    async def scenario(db):
+        with count_queries(db.bind.sync_engine) as few:
+            await data.add_members(db, 1, USERS[1:3] + ["ghost"])
+        with count_queries(db.bind.sync_engine) as many:
+            await data.add_members(db, 1, USERS[3:] + ["ghost"])
+        assert few.count == many.count
+        assert many.commits == 1
+
+        with count_queries(db.bind.sync_engine) as removal:
+            results = await data.remove_members(db, 1, USERS)
+        assert removal.count == 2 and removal.commits == 1
+        assert set(results.values()) == {"removed"}
+
+    team.run(scenario)
+
+    with team.engine.connect() as conn:
+        members = conn.execute(select(ChatUser.username, ChatUser.last_read_message_id)
+                               .where(ChatUser.chat_id == 1)).all()
+        assert members == [("owner", None)]
+
+
+def test_new_members_start_with_history_read(team):
+    with sessionmaker(team.engine)() as db:
+        # Новый участник не получает всю прежнюю историю как непрочитанную
+        assert sync_data.add_members(db, 1, ["user005"]) == {"user005": sync_data.MEMBER_ADDED}
+        assert sync_data.add_user_to_chat(db, 1, "user006")
+        assert not sync_data.add_user_to_chat(db, 1, "user006")
+        assert sync_data.remove_user_from_chat(db, 1, "user006")
+        marker = db.execute(select(ChatUser.last_read_message_id)
+                            .where(ChatUser.chat_id == 1, ChatUser.username == "user005")).scalar()
+        assert marker == 42
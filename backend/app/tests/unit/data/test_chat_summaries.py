@@ -0,0 +1,62 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+from sqlalchemy.orm import Session
+
+from backend.app.data import chats_postgre_async as data
+from backend.app.data.chats_postgre import recompute_counters
+from backend.app.models import MessageBase
+from backend.app.tests.utils import count_queries
+
+
+def seed(database):
+    database.add_users("alice", "bob")
+    database.add_chat(1, "alice", ("bob",))
+    database.add_chat(2, "alice", ("bob",))
+    database.add_chat(3, "alice")
+    database.insert(MessageBase, [
+        {"id": 1, "chat_id": 1, "username": "bob", "content": "first"},
+        {"id": 2, "chat_id": 2, "username": "bob", "content": "second"},
+        {"id": 3, "chat_id": 1, "username": "bob", "content": "third " + "x" * 500},
+        {"id": 4, "chat_id": 1, "username": "alice", "content": "own"},
+    ])
+    # Сообщения вставлены в обход слоя данных: счётчики чатов заполняет починка
+    with Session(database.engine) as db:
+        recompute_counters(db)
+
+
+def test_summaries_order_unread_and_pages(database):
+    seed(database)
+
+    async def scenario(db):
+        with count_queries(db.bind.sync_engine) as counter:
+            first = await data.get_summaries(db, "alice", limit=2)
+        assert counter.count == 1
+
+        # Сообщение другого чата и несуществующее сообщение отметку не двигают
+        assert not await data.mark_read(db, 1, "alice", 2)
+        assert not await data.mark_read(db, 1, "alice", 999)
+        assert await data.mark_read(db, 1, "alice", 3)
+        assert not await data.mark_read(db, 1, "alice", 1)  # Отметка не откатывается назад
+        after_read = await data.get_summaries(db, "alice", limit=2)
+
+        activity, _, chat_id = first.next_cursor.partition(":")
+        second = await data.get_summaries(db, "alice", before=(int(activity), int(chat_id)), limit=2)
+        return first, after_read, second
+
+    first, after_read, second = database.run(scenario)
+
+    assert [chat.id for chat in first.chats] == [1, 2]
+    assert first.chats[0].member_count == 2
+    assert first.chats[0].message_count == 3
+    assert first.chats[0].last_message_id == 4
+    assert first.chats[0].last_message_preview == "own"
+    assert first.chats[0].unread_count == 2  # Свои сообщения не считаются
+    assert first.chats[1].unread_count == 1
+    assert after_read.chats[0].unread_count == 0
+
+    assert [chat.id for chat in second.chats] == [3]
+    assert second.chats[0].last_message_id is None
+    assert second.next_cursor is None
@@ -0,0 +1,64 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import pytest
+from sqlalchemy.orm import Session
+
+from backend.app.data import chats_postgre, chats_postgre_async
+from backend.app.models import ChatBase, ChatUser, MessageBase
+from backend.app.tests.utils import assert_query_count
+
+
+# Профиль -> число запросов для любого числа чатов
+EXPECTED_QUERIES = [
+    ("summary", None, 1),
+    ("members", None, 2),
+    ("full", None, 3),
+    ("full", 2, 3),
+]
+
+
+def seed(database, chats: int) -> None:
+    database.add_users("user0", "user1", "user2")
+    database.insert(ChatBase, [
+        {"id": chat_id, "title": f"chat {chat_id}", "owner_username": f"user{chat_id % 3}"} for chat_id in range(1, chats + 1)
+    ])
+    database.insert(ChatUser, [
+        {"chat_id": chat_id, "username": f"user{i}"} for chat_id in range(1, chats + 1) for i in range(3)
+    ])
+    database.insert(MessageBase, [
+        {"chat_id": chat_id, "username": "user0", "content": f"{chat_id}-{n}"}
+        for n in range(5) for chat_id in range(1, chats + 1)
+    ])
+
+
+@pytest.mark.parametrize("chats", [2, 10])
+@pytest.mark.parametrize("profile, history, expected", EXPECTED_QUERIES)
+def test_async_list_query_count_does_not_depend_on_rows(database, chats, profile, history, expected):
+    seed(database, chats)
+
+    async def scenario(db):
+        with assert_query_count(db.bind.sync_engine, expected):
+            return await chats_postgre_async.get_all(db, profile=profile, history=history)
+
+    result = database.run(scenario)
+
+    assert len(result) == chats
+    assert all((chat.users is None) == (profile == "summary") for chat in result)
+    if history is not None:
+        # Окно - последние сообщения каждого чата по возрастанию id
+        assert all([m.content for m in chat.messages] == [f"{chat.id}-3", f"{chat.id}-4"] for chat in result)
+
+
+@pytest.mark.parametrize("chats", [2, 10])
+def test_sync_chats_by_user_query_count(database, chats):
+    seed(database, chats)
+    with Session(database.engine) as db:
+        # Поиск пользователя и три запроса профиля full
+        with assert_query_count(database.engine, 4):
+            result = chats_postgre.get_all_chats_by_user(db, "user1")
+
+    assert len(result) == chats
+    assert all(len(chat.messages) == 5 and len(chat.users) == 3 for chat in result)
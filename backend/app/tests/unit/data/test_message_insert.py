@@ -0,0 +1,50 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+from sqlalchemy import select
+
+from backend.app.data import chats_postgre_async as data
+from backend.app.models import ChatBase, MessageBase
+from backend.app.tests.utils import count_queries
+
+
+def test_member_message_is_inserted_in_one_round_trip(database):
+    database.add_users("alice")
+    database.add_chat(1, "alice")
+
+    async def scenario(db):
+        with count_queries(db.bind.sync_engine) as counter:
+            inserted = await data.insert_message_if_member(db, 1, "alice", "hello")
+        return inserted, counter
+
+    (message_id, timestamp), counter = database.run(scenario)
+    # INSERT ... SELECT ... RETURNING и обновление счётчиков, без отдельных SELECT
+    assert counter.count == 2 and counter.commits == 1
+    assert counter.statements[0].lstrip().upper().startswith("INSERT")
+
+    with database.engine.connect() as conn:
+        assert conn.execute(select(MessageBase.id, MessageBase.timestamp, MessageBase.content)).all() == \
+            [(message_id, timestamp, "hello")]
+        assert conn.execute(select(ChatBase.message_count, ChatBase.last_message_id)).one() == (1, message_id)
+
+
+def test_non_member_message_is_not_written(database):
+    database.add_users("alice", "mallory")
+    database.add_chat(1, "alice")
+
+    async def scenario(db):
+        with count_queries(db.bind.sync_engine) as counter:
+            inserted = await data.insert_message_if_member(db, 1, "mallory", "spam")
+        # Несуществующий чат - тот же случай: строки chat_users нет
+        assert await data.insert_message_if_member(db, 99, "alice", "lost") is None
+        return inserted, counter
+
+    inserted, counter = database.run(scenario)
+    assert inserted is None
+    assert counter.count == 1 and counter.commits == 1
+
+    with database.engine.connect() as conn:
+        assert conn.execute(select(MessageBase.id)).all() == []
+        assert conn.execute(select(ChatBase.message_count, ChatBase.last_message_id)).one() == (0, None)
@@ -0,0 +1,99 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+from datetime import datetime, timedelta
+
+from backend.app.data import messages_postgre_async as data
+from backend.app.models import MessageBase
+
+
+START = datetime(2024, 1, 1)
+
+
+def seed(database):
+    """Чат 1 - сообщения 1..10 раз в минуту, чат 2 - чужие сообщения вперемешку."""
+    database.add_users("alice")
+    database.add_chat(1, "alice")
+    database.add_chat(2, "alice")
+    rows = []
+    for i in range(10):
+        rows.append({"chat_id": 1, "username": "alice", "content": f"m{i}", "timestamp": START + timedelta(minutes=i)})
+        rows.append({"chat_id": 2, "username": "alice", "content": f"other{i}", "timestamp": START + timedelta(minutes=i)})
+    database.insert(MessageBase, rows)
+
+
+def ids(page):
+    return [message.id for message in page.messages]
+
+
+def test_keyset_pages_walk_history_in_both_directions(database):
+    seed(database)
+
+    async def scenario(db):
+        chat_ids = [row.id for row in (await data.get_page(db, 1, limit=100)).messages]
+        newest = await data.get_page(db, 1, limit=4)
+        older = await data.get_page(db, 1, before_id=newest.messages[0].id, limit=4)
+        oldest = await data.get_page(db, 1, before_id=older.messages[0].id, limit=4)
+        forward = await data.get_page(db, 1, after_id=chat_ids[1], limit=4)
+        tail = await data.get_page(db, 1, after_id=chat_ids[-3], limit=4)
+        rows, has_more = await data.get_page_rows(db, 1, before_id=newest.messages[0].id, limit=4)
+        return chat_ids, newest, older, oldest, forward, tail, rows, has_more
+
+    chat_ids, newest, older, oldest, forward, tail, rows, has_more = database.run(scenario)
+
+    # Только сообщения своего чата, по возрастанию id
+    assert len(chat_ids) == 10 and chat_ids == sorted(chat_ids)
+    assert ids(newest) == chat_ids[6:] and newest.has_more
+    assert ids(older) == chat_ids[2:6] and older.has_more
+    assert ids(oldest) == chat_ids[:2] and not oldest.has_more
+    assert ids(forward) == chat_ids[2:6] and forward.has_more
+    assert ids(tail) == chat_ids[-2:] and not tail.has_more
+    # Быстрый путь отдаёт те же страницы кортежами колонок
+    assert [row[0] for row in rows] == ids(older) and has_more
+    assert rows[0][1:] == ("m2", START + timedelta(minutes=2), "alice", 1)
+
+
+def test_page_at_timestamp_starts_from_first_message_not_earlier(database):
+    seed(database)
+
+    async def scenario(db):
+        exact = await data.get_page_at(db, 1, START + timedelta(minutes=3), limit=3)
+        between = await data.get_page_at(db, 1, START + timedelta(minutes=3, seconds=30), limit=3)
+        future = await data.get_page_at(db, 1, START + timedelta(days=1), limit=3)
+        rows, has_more = await data.get_page_at_rows(db, 1, START + timedelta(minutes=3), limit=3)
+        return exact, between, future, rows, has_more
+
+    exact, between, future, rows, has_more = database.run(scenario)
+
+    assert [message.content for message in exact.messages] == ["m3", "m4", "m5"] and exact.has_more
+    assert [message.content for message in between.messages] == ["m4", "m5", "m6"]
+    # Позже timestamp ничего нет - самые новые сообщения
+    assert [message.content for message in future.messages] == ["m7", "m8", "m9"] and future.has_more
+    assert [row[1] for row in rows] == ["m3", "m4", "m5"] and has_more
+
+
+def test_page_at_timestamp_follows_timestamps_not_ids(database):
+    database.add_users("alice")
+    database.add_chat(1, "alice")
+    # Импортированная история: id не совпадает с порядком времени
+    database.insert(MessageBase, [
+        {"id": 1, "chat_id": 1, "username": "alice", "content": "late", "timestamp": START + timedelta(minutes=5)},
+        {"id": 2, "chat_id": 1, "username": "alice", "content": "early", "timestamp": START + timedelta(minutes=1)},
+        {"id": 3, "chat_id": 1, "username": "alice", "content": "middle", "timestamp": START + timedelta(minutes=3)},
+        {"id": 4, "chat_id": 1, "username": "alice", "content": "tie", "timestamp": START + timedelta(minutes=3)},
+    ])
+
+    async def scenario(db):
+        page = await data.get_page_at(db, 1, START + timedelta(minutes=2), limit=2)
+        rest = await data.get_page_at(db, 1, START + timedelta(minutes=2), limit=3)
+        rows, has_more = await data.get_page_at_rows(db, 1, START + timedelta(minutes=2), limit=2)
+        return page, rest, rows, has_more
+
+    page, rest, rows, has_more = database.run(scenario)
+
+    # Сообщение id=2 раньше timestamp в страницу не попадает, равные timestamp идут по id
+    assert [message.content for message in page.messages] == ["middle", "tie"] and page.has_more
+    assert [message.content for message in rest.messages] == ["middle", "tie", "late"] and not rest.has_more
+    assert [row[1] for row in rows] == ["middle", "tie"] and has_more
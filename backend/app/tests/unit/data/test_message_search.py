@@ -0,0 +1,79 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+from sqlalchemy import delete, text
+
+from backend.app.data import messages_postgre_async as data
+from backend.app.models import MessageBase
+
+
+def seed(database):
+    database.add_users("alice", "bob")
+    database.add_chat(1, "alice", ("bob",))
+    database.add_chat(2, "alice")
+    database.add_chat(3, "bob")
+    # В чате 3 alice не участник: add_chat добавляет только владельца bob
+    database.insert(MessageBase, [
+        {"id": 1, "chat_id": 1, "username": "bob", "content": "Релиз в пятницу"},
+        {"id": 2, "chat_id": 1, "username": "alice", "content": "релиз, релиз: <b>релиз</b> готов"},
+        {"id": 3, "chat_id": 2, "username": "alice", "content": "заметки про релиз"},
+        {"id": 4, "chat_id": 3, "username": "bob", "content": "секретный релиз"},
+        {"id": 5, "chat_id": 1, "username": "bob", "content": "обед"},
+    ])
+    with database.engine.begin() as conn:
+        # Триггеры FTS5 следят и за удалением
+        conn.execute(delete(MessageBase).where(MessageBase.id == 5))
+
+
+def test_search_scope_rank_highlight_and_pages(database):
+    seed(database)
+
+    async def scenario(db):
+        page = await data.search(db, "alice", "релиз")
+        # Чат 3 alice не виден
+        assert [hit.id for hit in page.messages] == [2, 3, 1]
+        assert page.next_cursor is None
+        assert page.messages[0].rank >= page.messages[1].rank
+        assert "<mark>" in page.messages[0].highlight
+        assert "&lt;b&gt;" in page.messages[0].highlight
+
+        first = await data.search(db, "alice", "релиз", limit=2)
+        assert [hit.id for hit in first.messages] == [2, 3]
+        rank, _, message_id = first.next_cursor.rpartition(":")
+        rest = await data.search(db, "alice", "релиз", before=(float(rank), int(message_id)), limit=2)
+        assert [hit.id for hit in rest.messages] == [1]
+        assert rest.next_cursor is None
+
+        assert [hit.id for hit in (await data.search(db, "alice", "релиз", chat_id=2)).messages] == [3]
+        assert (await data.search(db, "bob", "обед")).messages == []
+        # Синтаксис FTS5 в запросе не разбирается
+        assert (await data.search(db, "alice", '"релиз* (-')).messages
+        assert (await data.search(db, "alice", "!!!")).messages == []
+        # Служебный токен чата в индексе не ищется как текст
+        assert (await data.search(db, "alice", "c1")).messages == []
+
+        await db.execute(text("UPDATE messages SET content = 'обед' WHERE id = 3"))
+        await db.commit()
+        assert [hit.id for hit in (await data.search(db, "alice", "релиз")).messages] == [2, 1]
+
+    database.run(scenario)
+
+
+def test_search_reports_truncated_candidate_window(database, monkeypatch):
+    seed(database)
+    monkeypatch.setattr(data, "SEARCH_CANDIDATES", 2)
+
+    async def scenario(db):
+        # Три совпадения при окне в два: ранжируются два самых новых
+        page = await data.search(db, "alice", "релиз")
+        assert sorted(hit.id for hit in page.messages) == [2, 3] and page.truncated
+        rank, _, message_id = (await data.search(db, "alice", "релиз", limit=1)).next_cursor.rpartition(":")
+        rest = await data.search(db, "alice", "релиз", before=(float(rank), int(message_id)), limit=1)
+        assert rest.truncated and rest.next_cursor is None
+
+        whole = await data.search(db, "alice", "релиз", chat_id=1)
+        assert [hit.id for hit in whole.messages] == [2, 1] and not whole.truncated
+
+    database.run(scenario)
@@ -0,0 +1,45 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import tempfile
+
+from sqlalchemy import create_engine, inspect, text
+
+from backend.app.db.migrate import run_migrations, applied_versions, MIGRATIONS
+from backend.app.models import Base
+
+
+def temp_engine():
+    path = os.path.join(tempfile.mkdtemp(prefix="mirror_migrate_"), "test.db")
+    return create_engine(f"sqlite:///{path}")
+
+
+def index_names(engine, table):
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def test_migrations_apply_once():
+    engine = temp_engine()
+
+    assert run_migrations(engine) == sorted(m.version for m in MIGRATIONS)
+    assert run_migrations(engine) == []
+    assert applied_versions(engine) == {m.version for m in MIGRATIONS}
+    assert {"ix_messages_chat_id_id", "ix_messages_chat_id_timestamp", "ix_messages_username"} <= index_names(engine, "messages")
+    assert "ix_chat_users_username" in index_names(engine, "chat_users")
+
+
+def test_migrations_add_indexes_to_legacy_schema():
+    engine = temp_engine()
+    # База, созданная старым create_all без индексов
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for name in ("ix_messages_chat_id_id", "ix_chat_users_username", "ux_users_email"):
+            conn.execute(text(f"DROP INDEX {name}"))
+
+    run_migrations(engine)
+
+    assert "ix_messages_chat_id_id" in index_names(engine, "messages")
+    assert "ix_chat_users_username" in index_names(engine, "chat_users")
+    assert "ux_users_email" in index_names(engine, "users")
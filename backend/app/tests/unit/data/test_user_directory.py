@@ -0,0 +1,44 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+from backend.app.data import users_postgre_async as data
+from backend.app.models import UserBase
+
+
+def seed(database):
+    database.insert(UserBase, [
+        {"username": "alice", "email": "alice@example.com", "password": "hash", "about": "a"},
+        {"username": "Albert", "email": "al@corp.org", "password": "hash", "about": ""},
+        {"username": "bob", "email": "bob@example.com", "password": "hash", "about": ""},
+        {"username": "carol", "email": "alpha@example.com", "password": "hash", "about": ""},
+        {"username": "dave_x", "email": "dave@example.com", "password": "hash", "about": ""},
+        {"username": "davex", "email": "davex@example.com", "password": "hash", "about": ""},
+    ])
+
+
+def test_directory_prefix_search_and_pages(database):
+    seed(database)
+
+    async def scenario(db):
+        first = await data.get_directory(db, limit=4)
+        assert [user.username for user in first.users] == ["Albert", "alice", "bob", "carol"]
+        assert "password" not in first.users[0].model_dump()
+        rest = await data.get_directory(db, after=first.next_cursor, limit=4)
+        assert [user.username for user in rest.users] == ["dave_x", "davex"]
+        assert rest.next_cursor is None
+
+        # Без учёта регистра, по логину или почте
+        found = await data.get_directory(db, query="AL")
+        assert [user.username for user in found.users] == ["Albert", "alice", "carol"]
+        # _ и % в запросе - обычные символы, а не шаблон LIKE
+        assert [user.username for user in (await data.get_directory(db, query="dave_")).users] == ["dave_x"]
+        assert (await data.get_directory(db, query="%")).users == []
+
+        page = await data.get_directory(db, query="al", limit=2)
+        assert [user.username for user in page.users] == ["Albert", "alice"]
+        page = await data.get_directory(db, query="al", after=page.next_cursor, limit=2)
+        assert [user.username for user in page.users] == ["carol"]
+
+    database.run(scenario)
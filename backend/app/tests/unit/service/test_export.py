@@ -0,0 +1,73 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import csv
+import gzip
+import io
+import json
+import tempfile
+from datetime import datetime
+
+from backend.app.models import MessageBase
+from backend.app.service.export import export_stream, last_exported_id, drop_partial_line
+
+
+def seed(database):
+    database.add_users("alice", "bob")
+    database.add_chat(1, "alice", title="a")
+    database.add_chat(2, "bob", title="b")
+    database.insert(MessageBase, [
+        {"id": i, "chat_id": 1 if i % 3 else 2, "username": "alice" if i % 3 else "bob",
+         "content": f"строка {i},\n\"с кавычками\"", "timestamp": datetime(2024, 1, i)}
+        for i in range(1, 11)
+    ])
+
+
+def collect(database, fmt, compress=False, **filters) -> bytes:
+    async def run(db):
+        return b"".join([chunk async for chunk in export_stream(db, fmt, compress, batch_size=3, **filters)])
+    return database.run(run)
+
+
+def test_export_formats_filters_and_resume(database):
+    seed(database)
+
+    lines = collect(database, "ndjson", chat_id=1).decode().splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [record["id"] for record in records] == [1, 2, 4, 5, 7, 8, 10]
+    assert records[0]["content"] == "строка 1,\n\"с кавычками\""
+    assert records[0]["timestamp"] == "2024-01-01T00:00:00"
+
+    # Период и участие пользователя
+    data = collect(database, "ndjson", username="bob", since=datetime(2024, 1, 4), until=datetime(2024, 1, 9))
+    assert [json.loads(line)["id"] for line in data.decode().splitlines()] == [6]
+
+    rows = list(csv.reader(io.StringIO(collect(database, "csv", chat_id=2).decode())))
+    assert rows[0] == ["id", "content", "timestamp", "username", "chat_id"]
+    assert [row[0] for row in rows[1:]] == ["3", "6", "9"]
+    assert rows[1][1] == "строка 3,\n\"с кавычками\""
+    # Продолжение без заголовка, пустая выгрузка - только заголовок
+    assert [row[0] for row in csv.reader(io.StringIO(collect(database, "csv", chat_id=2, after_id=3).decode()))] == ["6", "9"]
+    assert collect(database, "csv", chat_id=2, since=datetime(2030, 1, 1)).decode().strip() == "id,content,timestamp,username,chat_id"
+    assert collect(database, "csv", chat_id=2, after_id=9) == b""
+
+    # Продолжение дописывается в тот же gzip отдельным членом
+    path = os.path.join(tempfile.mkdtemp(), "export.ndjson.gz")
+    with open(path, "wb") as file:
+        file.write(collect(database, "ndjson", True, chat_id=1, until=datetime(2024, 1, 5)))
+    assert last_exported_id(path, "ndjson", True) == 4
+    with open(path, "ab") as file:
+        file.write(collect(database, "ndjson", True, chat_id=1, after_id=4))
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        assert [json.loads(line)["id"] for line in file] == [1, 2, 4, 5, 7, 8, 10]
+
+    # Оборванная запись в несжатом файле отбрасывается
+    path = os.path.join(tempfile.mkdtemp(), "export.ndjson")
+    with open(path, "wb") as file:
+        file.write(collect(database, "ndjson", chat_id=1, until=datetime(2024, 1, 5)) + b'{"id": 5, "cont')
+    assert last_exported_id(path, "ndjson", False) == 4
+    drop_partial_line(path)
+    with open(path, "rb") as file:
+        assert file.read().endswith(b"\n")
@@ -0,0 +1,77 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import asyncio
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.app.models import MessageBase
+from backend.app.service.ingest import MessageIngestor
+
+
+def run_ingestor(database, scenario, **options):
+    async def main():
+        engine = create_async_engine(database.async_url)
+        ingestor = MessageIngestor(async_sessionmaker(engine, expire_on_commit=False), **options)
+        try:
+            return await scenario(ingestor)
+        finally:
+            await ingestor.stop()
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+def test_batches_are_written_before_senders_resume(database):
+    database.add_users("alice", "mallory")
+    database.add_chat(1, "alice")
+
+    async def scenario(ingestor):
+        await ingestor.start()
+        results = await asyncio.gather(*(
+            ingestor.submit(1, "alice" if i % 5 else "mallory", f"m{i}") for i in range(20)
+        ))
+        # Остановка дописывает то, что уже в очереди
+        pending = [asyncio.create_task(ingestor.submit(1, "alice", f"late{i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        await ingestor.stop()
+        return results, await asyncio.gather(*pending)
+
+    results, late = run_ingestor(database, scenario, batch_size=8, linger_ms=50)
+
+    assert [result is None for result in results] == [i % 5 == 0 for i in range(20)]
+    stored = [message for message in results + late if message is not None]
+    with database.engine.connect() as conn:
+        rows = conn.execute(select(MessageBase.id, MessageBase.content).order_by(MessageBase.id)).all()
+    assert sorted((message.id, message.content) for message in stored) == [tuple(row) for row in rows]
+    assert len(rows) == 19
+
+
+def test_submit_after_stop_raises_and_leftovers_fail(database):
+    database.add_users("alice")
+    database.add_chat(1, "alice")
+
+    async def scenario(ingestor):
+        with pytest.raises(RuntimeError):
+            await ingestor.submit(1, "alice", "too early")
+
+        await ingestor.start()
+        # Воркер выйдет раньше, чем дойдёт до сообщения: как если бы он упал
+        ingestor.queue.put_nowait(None)
+        stranded = asyncio.create_task(ingestor.submit(1, "alice", "stranded"))
+        await asyncio.sleep(0.05)
+        await ingestor.stop()
+        with pytest.raises(RuntimeError, match="stopped"):
+            await stranded
+
+        assert not ingestor.running
+        with pytest.raises(RuntimeError, match="not running"):
+            await ingestor.submit(1, "alice", "too late")
+
+    run_ingestor(database, scenario)
+    with database.engine.connect() as conn:
+        assert conn.execute(select(MessageBase.id)).first() is None
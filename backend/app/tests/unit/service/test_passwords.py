@@ -0,0 +1,85 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import asyncio
+import threading
+
+import pytest
+
+from backend.app.errors import Overloaded
+from backend.app.service.passwords import PasswordPool
+
+
+def test_hash_and_verify_in_pool():
+    async def scenario():
+        pool = PasswordPool("thread", workers=2, queue_max=2)
+        try:
+            hashed = await pool.hash("secret")
+            assert await pool.verify("secret", hashed)
+            assert not await pool.verify("wrong", hashed)
+            return pool.stats()
+        finally:
+            pool.shutdown()
+
+    stats = asyncio.run(scenario())
+    assert stats["completed"] == 3
+    assert stats["in_flight"] == 0
+
+
+def test_saturated_pool_rejects_immediately():
+    release = threading.Event()
+
+    async def scenario():
+        pool = PasswordPool("thread", workers=1, queue_max=1)
+        try:
+            running = asyncio.ensure_future(pool.run(release.wait))
+            queued = asyncio.ensure_future(pool.run(release.wait))
+            await asyncio.sleep(0.05)
+            assert pool.stats()["queued"] == 1
+            with pytest.raises(Overloaded):
+                await pool.run(release.wait)
+            release.set()
+            await asyncio.gather(running, queued)
+            return pool.stats()
+        finally:
+            release.set()
+            pool.shutdown()
+
+    stats = asyncio.run(scenario())
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+
+
+def test_cancelled_waiter_keeps_slot_until_task_finishes():
+    release = threading.Event()
+
+    def fail():
+        raise ValueError("bad hash")
+
+    async def scenario():
+        pool = PasswordPool("thread", workers=1, queue_max=0)
+        try:
+            waiter = asyncio.ensure_future(pool.run(release.wait))
+            await asyncio.sleep(0.05)
+            waiter.cancel()
+            await asyncio.sleep(0.05)
+            # Запрос отменён, но bcrypt ещё занимает воркер: новых задач пул не берёт
+            assert pool.in_flight == 1
+            with pytest.raises(Overloaded):
+                await pool.run(release.wait)
+            release.set()
+            await asyncio.sleep(0.05)
+            assert pool.in_flight == 0
+
+            with pytest.raises(ValueError):
+                await pool.run(fail)
+            return pool.stats()
+        finally:
+            release.set()
+            pool.shutdown()
+
+    stats = asyncio.run(scenario())
+    # Ошибки не считаются выполненными задачами
+    assert (stats["completed"], stats["failed"], stats["rejected"]) == (1, 1, 1)
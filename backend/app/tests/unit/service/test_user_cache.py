@@ -0,0 +1,105 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from backend.app import cache
+from backend.app.cache import TTLCache, user_cache
+from backend.app.data import users_postgre as sync_data
+from backend.app.models import User
+from backend.app.service import users_async as service_users
+from backend.app.tests.utils import count_queries
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    user_cache.clear()
+    yield
+    user_cache.clear()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    users = TTLCache(maxsize=10, ttl=30)
+
+    users.set("alice", "A")
+    clock.now += 29
+    assert users.get("alice") == "A"
+    clock.now += 2
+    assert users.get("alice") is None
+    # Просроченная запись удаляется при чтении
+    assert len(users) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    users = TTLCache(maxsize=2, ttl=60)
+    users.set("alice", "A")
+    users.set("bob", "B")
+    assert users.get("alice") == "A"
+    users.set("carol", "C")
+
+    assert users.get("bob") is None
+    assert users.get("alice") == "A" and users.get("carol") == "C"
+    assert len(users) == 2
+
+    disabled = TTLCache(maxsize=0, ttl=60)
+    disabled.set("alice", "A")
+    assert disabled.get("alice") is None
+
+
+def test_cache_hit_does_not_query_database(database):
+    database.add_users("alice")
+
+    async def scenario(db):
+        with count_queries(db.bind.sync_engine) as miss:
+            first = await service_users.get_public(db, "alice")
+        with count_queries(db.bind.sync_engine) as hit:
+            second = await service_users.get_public(db, "alice")
+        with count_queries(db.bind.sync_engine) as unknown:
+            assert await service_users.get_public(db, "ghost") is None
+        return first, second, miss.count, hit.count, unknown.count
+
+    first, second, misses, hits, unknown = database.run(scenario)
+    assert first == second and first.email == "alice@example.com"
+    assert (misses, hits) == (1, 0)
+    # Неизвестные пользователи не кешируются
+    assert unknown == 1 and user_cache.get("ghost") is None
+
+
+def test_modify_and_delete_invalidate_cached_principal(database):
+    database.add_users("alice", "bob")
+    user = User(username="alice", email="alice@example.com", password="hash", about="")
+
+    async def scenario(db):
+        await service_users.get_public(db, "alice")
+        await service_users.modify(db, user.model_copy(update={"email": "alice@new.example"}))
+        assert user_cache.get("alice") is None
+        assert (await service_users.get_public(db, "alice")).email == "alice@new.example"
+
+        await service_users.delete(db, user)
+        assert user_cache.get("alice") is None
+        assert await service_users.get_public(db, "alice") is None
+
+    database.run(scenario)
+
+    # Синхронные обработчики инвалидируют тот же кеш
+    bob = User(username="bob", email="bob@example.com", password="hash", about="")
+    user_cache.set("bob", bob.to_public_data())
+    with sessionmaker(database.engine)() as db:
+        sync_data.modify(db, bob.model_copy(update={"about": "hi"}))
+        assert user_cache.get("bob") is None
+        user_cache.set("bob", bob.to_public_data())
+        sync_data.delete(db, bob)
+    assert user_cache.get("bob") is None
@@ -0,0 +1,55 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCounter:
+    """Счётчик SQL запросов и коммитов, выполненных движком."""
+
+    def __init__(self):
+        self.statements: list[str] = []
+        self.commits = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def _on_commit(self, conn):
+        self.commits += 1
+
+
+@contextmanager
+def count_queries(engine: Engine) -> Iterator[QueryCounter]:
+    """
+    Считает запросы внутри блока with.
+
+    Для AsyncEngine нужно передавать async_engine.sync_engine.
+    """
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter._on_execute)
+    event.listen(engine, "commit", counter._on_commit)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter._on_execute)
+        event.remove(engine, "commit", counter._on_commit)
+
+
+@contextmanager
+def assert_query_count(engine: Engine, expected: int) -> Iterator[QueryCounter]:
+    """
+    Проверяет, что блок with выполнил ровно expected запросов.
+
+    При расхождении в сообщении перечисляются все запросы, чтобы сразу было
+    видно лишние ленивые загрузки.
+    """
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count != expected:
+        statements = "\n".join(f"  {i + 1}. {statement}" for i, statement in enumerate(counter.statements))
+        raise AssertionError(f"Expected {expected} queries, got {counter.count}:\n{statements}")